@@ -65,6 +65,16 @@ class Settings(BaseSettings):
     POST_DEPLOY_FORCE: bool = Field(False, env="POST_DEPLOY_FORCE")
     AUTO_RESTORE_ON_EMPTY: bool = Field(False, env="AUTO_RESTORE_ON_EMPTY")
 
+    # — Cache en memoria (utils/cache.py) —
+    CACHE_MAX_ENTRIES: int = Field(2000, env="CACHE_MAX_ENTRIES")
+    CACHE_MAX_BYTES: int = Field(32 * 1024 * 1024, env="CACHE_MAX_BYTES")  # 32 MB aprox.
+    CACHE_EVICTION_POLICY: str = Field("lru", env="CACHE_EVICTION_POLICY")  # lru | lfu
+    CACHE_SWEEP_INTERVAL: int = Field(60, env="CACHE_SWEEP_INTERVAL")  # segundos
+
+    # — Generación de PDFs (services/pdf_service.py) —
+    PDF_WORKERS: int = Field(2, env="PDF_WORKERS")  # 0 = renderizar en el mismo proceso
+    PDF_CACHE_DIR: Optional[str] = Field(None, env="PDF_CACHE_DIR")  # por defecto, en el directorio temporal
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -0,0 +1,246 @@
+# core/startup_tasks.py
+
+"""
+Tareas de inicio en segundo plano.
+
+Las tareas lentas del arranque (RLS, seeds, admin desde variables de entorno
+y la restauración post-deploy, que puede descargar un respaldo de GitHub)
+se ejecutan en un hilo aparte, así la aplicación empieza a atender apenas
+uvicorn levanta.
+
+Un lock compartido asegura que solo un worker las ejecute: en PostgreSQL un
+advisory lock (sirve también con varias instancias contra la misma base) y
+en los demás motores un lock sobre un archivo local (flock, o
+msvcrt.locking en Windows; sin ninguno de los dos, cada proceso ejecuta las
+tareas por su cuenta). Los workers que no
+obtienen el lock esperan a que el dueño termine y se marcan listos sin
+repetir el trabajo. Las tareas son idempotentes, así que un worker que
+arranca más tarde solo vuelve a verificarlas.
+
+Las tareas que cambian datos (la restauración post-deploy) se registran con
+`bloquea_escrituras=True`: mientras no terminen, StartupWriteLockMiddleware
+rechaza con 503 las peticiones que escriben, para que una venta no se
+mezcle con la restauración en curso.
+
+/api/health/ready consulta `estado()` para distinguir "vivo" de "listo": solo
+está listo cuando las tareas terminaron sin errores.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+# Estados finales con los que la instancia se considera lista
+ESTADOS_LISTO = ("completado", "completado por otro worker")
+
+# Clave del advisory lock de PostgreSQL (arbitraria, única en la aplicación)
+LOCK_KEY = 72_310_001
+LOCK_FILE = os.path.join(tempfile.gettempdir(), "crud_noli_startup.lock")
+
+
+class StartupRunner:
+    """
+    Ejecuta una lista de tareas (nombre, función) una sola vez, en orden y en
+    un hilo daemon. Un error en una tarea se registra y no detiene las demás.
+    """
+
+    def __init__(self, engine=None):
+        # Sin engine se usa el de la aplicación al momento de ejecutar
+        self.engine = engine
+        self.tareas: List[Tuple[str, Callable[[], Any]]] = []
+        self._bloqueantes: List[str] = []
+        self._estado = "pendiente"
+        self._detalle: Dict[str, Dict[str, Any]] = {}
+        self._inicio: Optional[datetime] = None
+        self._fin: Optional[datetime] = None
+        self._ejecutor = False
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._terminado = threading.Event()
+
+    def agregar(self, nombre: str, funcion: Callable[[], Any], bloquea_escrituras: bool = False) -> None:
+        """Registra una tarea; con `bloquea_escrituras` las peticiones que
+        escriben esperan (503) hasta que termine"""
+        self.tareas.append((nombre, funcion))
+        self._detalle[nombre] = {"estado": "pendiente"}
+        if bloquea_escrituras:
+            self._bloqueantes.append(nombre)
+
+    def iniciar(self) -> None:
+        """Lanza el hilo de tareas (solo la primera vez)"""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._ejecutar, name="startup-tasks", daemon=True)
+            self._estado = "ejecutando"
+            self._inicio = datetime.utcnow()
+        self._hilo.start()
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """Bloquea hasta que las tareas terminen; retorna si terminaron"""
+        return self._terminado.wait(timeout)
+
+    @property
+    def terminado(self) -> bool:
+        return self._terminado.is_set()
+
+    @property
+    def listo(self) -> bool:
+        """Tareas terminadas sin errores"""
+        return self._terminado.is_set() and self._estado in ESTADOS_LISTO
+
+    @property
+    def escrituras_bloqueadas(self) -> bool:
+        """Hay una tarea que cambia datos iniciada y sin terminar"""
+        if self._hilo is None or self._terminado.is_set():
+            return False
+        with self._lock:
+            return any(self._detalle[n]["estado"] in ("pendiente", "ejecutando") for n in self._bloqueantes)
+
+    def estado(self) -> Dict[str, Any]:
+        """Resumen para el endpoint de estado"""
+        with self._lock:
+            return {
+                "status": self._estado,
+                "ready": self.listo,
+                "runner": self._ejecutor,
+                "started_at": self._inicio.isoformat() if self._inicio else None,
+                "finished_at": self._fin.isoformat() if self._fin else None,
+                "tasks": {nombre: dict(detalle) for nombre, detalle in self._detalle.items()},
+            }
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def _marcar(self, nombre: str, **campos) -> None:
+        with self._lock:
+            self._detalle[nombre].update(campos)
+
+    def _correr_tareas(self) -> bool:
+        ok = True
+        for nombre, funcion in self.tareas:
+            self._marcar(nombre, estado="ejecutando")
+            inicio = time.perf_counter()
+            try:
+                resultado = funcion()
+            except Exception as e:
+                logger.error(f"Tarea de inicio '{nombre}' falló: {e}", exc_info=True)
+                self._marcar(nombre, estado="error", error=str(e),
+                             duracion=round(time.perf_counter() - inicio, 3))
+                ok = False
+                continue
+            # Una tarea puede indicar un fallo controlado retornando False
+            estado = "error" if resultado is False else "completada"
+            ok = ok and resultado is not False
+            self._marcar(nombre, estado=estado, duracion=round(time.perf_counter() - inicio, 3))
+            logger.info(f"Tarea de inicio '{nombre}': {estado} en {time.perf_counter() - inicio:.2f}s")
+        return ok
+
+    def _ejecutar(self) -> None:
+        estado = "error"
+        try:
+            if self.engine is None:
+                from db.database import engine
+                self.engine = engine
+            with _lock_compartido(self.engine) as obtenido:
+                if obtenido:
+                    self._ejecutor = True
+                    estado = "completado" if self._correr_tareas() else "completado con errores"
+                else:
+                    # Otro worker ya las ejecutó mientras esperábamos el lock
+                    for nombre, _ in self.tareas:
+                        self._marcar(nombre, estado="omitida")
+                    estado = "completado por otro worker"
+        except Exception as e:
+            logger.error(f"Error en las tareas de inicio: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._estado = estado
+                self._fin = datetime.utcnow()
+            self._terminado.set()
+            logger.info(f"Tareas de inicio: {estado}")
+
+
+@contextmanager
+def _lock_compartido(engine):
+    """
+    Intenta tomar el lock sin bloquear. Si lo obtiene entrega True; si no,
+    espera a que el dueño lo libere y entrega False.
+    """
+    if engine is not None and engine.dialect.name == "postgresql":
+        # El advisory lock es por sesión: la conexión queda abierta mientras se tiene
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            obtenido = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": LOCK_KEY}).scalar()
+            if not obtenido:
+                conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": LOCK_KEY})
+            try:
+                yield obtenido
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": LOCK_KEY})
+        return
+
+    if fcntl is None and msvcrt is None:
+        # Sin lock de archivos: un solo proceso, ejecuta las tareas él mismo
+        logger.warning("Sin fcntl ni msvcrt: las tareas de inicio se ejecutan sin lock compartido")
+        yield True
+        return
+
+    with open(LOCK_FILE, "a+") as archivo:
+        obtenido = _lock_archivo(archivo)
+        try:
+            yield obtenido
+        finally:
+            _liberar_archivo(archivo)
+
+
+def _lock_archivo(archivo) -> bool:
+    """Lock exclusivo sobre el archivo; True si se obtuvo sin esperar"""
+    if fcntl is not None:
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            return False
+
+    # msvcrt bloquea un rango de bytes: siempre el primero del archivo
+    archivo.seek(0)
+    obtenido = True
+    while True:
+        try:
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return obtenido
+        except OSError:
+            obtenido = False
+            time.sleep(0.5)
+
+
+def _liberar_archivo(archivo) -> None:
+    if fcntl is not None:
+        fcntl.flock(archivo, fcntl.LOCK_UN)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Instancia de la aplicación: main.py registra las tareas y la inicia
+startup_runner = StartupRunner()
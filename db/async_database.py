@@ -0,0 +1,86 @@
+# db/async_database.py
+
+"""
+Engine asíncrono, junto al síncrono de db/database.py.
+
+Los handlers `async def` que usan la Session síncrona bloquean el event
+loop en cada consulta, y con él a todas las demás peticiones del worker (un
+reporte lento detiene el checkout del POS). Las rutas de lectura más usadas
+reciben en cambio un AsyncSession (ver db/dependencies.get_async_session).
+
+Drivers: asyncpg para PostgreSQL y aiosqlite para SQLite. El engine se crea
+en el primer uso, así que importar este módulo no carga los drivers.
+"""
+
+from functools import lru_cache
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# sslmode de libpq -> parámetro ssl de asyncpg
+_SSL_ASYNCPG = {"disable": False, "allow": "prefer", "prefer": "prefer", "require": "require",
+                "verify-ca": "verify-ca", "verify-full": "verify-full"}
+
+
+def async_database_url(database_url: str):
+    """
+    Convierte la URL síncrona al driver asíncrono equivalente.
+
+    Returns:
+        (URL, connect_args)
+    """
+    url = make_url(database_url.replace("postgres://", "postgresql://", 1))
+    connect_args = {}
+    if url.get_backend_name() == "postgresql":
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        if sslmode in _SSL_ASYNCPG:
+            connect_args["ssl"] = _SSL_ASYNCPG[sslmode]
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+        connect_args["timeout"] = 20
+    return url, connect_args
+
+
+@lru_cache(maxsize=1)
+def get_async_engine() -> AsyncEngine:
+    """
+    Engine asíncrono del proceso.
+
+    En producción su pool comparte el presupuesto de CONEXIONES_POR_WORKER
+    (50) con el síncrono: 8 + 12 de overflow aquí y 12 + 18 allá, así un
+    worker no abre más conexiones que antes de tener dos engines.
+    """
+    from db.database import POOL_ASINCRONO
+
+    url, connect_args = async_database_url(settings.DATABASE_URL)
+    engine_kwargs = {
+        "echo": False,
+        "pool_pre_ping": True,
+        "pool_recycle": 3600,
+        "connect_args": connect_args,
+    }
+    if settings.ENVIRONMENT == "production" and url.get_backend_name() == "postgresql":
+        engine_kwargs.update({**POOL_ASINCRONO, "pool_timeout": 30})
+
+    async_engine = create_async_engine(url, **engine_kwargs)
+
+    if url.get_backend_name() == "sqlite":
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _pragmas_sqlite(dbapi_connection, connection_record):
+            # aiosqlite no es una sqlite3.Connection: el listener de db/database.py no aplica
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+    logger.info(f"Engine asíncrono creado ({url.drivername})")
+    return async_engine
@@ -32,6 +32,14 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
         finally:
             cursor.close()
 
+# Presupuesto de conexiones por worker en producción: las 50 (20 + 30 de
+# overflow) que tenía el pool síncrono, repartidas con el engine asíncrono
+# de db/async_database.py para que juntos no superen ese límite. Se asume
+# que el servidor admite 50 conexiones por worker de la aplicación.
+CONEXIONES_POR_WORKER = 50
+POOL_SINCRONO = {"pool_size": 12, "max_overflow": 18}
+POOL_ASINCRONO = {"pool_size": 8, "max_overflow": 12}
+
 # Configuración para el motor de la base de datos
 def get_engine():
     # Configuración optimizada para ambos ambientes
@@ -50,8 +58,7 @@ def get_engine():
     
     if settings.ENVIRONMENT == "production":
         engine_kwargs.update({
-            "pool_size": 20,        # Pool más grande para producción
-            "max_overflow": 30,     # Conexiones adicionales si es necesario
+            **POOL_SINCRONO,        # Parte síncrona del presupuesto por worker
             "pool_timeout": 30,     # Timeout del pool
         })
     
@@ -78,25 +85,23 @@ def create_db_and_tables():
                 with engine.connect() as conn:
                     logger.info(f"Conexión a la base de datos exitosa en el intento {attempt + 1}")
                     
-                    # Verificar si hay datos en las tablas principales
-                    from sqlmodel import Session, select
-                    from models.models import Categoria, Producto
+                    # Verificar si hay categorías (EXISTS, sin cargar las filas)
+                    from db.probe import invalidate_database_state, table_presence
                     
-                    with Session(engine) as session:
-                        # Verificar si hay categorías
-                        categorias = session.exec(select(Categoria)).all()
-                        if not categorias and settings.AUTO_RESTORE_ON_EMPTY:
-                            logger.warning("No se encontraron categorías en la base de datos")
-                            
-                            # Intentar restaurar desde backup automáticamente
-                            try:
-                                from scripts.restore_from_backup import get_backup_path, restore_from_backup
-                                backup_path = get_backup_path('latest')
-                                if backup_path:
-                                    logger.info(f"Intentando restaurar desde backup: {backup_path}")
-                                    restore_from_backup(backup_path, confirm=False)
-                            except Exception as e:
-                                logger.error(f"Error al restaurar desde backup: {str(e)}")
+                    if not table_presence(engine)["categorias"] and settings.AUTO_RESTORE_ON_EMPTY:
+                        logger.warning("No se encontraron categorías en la base de datos")
+                        
+                        # Intentar restaurar desde backup automáticamente
+                        try:
+                            from scripts.restore_from_backup import get_backup_path, restore_from_backup
+                            backup_path = get_backup_path('latest')
+                            if backup_path:
+                                logger.info(f"Intentando restaurar desde backup: {backup_path}")
+                                if not restore_from_backup(backup_path, confirm=False):
+                                    logger.error(f"No se pudo restaurar el backup: {backup_path}")
+                                invalidate_database_state()
+                        except Exception as e:
+                            logger.error(f"Error al restaurar desde backup: {str(e)}")
                     
                     break
             except Exception as e:
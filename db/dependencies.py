@@ -1,7 +1,7 @@
 # db/dependencies.py
 
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from core.config import settings
 from db.database import engine
 from models.user import User
@@ -24,6 +24,17 @@ def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
+async def get_async_session() -> AsyncGenerator["AsyncSession", None]:
+    """
+    Dependencia que provee una sesión asíncrona, para handlers `async def`
+    que no deben bloquear el event loop mientras esperan a la base.
+    """
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from db.async_database import get_async_engine
+
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
 async def get_current_active_user(
     access_token: str = Cookie(None),
     session: Session = Depends(get_session),
@@ -1,5 +1,5 @@
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
 from starlette.types import ASGIApp
 
 class CacheControlMiddleware(BaseHTTPMiddleware):
@@ -25,3 +25,26 @@ class CacheControlMiddleware(BaseHTTPMiddleware):
             response.headers["Pragma"] = "no-cache"
             
         return response
+
+
+class StartupWriteLockMiddleware(BaseHTTPMiddleware):
+    """
+    Rechaza con 503 las peticiones que escriben (POST, PUT, PATCH, DELETE)
+    mientras una tarea de inicio que cambia datos sigue en curso, p. ej. la
+    restauración post-deploy. Las lecturas y los health checks pasan.
+    """
+
+    METODOS_LECTURA = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, app: ASGIApp, runner) -> None:
+        super().__init__(app)
+        self.runner = runner
+
+    async def dispatch(self, request, call_next):
+        if request.method not in self.METODOS_LECTURA and self.runner.escrituras_bloqueadas:
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "Restauración de datos en curso. Inténtelo de nuevo en unos momentos."},
+                headers={"Retry-After": "30"},
+            )
+        return await call_next(request)
@@ -0,0 +1,92 @@
+# db/probe.py
+
+"""
+Sonda liviana del estado de la base de datos.
+
+Los scripts de arranque y diagnóstico necesitan saber si las tablas
+principales tienen datos o cuántas filas hay. Antes lo hacían cargando las
+tablas completas (`len(session.exec(select(Modelo)).all())`); aquí se
+resuelve con una sola consulta de EXISTS o COUNT por llamada.
+
+Los resultados se guardan por engine durante toda la vida del proceso: el
+arranque consulta varias veces lo mismo (create_db_and_tables, post-deploy).
+Quien escribe datos en bloque (una restauración) llama a
+`invalidate_database_state()`; los diagnósticos que deben ver el estado
+actual pasan `refresh=True`.
+"""
+
+from typing import Dict
+import logging
+import threading
+
+from sqlalchemy import func, select
+
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Nombre usado en los reportes -> modelo
+TABLAS_PRINCIPALES = {
+    "productos": Producto,
+    "categorias": Categoria,
+    "usuarios": User,
+    "ordenes": Orden,
+    "orden_items": OrdenItem,
+    "cierres_caja": CierreCaja,
+}
+
+_cache: Dict[tuple, Dict[str, int]] = {}
+_cache_lock = threading.Lock()
+
+
+def _consultar(engine, clave: tuple, statement, refresh: bool) -> Dict[str, int]:
+    if engine is None:
+        from db.database import engine
+    clave = (engine,) + clave
+    with _cache_lock:
+        if not refresh and clave in _cache:
+            return dict(_cache[clave])
+    with engine.connect() as conn:
+        fila = conn.execute(statement).one()
+    resultado = dict(fila._mapping)
+    with _cache_lock:
+        _cache[clave] = resultado
+    return dict(resultado)
+
+
+def table_presence(engine=None, refresh: bool = False) -> Dict[str, bool]:
+    """
+    Indica qué tablas principales tienen al menos una fila, con un EXISTS
+    por tabla en una única consulta (no recorre ni cuenta las tablas).
+    """
+    statement = select(*(
+        select(model.id).exists().label(nombre)
+        for nombre, model in TABLAS_PRINCIPALES.items()
+    ))
+    return {
+        nombre: bool(valor)
+        for nombre, valor in _consultar(engine, ("exists",), statement, refresh).items()
+    }
+
+
+def table_counts(engine=None, refresh: bool = False) -> Dict[str, int]:
+    """Cantidad de filas de cada tabla principal, con un COUNT por tabla en una única consulta"""
+    statement = select(*(
+        select(func.count()).select_from(model).scalar_subquery().label(nombre)
+        for nombre, model in TABLAS_PRINCIPALES.items()
+    ))
+    return _consultar(engine, ("count",), statement, refresh)
+
+
+def is_database_empty(engine=None, refresh: bool = False) -> bool:
+    """La base se considera vacía si no hay categorías, productos ni órdenes"""
+    presentes = table_presence(engine, refresh)
+    return not (presentes["categorias"] or presentes["productos"] or presentes["ordenes"])
+
+
+def invalidate_database_state() -> None:
+    """Descarta los resultados guardados (después de restaurar o cargar datos)"""
+    with _cache_lock:
+        _cache.clear()
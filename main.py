@@ -10,7 +10,7 @@ from fastapi.templating import Jinja2Templates
 import logging
 
 # Importamos nuestro middleware personalizado para control de caché
-from db.middleware import CacheControlMiddleware
+from db.middleware import CacheControlMiddleware, StartupWriteLockMiddleware
 from db.performance_middleware import PerformanceMiddleware
 from utils.timezone import format_datetime_santiago, convert_to_santiago
 from utils.timezone_monitor import initialize_timezone_monitoring
@@ -23,6 +23,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 from core.config import settings
+from core.startup_tasks import startup_runner
 from db.database import create_db_and_tables, engine
 from sqlmodel import Session, select
 
@@ -74,10 +75,69 @@ app.add_middleware(
 # Middleware de control de caché para mejorar navegación
 app.add_middleware(CacheControlMiddleware)
 
+# Sin escrituras mientras la restauración post-deploy está en curso
+app.add_middleware(StartupWriteLockMiddleware, runner=startup_runner)
+
 # Middleware de rendimiento (solo en desarrollo y producción para debugging)
 if settings.ENVIRONMENT in ["development", "production"]:
     app.add_middleware(PerformanceMiddleware, log_slow_requests=1.0)
 
+def _habilitar_rls():
+    """Row Level Security en Supabase"""
+    from scripts.db_utils.enable_rls import enable_rls
+    enable_rls()
+    logger.info("Row Level Security (RLS) habilitado en las tablas")
+
+
+def _seed_categorias():
+    """Categorías predeterminadas (solo en desarrollo)"""
+    defaults = ["Accesorio", "Utensilio", "Cafe en Grano", "Otro"]
+    with Session(engine) as sess:
+        for nombre in defaults:
+            exists = sess.exec(select(Categoria).where(Categoria.nombre == nombre)).first()
+            if not exists:
+                sess.add(Categoria(nombre=nombre))
+        sess.commit()
+    logger.info("Categorías predeterminadas verificadas (dev)")
+
+
+def _seed_admin():
+    """Crea el admin si no existe (solo si se fuerza)"""
+    seed_admin()
+    logger.info("Verificación de admin (forzada) completada")
+
+
+def _admin_desde_env():
+    """Actualiza el admin desde variables de entorno (solo si se fuerza)"""
+    update_admin_from_env()
+    logger.info("Actualización de admin desde variables de entorno completada")
+
+
+def _post_deploy():
+    """Restauración robusta de datos en producción (puede descargar un respaldo)"""
+    from scripts.post_deploy_robust import main as post_deploy_main
+    logger.info("Ejecutando post-deploy robusto...")
+    post_deploy_success = post_deploy_main()
+    if post_deploy_success:
+        logger.info("Post-deploy robusto completado exitosamente")
+    else:
+        logger.warning("Post-deploy robusto falló, pero la app continuará")
+    return post_deploy_success
+
+
+# Tareas lentas del arranque: corren en segundo plano (ver core/startup_tasks.py);
+# la restauración bloquea las escrituras hasta terminar
+if settings.ENVIRONMENT == "production":
+    startup_runner.agregar("rls", _habilitar_rls)
+if settings.ENVIRONMENT == "development":
+    startup_runner.agregar("seed_categorias", _seed_categorias)
+if settings.FORCE_ADMIN_CREATION:
+    startup_runner.agregar("seed_admin", _seed_admin)
+    startup_runner.agregar("admin_env", _admin_desde_env)
+if settings.ENVIRONMENT == "production":
+    startup_runner.agregar("post_deploy", _post_deploy, bloquea_escrituras=True)
+
+
 @app.on_event("startup")
 def on_startup():
     try:
@@ -93,69 +153,24 @@ def on_startup():
         except Exception as e:
             logger.warning(f"No se pudo inicializar monitoreo de zona horaria: {str(e)}")
         
-        # Intentar habilitar RLS si estamos en producción (Supabase)
-        if settings.ENVIRONMENT == "production":
-            try:
-                from scripts.db_utils.enable_rls import enable_rls
-                enable_rls()
-                logger.info("Row Level Security (RLS) habilitado en las tablas")
-            except Exception as e:
-                logger.warning(f"No se pudo habilitar RLS: {str(e)}")
-                # No bloqueamos el inicio por esto
-
-        # Seed categorías con manejo de errores (solo si no deshabilitado)
-        try:
-            if settings.ENVIRONMENT == "development":
-                defaults = ["Accesorio", "Utensilio", "Cafe en Grano", "Otro"]
-                with Session(engine) as sess:
-                    for nombre in defaults:
-                        exists = sess.exec(select(Categoria).where(Categoria.nombre == nombre)).first()
-                        if not exists:
-                            sess.add(Categoria(nombre=nombre))
-                    sess.commit()
-                logger.info("Categorías predeterminadas verificadas (dev)")
-        except Exception as e:
-            logger.warning(f"No se pudieron verificar las categorías predeterminadas: {str(e)}")
-            # No bloqueamos el inicio por esto
-
-        # Seed admin (solo si se fuerza explícitamente)
-        try:
-            if settings.FORCE_ADMIN_CREATION:
-                seed_admin()
-                logger.info("Verificación de admin (forzada) completada")
-        except Exception as e:
-            logger.warning(f"Error al verificar admin: {str(e)}")
-            # No bloqueamos el inicio por esto
-        
-        # Actualizar el admin desde variables de entorno (opcional)
-        try:
-            if settings.FORCE_ADMIN_CREATION:
-                update_admin_from_env()
-                logger.info("Actualización de admin desde variables de entorno completada")
-        except Exception as e:
-            logger.error(f"Error al actualizar admin desde variables de entorno: {str(e)}")
-            # Esto es importante, pero no bloqueamos el inicio para permitir la depuración
-        
-        # Post-deploy: Restauración robusta de datos en producción
-        try:
-            if settings.ENVIRONMENT == "production":
-                from scripts.post_deploy_robust import main as post_deploy_main
-                logger.info("Ejecutando post-deploy robusto...")
-                post_deploy_success = post_deploy_main()
-                if post_deploy_success:
-                    logger.info("Post-deploy robusto completado exitosamente")
-                else:
-                    logger.warning("Post-deploy robusto falló, pero la app continuará")
-        except Exception as e:
-            logger.warning(f"Error durante post-deploy robusto: {str(e)}")
-            # No bloqueamos el inicio, pero es importante que se registre
+        # RLS, seeds, admin y post-deploy no bloquean el inicio:
+        # /api/health/ready responde 503 hasta que terminen sin errores y las
+        # escrituras esperan a que termine el post-deploy
+        startup_runner.iniciar()
         
-        logger.info("Aplicación iniciada correctamente")
+        logger.info("Aplicación iniciada; tareas de inicio en segundo plano")
     except Exception as e:
         logger.error(f"Error durante el inicio de la aplicación: {str(e)}", exc_info=True)
         # No levantamos la excepción para permitir que la aplicación inicie
         # incluso si hay problemas, lo que facilita la depuración en Render
 
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # Procesos del pool de renderizado de PDFs
+    from services.pdf_service import cerrar_pool
+    cerrar_pool()
+
 # Routers
 app.include_router(auth.router)
 app.include_router(crud_cat.router)
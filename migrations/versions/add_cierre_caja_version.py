@@ -0,0 +1,26 @@
+"""Add cierrecaja.version change counter for incremental backups
+
+Revision ID: add_cierre_caja_version
+Revises: add_orden_version
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_cierre_caja_version'
+down_revision: Union[str, Sequence[str], None] = 'add_orden_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('cierrecaja', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('cierrecaja', 'version')
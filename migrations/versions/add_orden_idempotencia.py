@@ -0,0 +1,40 @@
+"""Add ordenidempotencia table for idempotent POS order submission
+
+Revision ID: add_orden_idempotencia
+Revises: 751c76ce2977, add_unique_barcode
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_orden_idempotencia'
+# También une las dos cabezas existentes
+down_revision: Union[str, Sequence[str], None] = ('751c76ce2977', 'add_unique_barcode')
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ordenidempotencia',
+        sa.Column('key', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('orden_id', sa.Integer(), nullable=False),
+        sa.Column('request_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=False),
+        sa.Column('response', sa.JSON(), nullable=True),
+        sa.Column('fecha', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['orden_id'], ['orden.id']),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index(op.f('ix_ordenidempotencia_fecha'), 'ordenidempotencia', ['fecha'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ordenidempotencia_fecha'), table_name='ordenidempotencia')
+    op.drop_table('ordenidempotencia')
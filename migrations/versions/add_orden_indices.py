@@ -0,0 +1,39 @@
+"""Add composite and partial indexes for order and cash-closing queries
+
+Revision ID: add_orden_indices
+Revises: add_orden_idempotencia
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_orden_indices'
+down_revision: Union[str, Sequence[str], None] = 'add_orden_idempotencia'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Órdenes sin cierre por fecha: solo indexa la caja abierta
+    op.create_index(
+        'ix_orden_abiertas_fecha', 'orden', ['fecha'], unique=False,
+        postgresql_where=sa.text('cierre_id IS NULL'),
+        sqlite_where=sa.text('cierre_id IS NULL'),
+    )
+    op.create_index('ix_orden_cierre_id', 'orden', ['cierre_id'], unique=False)
+    op.create_index('ix_orden_metodo_estado_fecha', 'orden', ['metodo_pago', 'estado', 'fecha'], unique=False)
+    op.create_index('ix_ordenitem_orden_producto', 'ordenitem', ['orden_id', 'producto_id'], unique=False)
+    op.create_index('ix_ordenitem_producto_id', 'ordenitem', ['producto_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ordenitem_producto_id', table_name='ordenitem')
+    op.drop_index('ix_ordenitem_orden_producto', table_name='ordenitem')
+    op.drop_index('ix_orden_metodo_estado_fecha', table_name='orden')
+    op.drop_index('ix_orden_cierre_id', table_name='orden')
+    op.drop_index('ix_orden_abiertas_fecha', table_name='orden')
@@ -0,0 +1,26 @@
+"""Add orden.version change counter for the open cash register summary
+
+Revision ID: add_orden_version
+Revises: add_venta_diaria
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_orden_version'
+down_revision: Union[str, Sequence[str], None] = 'add_venta_diaria'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('orden', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('orden', 'version')
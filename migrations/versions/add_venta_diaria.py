@@ -0,0 +1,38 @@
+"""Add ventadiaria rollup table for period reports
+
+Revision ID: add_venta_diaria
+Revises: add_orden_indices
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_venta_diaria'
+down_revision: Union[str, Sequence[str], None] = 'add_orden_indices'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ventadiaria',
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('producto_id', sa.Integer(), nullable=False),
+        sa.Column('metodo_pago', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('ingresos', sa.Float(), nullable=False),
+        sa.Column('costo', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['producto_id'], ['producto.id']),
+        sa.PrimaryKeyConstraint('fecha', 'producto_id', 'metodo_pago'),
+    )
+    # Se llena con: python scripts/backfill_ventas_diarias.py
+
+
+def downgrade() -> None:
+    op.drop_table('ventadiaria')
@@ -2,12 +2,23 @@
 
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date
-from sqlmodel import SQLModel, Field, Relationship, Column, JSON
+from sqlalchemy import text
+from sqlmodel import SQLModel, Field, Relationship, Column, JSON, Index
 from models.models import Producto  # asegúrate de que esta ruta es correcta
 from utils.timezone import now_santiago
 
 class Orden(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        # Caja abierta: órdenes sin cierre de un rango de fechas (índice parcial)
+        Index(
+            "ix_orden_abiertas_fecha", "fecha",
+            postgresql_where=text("cierre_id IS NULL"),
+            sqlite_where=text("cierre_id IS NULL"),
+        ),
+        Index("ix_orden_cierre_id", "cierre_id"),  # Órdenes de un cierre
+        Index("ix_orden_metodo_estado_fecha", "metodo_pago", "estado", "fecha"),  # Filtros del listado y reportes
+    )
     fecha: datetime = Field(default_factory=now_santiago, index=True)
     subtotal: float = Field(default=0.0, description="Total sin descuentos")
     descuento: float = Field(default=0.0, description="Valor total del descuento")
@@ -15,6 +26,13 @@ class Orden(SQLModel, table=True):
     total: float = Field(description="Total final (subtotal - descuento)")
     metodo_pago: str  # efectivo, debito, credito, transferencia
     estado: str = Field(default="aprobada")  # aprobada, anulada, reembolsada
+    # Se incrementa en cada UPDATE: permite a otros workers detectar cambios de
+    # estado o método de pago (ver services/caja_abierta.py) y al respaldo
+    # incremental incluir las órdenes editadas
+    version: int = Field(
+        default=0,
+        sa_column_kwargs={"onupdate": text("version + 1"), "server_default": "0"},
+    )
     
     # Relación con cierre de caja
     cierre_id: Optional[int] = Field(default=None, foreign_key="cierrecaja.id", nullable=True)
@@ -28,6 +46,10 @@ class Orden(SQLModel, table=True):
 
 class OrdenItem(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        Index("ix_ordenitem_orden_producto", "orden_id", "producto_id"),  # Ítems de una orden y joins de costos
+        Index("ix_ordenitem_producto_id", "producto_id"),  # Ventas de un producto
+    )
     orden_id: int = Field(foreign_key="orden.id")
     producto_id: int = Field(foreign_key="producto.id")
     cantidad: int
@@ -39,6 +61,20 @@ class OrdenItem(SQLModel, table=True):
     producto: Producto = Relationship(back_populates="order_items")
 
 
+class OrdenIdempotencia(SQLModel, table=True):
+    """
+    Respuesta guardada de POST /pos/order por Idempotency-Key.
+    Permite que el cliente reintente una venta sin duplicar la orden ni
+    descontar stock dos veces.
+    """
+    key: str = Field(primary_key=True, max_length=255)
+    orden_id: int = Field(foreign_key="orden.id")
+    request_hash: str = Field(description="Huella del cuerpo de la solicitud original")
+    status_code: int = Field(default=201)
+    response: Dict[str, Any] = Field(sa_column=Column(JSON))
+    fecha: datetime = Field(default_factory=now_santiago, index=True)
+
+
 class CierreCaja(SQLModel, table=True):
     """
     Modelo para almacenar información de cierres de caja diarios.
@@ -69,9 +105,29 @@ class CierreCaja(SQLModel, table=True):
     usuario_id: Optional[int] = None
     usuario_nombre: Optional[str] = None
     notas: Optional[str] = None
+    # Se incrementa en cada UPDATE: el respaldo incremental incluye los
+    # cierres editados después del último respaldo
+    version: int = Field(
+        default=0,
+        sa_column_kwargs={"onupdate": text("version + 1"), "server_default": "0"},
+    )
     
     # Campo JSON para datos adicionales
     datos_adicionales: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
     
     # Relación inversa con las órdenes incluidas en este cierre
     ordenes: List["Orden"] = Relationship(back_populates="cierre")
+
+
+class VentaDiaria(SQLModel, table=True):
+    """
+    Resumen de ventas aprobadas por día, producto y método de pago.
+    Se recalcula al cerrar la caja del día; los reportes de período leen
+    de aquí en lugar de recorrer todos los ítems de las órdenes.
+    """
+    fecha: date = Field(primary_key=True, description="Día de la venta (zona horaria Chile)")
+    producto_id: int = Field(primary_key=True, foreign_key="producto.id")
+    metodo_pago: str = Field(primary_key=True)
+    cantidad: int = Field(default=0, description="Unidades vendidas")
+    ingresos: float = Field(default=0.0, description="Suma de precio_unitario * cantidad - descuento por ítem")
+    costo: float = Field(default=0.0, description="Costo de lo vendido (productos sin costo suman 0)")
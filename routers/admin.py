@@ -2,7 +2,8 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from db.dependencies import get_current_active_user
-from utils.cache import cache_stats, clear_cache, invalidate_cache
+from utils.cache import CACHE_NAMESPACES, app_cache, cache_stats, clear_cache, invalidate_cache
+from services.product_index import product_index
 from typing import Dict, Any
 import logging
 
@@ -11,9 +12,10 @@ logger = logging.getLogger(__name__)
 
 @router.get("/cache/stats", response_model=Dict[str, Any])
 def get_cache_stats(current_user = Depends(get_current_active_user)):
-    """Obtener estadísticas del cache del sistema"""
+    """Obtener estadísticas del cache del sistema (hits, misses, evicciones y memoria aproximada)"""
     try:
         stats = cache_stats()
+        stats["product_index"] = product_index.stats()
         return {
             "success": True,
             "data": stats,
@@ -41,9 +43,16 @@ def invalidate_cache_pattern(
     pattern: str,
     current_user = Depends(get_current_active_user)
 ):
-    """Invalidar cache por patrón específico"""
+    """
+    Invalidar cache por namespace (p. ej. "catalogo", O(1)) o, si no lo es,
+    eliminando las claves que contienen el patrón
+    """
     try:
-        invalidate_cache(pattern)
+        if pattern in CACHE_NAMESPACES:
+            invalidate_cache(pattern)
+        else:
+            # Un patrón cualquiera no crea una generación de namespace
+            app_cache.invalidate_pattern(pattern)
         return {
             "success": True,
             "message": f"Cache invalidado para patrón: {pattern}"
@@ -1,11 +1,15 @@
 # routers/crud.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from typing import List
+from pydantic import TypeAdapter
 from sqlmodel import Session
 
 from db.dependencies import get_session, get_current_active_user
 from models.models import Producto, ProductoRead
+from services.product_index import product_index
+from utils.cache import CATALOG_NAMESPACE, invalidate_cache_tags, producto_tag, producto_tags
+from utils.response_cache import cached_json_response, response_cache_key
 from services.crud_services import (
     get_all_productos,
     get_producto,
@@ -20,6 +24,8 @@ router = APIRouter(
     responses={status.HTTP_404_NOT_FOUND: {"message": "no encontrado"}},
 )
 
+_productos_adapter = TypeAdapter(List[ProductoRead])
+
 
 @router.get(
     "/",
@@ -27,12 +33,21 @@ router = APIRouter(
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(get_current_active_user)],
 )
-def read_productos(session: Session = Depends(get_session)):
+def read_productos(request: Request, session: Session = Depends(get_session)):
     """
     Lista todos los productos.
     Requiere un JWT válido en la cookie `access_token`.
+    La respuesta se cachea ya serializada (con ETag): un acierto no vuelve
+    a validar contra el response_model.
     """
-    return get_all_productos(session)
+    return cached_json_response(
+        request,
+        response_cache_key("productos_all_response", {}, namespace=CATALOG_NAMESPACE),
+        lambda: get_all_productos(session),
+        _productos_adapter,
+        ttl=180,
+        tags=producto_tags,
+    )
 
 
 @router.get(
@@ -129,6 +144,8 @@ def change_stock(
     session.add(producto)
     session.commit()
     session.refresh(producto)
+    product_index.update_stock(producto.id, producto.cantidad)
+    invalidate_cache_tags(producto_tag(producto.id))
 
     return {
         "cantidad": producto.cantidad, 
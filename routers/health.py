@@ -1,8 +1,11 @@
 # Crear archivo: routers/health.py
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime
 
+from core.startup_tasks import startup_runner
+
 router = APIRouter(
     prefix="/api",
     tags=["health"]
@@ -23,11 +26,42 @@ async def keep_alive():
 
 @router.get("/health")
 async def health_check():
-    """Health check básico sin conexión a DB"""
+    """
+    Health check básico sin conexión a DB. Siempre 200 mientras el proceso
+    atienda (liveness); `ready` indica si terminaron las tareas de inicio.
+    """
     return {
         "status": "healthy",
+        "live": True,
+        "ready": startup_runner.listo,
         "timestamp": datetime.utcnow().isoformat(),
         "app": "crud_noli",
         "version": "1.0",
         "environment": "production"
-    }
\ No newline at end of file
+    }
+
+@router.get("/health/live")
+async def liveness():
+    """Liveness: el proceso responde"""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
+
+@router.get("/health/ready")
+async def readiness():
+    """
+    Readiness: 503 mientras se ejecutan las tareas de inicio (post-deploy,
+    RLS, seeds) y también si terminaron con errores
+    """
+    estado = startup_runner.estado()
+    if estado["ready"]:
+        status = "ready"
+    else:
+        status = "error" if startup_runner.terminado else "starting"
+    return JSONResponse(
+        status_code=200 if estado["ready"] else 503,
+        content={"status": status, "startup": estado["status"]},
+    )
+
+@router.get("/health/startup")
+async def startup_status():
+    """Estado detallado de cada tarea de inicio"""
+    return startup_runner.estado()
\ No newline at end of file
@@ -4,24 +4,14 @@ import io
 from uuid import uuid4
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from sqlmodel import Session
-from PIL import Image
-import boto3
-from botocore.client import Config
 from db.dependencies import get_session
 from models.models import Producto, ProductoRead
 from core.config import settings
+from utils.image_utils import pil_image
+from utils.storage import get_s3_client
 
 router = APIRouter(prefix="/productos", tags=["productos"])
 
-s3 = boto3.client(
-    's3',
-    aws_access_key_id=settings.FILEBASE_KEY,
-    aws_secret_access_key=settings.FILEBASE_SECRET,
-    endpoint_url='https://s3.filebase.com',
-    region_name='us-east-1',
-    config=Config(signature_version='s3v4')
-)
-
 # ...
 
 @router.post("/", response_model=ProductoRead)
@@ -37,6 +27,7 @@ async def create_producto(
     content = await imagen.read()
     
     # 2. Validar y convertir con Pillow
+    Image = pil_image()
     try:
         img = Image.open(io.BytesIO(content)).convert("RGB")
     except Exception:
@@ -50,7 +41,7 @@ async def create_producto(
     # 4. Subida a Filebase
     key = f"products/{uuid4().hex}.webp"
     try:
-        s3.put_object(
+        get_s3_client().put_object(
             Bucket=settings.FILEBASE_BUCKET,
             Key=key,
             Body=buf,
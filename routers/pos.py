@@ -1,20 +1,31 @@
 # routers/pos.py
 
-from fastapi import APIRouter, Request, Depends, HTTPException, status, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Request, Depends, Header, HTTPException, status, Query
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select, Session, or_, and_, func
 from utils.templates import templates
-from utils.cache import cached, invalidate_cache
+from utils.cache import CATALOG_NAMESPACE, invalidate_cache_tags, producto_tag, producto_tags
+from utils.response_cache import cached_json_response, response_cache_key
 from sqlalchemy.orm import selectinload
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from typing import List, Dict, Any, Optional, Tuple
+from pydantic import BaseModel, TypeAdapter
 from db.dependencies import get_session,  get_current_active_user
 from models.models import Categoria, Producto
 from models.order import Orden, OrdenItem
-from schemas.order import OrdenCreate, ItemCreate
-from schemas.producto import ProductoRead
+from schemas.order import OrdenCreate, ItemCreate, OrdenesBatchCreate, OrdenesBatchResultado
+from schemas.producto import ProductoRead, ProductoSnapshot, snapshot_productos
 from db.performance_middleware import APIPerformanceLogger
 # from services.mercadopago_service import MercadoPagoService  # Comentado temporalmente
+from services.product_index import product_index
+from services.caja_abierta import caja_abierta
+from services.pos_order_service import (
+    buscar_respuesta_idempotente,
+    guardar_respuesta_idempotente,
+    huella_solicitud,
+    registrar_orden,
+    registrar_ordenes_offline,
+)
 import logging
 import time
 
@@ -22,6 +33,9 @@ router = APIRouter(prefix="/pos", tags=["POS"])
 
 logger = logging.getLogger(__name__)
 
+# Validación/serialización de listas de productos para el cache de respuestas
+_productos_adapter = TypeAdapter(List[ProductoRead])
+
 @router.get("/", response_class=HTMLResponse)
 def pos_page(
     request: Request, 
@@ -35,14 +49,16 @@ def pos_page(
         "current_user": current_user
     })
 
-@cached(ttl=120, cache_key_prefix="pos_products")
-def get_products_cached(
+def get_products(
     session: Session,
     search_query: str = "",
     skip: int = 0,
     limit: int = 50
-) -> List[Producto]:
-    """Función optimizada para obtener productos con cache"""
+) -> Tuple[ProductoSnapshot, ...]:
+    """
+    Consulta de productos del POS. Sin cache propio: list_products guarda la
+    respuesta ya serializada (cached_json_response)
+    """
     # Construir query base con join optimizado
     stmt = select(Producto).options(selectinload(Producto.categoria))
     
@@ -65,10 +81,11 @@ def get_products_cached(
     # Aplicar paginación
     stmt = stmt.offset(skip).limit(limit)
     
-    return session.exec(stmt).all()
+    return snapshot_productos(session.exec(stmt).all())
 
 @router.get("/products", response_model=List[ProductoRead])
 def list_products(
+    request: Request,
     q: str = Query(default="", description="Término de búsqueda"),
     limit: int = Query(default=50, ge=1, le=200, description="Límite de productos"),
     skip: int = Query(default=0, ge=0, description="Productos a saltar"),
@@ -79,22 +96,30 @@ def list_products(
     - Búsqueda por nombre o código de barras
     - Solo productos con stock > 0
     - Cache inteligente para mejor rendimiento
+    - Respuesta ya serializada con ETag (304 si el cliente ya la tiene)
     """
     start_time = time.time()
     
     try:
-        productos = get_products_cached(
-            session=session,
-            search_query=q,
-            skip=skip,
-            limit=limit
+        cache_key = response_cache_key(
+            "pos_products_response",
+            {"q": q, "skip": skip, "limit": limit},
+            namespace=CATALOG_NAMESPACE,
+        )
+        response = cached_json_response(
+            request,
+            cache_key,
+            lambda: get_products(session=session, search_query=q, skip=skip, limit=limit),
+            _productos_adapter,
+            ttl=120,
+            tags=producto_tags,
         )
         
         # Log métricas
         duration_ms = (time.time() - start_time) * 1000
-        APIPerformanceLogger.log_database_query("pos_products_optimized", duration_ms, len(productos))
+        APIPerformanceLogger.log_database_query("pos_products_optimized", duration_ms)
         
-        return productos
+        return response
         
     except Exception as e:
         logger.error(f"Error al obtener productos POS: {e}")
@@ -127,152 +152,134 @@ def count_products(
     
     return {"total": total}
 
-@cached(ttl=60, cache_key_prefix="pos_search")
-def search_products_cached(
-    session: Session,
-    search_query: str,
-    limit: int = 20
-) -> List[Producto]:
-    """Búsqueda ultra-rápida con cache para autocompletado"""
-    search_term = f"%{search_query.strip()}%"
-    
-    # Primero buscar por código de barras exacto (más específico)
-    exact_barcode_stmt = select(Producto).options(selectinload(Producto.categoria)).where(
-        Producto.codigo_barra == search_query.strip()
-        # Producto.cantidad > 0  # Comentado para permitir ver productos sin stock
-    )
-    exact_match = session.exec(exact_barcode_stmt).first()
-    
-    if exact_match:
-        return [exact_match]
-    
-    # Búsqueda general optimizada con ranking
-    stmt = select(Producto).options(selectinload(Producto.categoria)).where(
-        and_(
-            or_(
-                Producto.codigo_barra.ilike(search_term),
-                Producto.nombre.ilike(search_term)
-            ),
-            # Producto.cantidad > 0  # Comentado para permitir ver productos sin stock
-        )
-    ).order_by(
-        # Priorizar productos que empiecen con el término de búsqueda
-        Producto.nombre.ilike(f"{search_query.strip()}%").desc(),
-        Producto.nombre.asc()
-    ).limit(limit)
-    
-    return session.exec(stmt).all()
-
 @router.get("/search", response_model=List[ProductoRead])
 def search_products_fast(
+    request: Request,
     q: str = Query(min_length=1, description="Término de búsqueda (mínimo 1 carácter)"),
     limit: int = Query(default=20, ge=1, le=50, description="Límite de resultados"),
     session: Session = Depends(get_session)
 ):
     """
     Búsqueda ultra-rápida de productos para autocompletado.
-    - Búsqueda optimizada por nombre y código de barras
+    - Resuelve desde el índice en memoria (services/product_index.py)
     - Prioriza coincidencias exactas por código de barras
-    - Solo productos con stock > 0
-    - Cache inteligente para mejor rendimiento
+    - Luego nombres que empiezan con el término y después coincidencias parciales
+    - Solo consulta la base de datos para construir el índice
+    - Respuesta ya serializada con ETag (304 si el cliente ya la tiene)
     """
     start_time = time.time()
     
     try:
-        productos = search_products_cached(
-            session=session,
-            search_query=q,
-            limit=limit
+        # Reconstruir antes de calcular la clave para que la versión sea la vigente
+        product_index.ensure_loaded(session)
+        cache_key = response_cache_key(
+            "pos_search_response",
+            {"q": q, "limit": limit},
+            product_index.version,
+            namespace=CATALOG_NAMESPACE,
+        )
+        response = cached_json_response(
+            request,
+            cache_key,
+            lambda: product_index.search(session, q, limit=limit),
+            _productos_adapter,
+            ttl=60,
+            tags=producto_tags,
         )
         
         # Log métricas
         duration_ms = (time.time() - start_time) * 1000
-        APIPerformanceLogger.log_database_query("pos_search_optimized", duration_ms, len(productos))
+        APIPerformanceLogger.log_database_query("pos_search_index", duration_ms)
         
-        return productos
+        return response
         
     except Exception as e:
         logger.error(f"Error en búsqueda rápida: {e}")
         raise HTTPException(status_code=500, detail="Error en búsqueda")
-    
-    # Query optimizada: solo productos con stock y campos esenciales
-    stmt = (
-        select(Producto)
-        .options(selectinload(Producto.categoria))
-        .where(
-            or_(
-                Producto.nombre.ilike(search_term),
-                Producto.codigo_barra.ilike(search_term)
-            )
-            # and_(Producto.cantidad > 0)  # Comentado para permitir ver productos sin stock
-        )
-        .order_by(Producto.nombre)
-        .limit(limit)
+
+def _respuesta_repetida(registro) -> JSONResponse:
+    """Respuesta guardada de una orden ya registrada con la misma Idempotency-Key"""
+    return JSONResponse(
+        status_code=registro.status_code,
+        content=registro.response,
+        headers={"Idempotent-Replayed": "true"},
     )
-    
-    productos = session.exec(stmt).all()
-    
-    # Log métricas
-    duration_ms = (time.time() - start_time) * 1000
-    APIPerformanceLogger.log_database_query("productos_search", duration_ms, len(productos))
-    
-    return productos
 
 @router.post("/order", response_model=Orden, status_code=status.HTTP_201_CREATED)
-def create_order(order_in: OrdenCreate, session: Session = Depends(get_session)):
+def create_order(
+    order_in: OrdenCreate,
+    session: Session = Depends(get_session),
+    idempotency_key: Optional[str] = Header(
+        default=None,
+        max_length=255,
+        description="Clave generada por el cliente; los reintentos con la misma clave no duplican la orden",
+    ),
+):
     with session:
-        # Inicializar la orden con los datos recibidos
-        orden = Orden(
-            total=0.0,
-            subtotal=order_in.subtotal if order_in.subtotal is not None else 0.0,
-            descuento=order_in.descuento if order_in.descuento is not None else 0.0,
-            descuento_porcentaje=order_in.descuento_porcentaje or 0.0,
-            metodo_pago=order_in.metodo_pago,
-            datos_adicionales=order_in.datos_adicionales
-        )
-        session.add(orden)
-        session.flush()
-        
-        # Calculamos los totales
-        subtotal = 0.0
-        for item in order_in.items:
-            producto = session.get(Producto, item.producto_id)
-            if not producto:
-                raise HTTPException(status_code=404, detail="Producto no encontrado")
-            if producto.cantidad < item.cantidad:
-                raise HTTPException(status_code=400, detail="Stock insuficiente")
-            
-            # Actualizar stock
-            producto.cantidad -= item.cantidad
-            session.add(producto)
-            
-            # Calcular precio con descuento para cada ítem
-            precio_item = producto.precio * item.cantidad
-            descuento_item = item.descuento or 0.0
-            
-            # Registrar el item de la orden
-            session.add(OrdenItem(
-                orden_id=orden.id,
-                producto_id=item.producto_id,
-                cantidad=item.cantidad,
-                precio_unitario=producto.precio,
-                descuento=descuento_item
-            ))
-            
-            subtotal += precio_item
-        
-        # Si no se proporcionó subtotal, usamos el calculado
-        if orden.subtotal == 0.0:
-            orden.subtotal = subtotal
-        
-        # Calcular el total final considerando descuentos
-        orden.total = orden.subtotal - orden.descuento
-        
-        session.add(orden)
-        session.commit()
+        request_hash = huella_solicitud(order_in) if idempotency_key else None
+        if idempotency_key:
+            registro = buscar_respuesta_idempotente(session, idempotency_key, request_hash)
+            if registro is not None:
+                return _respuesta_repetida(registro)
+
+        try:
+            orden, stock_actualizado, costo = registrar_orden(session, order_in)
+            if idempotency_key:
+                # Releer la orden para guardar exactamente lo que se respondería
+                session.flush()
+                session.refresh(orden)
+                guardar_respuesta_idempotente(
+                    session, idempotency_key, request_hash, orden, orden.model_dump(mode="json")
+                )
+            session.commit()
+        except HTTPException:
+            session.rollback()
+            raise
+        except IntegrityError:
+            # Otra solicitud con la misma clave se confirmó primero: se
+            # descarta esta venta y se responde con la ya registrada
+            session.rollback()
+            if not idempotency_key:
+                raise
+            registro = buscar_respuesta_idempotente(session, idempotency_key, request_hash)
+            if registro is None:
+                raise
+            return _respuesta_repetida(registro)
         session.refresh(orden)
+        caja_abierta.registrar_orden(orden, costo)
+    
+    # Reflejar el nuevo stock en el índice de búsqueda y descartar solo las
+    # respuestas cacheadas que incluyen estos productos
+    for producto_id, cantidad in stock_actualizado.items():
+        product_index.update_stock(producto_id, cantidad)
+    invalidate_cache_tags(*(producto_tag(producto_id) for producto_id in stock_actualizado))
     return orden
 
+@router.post("/orders/batch", response_model=OrdenesBatchResultado)
+def create_orders_batch(batch_in: OrdenesBatchCreate, session: Session = Depends(get_session)):
+    """
+    Sincroniza en un solo viaje las ventas que un terminal encoló sin conexión.
+    - Todo el lote se valida y registra en una transacción (un SAVEPOINT por orden)
+    - Cada orden trae su Idempotency-Key: reenviar el lote no duplica ventas
+    - Retorna un resultado por orden, en el mismo orden recibido
+    """
+    with session:
+        resultados, stock_actualizado, creadas = registrar_ordenes_offline(session, batch_in.ordenes)
+        session.commit()
+        for orden, costo in creadas:
+            caja_abierta.registrar_orden(orden, costo)
+
+    for producto_id, cantidad in stock_actualizado.items():
+        product_index.update_stock(producto_id, cantidad)
+    invalidate_cache_tags(*(producto_tag(producto_id) for producto_id in stock_actualizado))
+
+    return OrdenesBatchResultado(
+        creadas=sum(r.estado == "creada" for r in resultados),
+        repetidas=sum(r.estado == "repetida" for r in resultados),
+        fallidas=sum(r.estado == "error" for r in resultados),
+        resultados=resultados,
+    )
+
 # Nuevos modelos para el procesamiento de pagos (Comentados temporalmente)
 # class MercadoPagoRequest(BaseModel):
 #     orden_id: int
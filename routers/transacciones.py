@@ -1,30 +1,39 @@
 # routers/transacciones.py
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response, StreamingResponse
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date, timedelta
 from utils.timezone import now_santiago, today_santiago
 import json
+from urllib.parse import urlencode
 from utils.templates import templates
 
-from db.dependencies import get_session
+from db.database import engine
+from db.dependencies import get_async_session, get_session
 from models.order import Orden, CierreCaja
-from schemas.order import OrdenRead, OrdenUpdate, OrdenFiltro
+from schemas.order import OrdenRead, OrdenUpdate, OrdenFiltro, OrdenesPagina
 from schemas.cierre_caja import CierreCajaCreate, CierreCajaRead
 from utils.navigation import redirect_with_cache_control
 from services.transacciones_service import (
     obtener_transacciones, obtener_transaccion_por_id,
+    obtener_pagina_transacciones_async, contar_transacciones_async,
+    obtener_transaccion_async,
+    exportar_transacciones_csv, exportar_transacciones_ndjson,
     actualizar_estado_transaccion, verificar_transferencia_bancaria,
     generar_pdf_transaccion
 )
 from services.cierre_caja_service import (
-    obtener_ordenes_sin_cierre, calcular_totales_dia,
+    obtener_ordenes_sin_cierre,
     realizar_cierre_caja, obtener_cierres_por_periodo,
+    obtener_cierres_por_periodo_async, obtener_cierre_detalle_async,
     obtener_cierre_por_id, obtener_periodos_disponibles
 )
-from services.pdf_service import generar_pdf_cierre, generar_pdf_reporte_periodo
+from services.caja_abierta import caja_abierta
+from services.ventas_diarias_service import ventas_por_categoria, ventas_por_producto
+from services.pdf_service import exportar_cierres_zip, generar_pdf_cierre, generar_pdf_reporte_periodo
 import logging
 
 router = APIRouter(prefix="/transacciones", tags=["transacciones"])
@@ -39,20 +48,17 @@ logger = logging.getLogger(__name__)
 # SECCIÓN 1: RUTAS ESTÁTICAS (SIN PARÁMETROS EN LA RUTA)
 #=====================================================
 
-# Ruta principal para listar transacciones
-@router.get("/", response_class=HTMLResponse)
-async def listar_transacciones(
-    request: Request,
-    fecha_desde: Optional[str] = None, 
-    fecha_hasta: Optional[str] = None,
-    metodo_pago: Optional[str] = None,
-    estado: Optional[str] = None,
-    db: Session = Depends(get_session)
-):
-    """
-    Vista principal de transacciones con filtros.
-    """
-    # Preparar filtros
+TRANSACCIONES_POR_PAGINA = 50
+# Transacciones listadas en la vista de cierre (los totales cubren todo el día)
+LIMITE_CIERRE = 100
+
+def _filtros_transacciones(
+    fecha_desde: Optional[str],
+    fecha_hasta: Optional[str],
+    metodo_pago: Optional[str],
+    estado: Optional[str]
+) -> Dict[str, Any]:
+    """Convierte los parámetros de la URL en filtros para el servicio"""
     filtros = {}
     
     if fecha_desde:
@@ -73,28 +79,46 @@ async def listar_transacciones(
     if estado:
         filtros["estado"] = estado
     
-    # Construir consulta según filtros
-    query = select(Orden)
-    
-    if "fecha_desde" in filtros:
-        query = query.where(Orden.fecha >= filtros["fecha_desde"])
-    
-    if "fecha_hasta" in filtros:
-        # Ajustar hasta el final del día
-        fecha_fin = filtros["fecha_hasta"].replace(hour=23, minute=59, second=59)
-        query = query.where(Orden.fecha <= fecha_fin)
-    
-    if "metodo_pago" in filtros:
-        query = query.where(Orden.metodo_pago == filtros["metodo_pago"])
-    
-    if "estado" in filtros:
-        query = query.where(Orden.estado == filtros["estado"])
-    
-    # Ordenar por fecha descendente (más recientes primero)
-    query = query.order_by(Orden.fecha.desc())
+    return filtros
+
+# Ruta principal para listar transacciones
+@router.get("/", response_class=HTMLResponse)
+async def listar_transacciones(
+    request: Request,
+    fecha_desde: Optional[str] = None, 
+    fecha_hasta: Optional[str] = None,
+    metodo_pago: Optional[str] = None,
+    estado: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(TRANSACCIONES_POR_PAGINA, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Vista principal de transacciones con filtros, paginada por cursor.
+    """
+    filtros = _filtros_transacciones(fecha_desde, fecha_hasta, metodo_pago, estado)
     
-    # Ejecutar consulta
-    transacciones = db.exec(query).all()
+    try:
+        transacciones, siguiente_cursor = await obtener_pagina_transacciones_async(db, filtros, cursor, limite)
+    except ValueError:
+        # Cursor inválido o de otra versión: volver a la primera página
+        cursor = None
+        transacciones, siguiente_cursor = await obtener_pagina_transacciones_async(db, filtros, None, limite)
+    total = await contar_transacciones_async(db, filtros)
+    
+    # Enlaces de paginación conservando los filtros
+    parametros = {
+        clave: valor for clave, valor in (
+            ("fecha_desde", fecha_desde), ("fecha_hasta", fecha_hasta),
+            ("metodo_pago", metodo_pago), ("estado", estado)
+        ) if valor
+    }
+    if limite != TRANSACCIONES_POR_PAGINA:
+        parametros["limite"] = limite
+    primera_url = f"/transacciones/?{urlencode(parametros)}" if parametros else "/transacciones/"
+    siguiente_url = None
+    if siguiente_cursor:
+        siguiente_url = f"/transacciones/?{urlencode({**parametros, 'cursor': siguiente_cursor})}"
     
     # Obtener métodos de pago y estados únicos para los filtros
     metodos_pago = [
@@ -110,15 +134,78 @@ async def listar_transacciones(
         {
             "request": request,
             "transacciones": transacciones,
+            "total": total,
+            "es_primera_pagina": not cursor,
+            "primera_url": primera_url,
+            "siguiente_url": siguiente_url,
             "filtros": filtros,
             "metodos_pago": metodos_pago,
             "estados": estados
         }
     )
 
+# Variante JSON del listado de transacciones
+@router.get("/api", response_model=OrdenesPagina)
+async def listar_transacciones_json(
+    fecha_desde: Optional[str] = None, 
+    fecha_hasta: Optional[str] = None,
+    metodo_pago: Optional[str] = None,
+    estado: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(TRANSACCIONES_POR_PAGINA, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    Listado de transacciones en JSON. Para pedir la página siguiente se
+    envía `siguiente_cursor` como parámetro `cursor`.
+    """
+    filtros = _filtros_transacciones(fecha_desde, fecha_hasta, metodo_pago, estado)
+    
+    try:
+        transacciones, siguiente_cursor = await obtener_pagina_transacciones_async(db, filtros, cursor, limite)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    
+    return OrdenesPagina(
+        items=transacciones,
+        total=await contar_transacciones_async(db, filtros),
+        limite=limite,
+        siguiente_cursor=siguiente_cursor
+    )
+
+# Exportación de transacciones e ítems
+@router.get("/export")
+async def exportar_transacciones(
+    fecha_desde: Optional[str] = None, 
+    fecha_hasta: Optional[str] = None,
+    metodo_pago: Optional[str] = None,
+    estado: Optional[str] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson)$")
+):
+    """
+    Exporta las transacciones filtradas en CSV (una fila por ítem) o NDJSON
+    (una orden por línea con sus ítems). La respuesta se envía por partes a
+    medida que se lee la base, sin cargar el período completo en memoria.
+    """
+    filtros = _filtros_transacciones(fecha_desde, fecha_hasta, metodo_pago, estado)
+    exportar = exportar_transacciones_csv if format == "csv" else exportar_transacciones_ndjson
+    
+    def contenido():
+        # Sesión propia: la de la dependencia se cierra antes de enviar el cuerpo
+        with Session(engine) as db:
+            yield from exportar(db, filtros)
+    
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    nombre = f"transacciones_{now_santiago().strftime('%Y%m%d_%H%M')}.{format}"
+    return StreamingResponse(
+        contenido(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={nombre}"}
+    )
+
 # Ruta para cierre de caja (vista)
 @router.get("/cierre-caja", response_class=HTMLResponse)
-async def vista_cierre_caja(
+def vista_cierre_caja(
     request: Request,
     db: Session = Depends(get_session)
 ):
@@ -128,19 +215,12 @@ async def vista_cierre_caja(
     # Obtener fecha actual en zona horaria Chile
     fecha_chile = today_santiago()
     
-    # Obtener transacciones del día actual sin cierre
-    transacciones = obtener_ordenes_sin_cierre(db, fecha_chile)
-    
-    # Calcular totales del día actual
-    totales = calcular_totales_dia(db, fecha_chile)
+    # Totales y contador desde el resumen incremental de la caja abierta
+    # (se reconcilia con la base si otro worker cambió alguna orden)
+    totales, contador = caja_abierta.resumen(db, fecha_chile)
     
-    # Contador de transacciones por estado
-    contador = {
-        "aprobadas": sum(1 for t in transacciones if t.estado == "aprobada"),
-        "anuladas": sum(1 for t in transacciones if t.estado == "anulada"),
-        "reembolsadas": sum(1 for t in transacciones if t.estado == "reembolsada"),
-        "total": len(transacciones)
-    }
+    # Solo las transacciones más recientes del día; el resto en /transacciones/
+    transacciones = obtener_ordenes_sin_cierre(db, fecha_chile, limite=LIMITE_CIERRE)
     
     return templates.TemplateResponse(
         "cierre_caja.html",
@@ -155,7 +235,7 @@ async def vista_cierre_caja(
 
 # Ruta para realizar el cierre de caja (acción POST)
 @router.post("/cierre-caja")
-async def realizar_cierre_caja_endpoint(
+def realizar_cierre_caja_endpoint(
     request: Request,
     db: Session = Depends(get_session)
 ):
@@ -165,7 +245,8 @@ async def realizar_cierre_caja_endpoint(
     try:
         # Usar fecha actual de Chile para el cierre
         fecha_chile = today_santiago()
-        cierre = realizar_cierre_caja(db, fecha_chile)
+        cierre, _ = realizar_cierre_caja(db, fecha_chile)
+        caja_abierta.invalidate()
         
         return RedirectResponse(
             url=f"/transacciones/cierres/{cierre.id}",
@@ -175,15 +256,10 @@ async def realizar_cierre_caja_endpoint(
         logger.error(f"Error al realizar cierre de caja: {str(e)}")
         
         # En caso de error, mostrar la vista de cierre con el error
-        transacciones = obtener_ordenes_sin_cierre(db)
-        totales = calcular_totales_dia(db)
-        
-        contador = {
-            "aprobadas": sum(1 for t in transacciones if t.estado == "aprobada"),
-            "anuladas": sum(1 for t in transacciones if t.estado == "anulada"),
-            "reembolsadas": sum(1 for t in transacciones if t.estado == "reembolsada"),
-            "total": len(transacciones)
-        }
+        db.rollback()
+        fecha_chile = today_santiago()
+        totales, contador = caja_abierta.resumen(db, fecha_chile)
+        transacciones = obtener_ordenes_sin_cierre(db, fecha_chile, limite=LIMITE_CIERRE)
         
         return templates.TemplateResponse(
             "cierre_caja.html",
@@ -202,7 +278,7 @@ async def listar_cierres(
     request: Request,
     fecha_desde: Optional[str] = None,
     fecha_hasta: Optional[str] = None,
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """
     Lista los cierres de caja históricos con filtros por fecha.
@@ -223,7 +299,7 @@ async def listar_cierres(
             filtros["fecha_hasta"] = None
     
     # Obtener cierres según filtros
-    cierres = obtener_cierres_por_periodo(db, **filtros)
+    cierres = await obtener_cierres_por_periodo_async(db, **filtros)
     
     # Calcular resumen del período
     resumen = {
@@ -248,7 +324,7 @@ async def listar_cierres(
 
 # Ruta para generar reporte de periodo
 @router.get("/cierres/reporte", response_class=HTMLResponse)
-async def generar_reporte_periodo(
+def generar_reporte_periodo(
     request: Request,
     desde: Optional[str] = None,
     hasta: Optional[str] = None,
@@ -297,6 +373,10 @@ async def generar_reporte_periodo(
                 "ticket_promedio": 0
             }
         
+        # Desglose por categoría y producto desde el resumen diario
+        desde_dia = filtros["fecha_desde"].date() if filtros.get("fecha_desde") else None
+        hasta_dia = filtros["fecha_hasta"].date() if filtros.get("fecha_hasta") else None
+        
         return templates.TemplateResponse(
             "reporte_periodo.html",
             {
@@ -304,6 +384,8 @@ async def generar_reporte_periodo(
                 "cierres": cierres,
                 "filtros": filtros,
                 "resumen": resumen,
+                "ventas_categoria": ventas_por_categoria(db, desde_dia, hasta_dia),
+                "ventas_producto": ventas_por_producto(db, desde_dia, hasta_dia),
                 "periodos_disponibles": obtener_periodos_disponibles(db)
             }
         )
@@ -322,14 +404,13 @@ async def generar_reporte_periodo(
 async def detalle_transaccion(
     request: Request,
     transaccion_id: int,
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """
     Vista detallada de una transacción específica.
     """
-    # Obtener la transacción con sus items
-    query = select(Orden).where(Orden.id == transaccion_id)
-    transaccion = db.exec(query).first()
+    # Obtener la transacción con sus items (cargados de antemano: no hay lazy loading en async)
+    transaccion = await obtener_transaccion_async(db, transaccion_id)
     
     if not transaccion:
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
@@ -344,7 +425,7 @@ async def detalle_transaccion(
 
 # Actualizar estado de transacción
 @router.post("/{transaccion_id}/actualizar-estado")
-async def actualizar_estado_transaccion_endpoint(
+def actualizar_estado_transaccion_endpoint(
     transaccion_id: int,
     estado: str = Form(...),
     db: Session = Depends(get_session)
@@ -364,6 +445,7 @@ async def actualizar_estado_transaccion_endpoint(
     transaccion.estado = estado
     db.add(transaccion)
     db.commit()
+    caja_abierta.actualizar_orden(transaccion_id, estado=estado, version=transaccion.version)
     
     return RedirectResponse(
         url=f"/transacciones/{transaccion_id}",
@@ -372,7 +454,7 @@ async def actualizar_estado_transaccion_endpoint(
 
 # Actualizar método de pago de transacción
 @router.post("/{transaccion_id}/actualizar-metodo")
-async def actualizar_metodo_pago_endpoint(
+def actualizar_metodo_pago_endpoint(
     transaccion_id: int,
     metodo_pago: str = Form(...),
     db: Session = Depends(get_session)
@@ -400,6 +482,7 @@ async def actualizar_metodo_pago_endpoint(
     transaccion.metodo_pago = metodo_pago
     db.add(transaccion)
     db.commit()
+    caja_abierta.actualizar_orden(transaccion_id, metodo_pago=metodo_pago, version=transaccion.version)
     
     # Redirigir a la página desde donde vino (lista de transacciones o detalle)
     return RedirectResponse(
@@ -409,7 +492,7 @@ async def actualizar_metodo_pago_endpoint(
 
 # Verificar transferencia bancaria
 @router.post("/{transaccion_id}/verificar-transferencia")
-async def verificar_transferencia(
+def verificar_transferencia(
     transaccion_id: int,
     db: Session = Depends(get_session)
 ):
@@ -429,7 +512,7 @@ async def verificar_transferencia(
 
 # Generar PDF de transacción
 @router.get("/{transaccion_id}/pdf")
-async def generar_pdf_transaccion_endpoint(
+def generar_pdf_transaccion_endpoint(
     transaccion_id: int,
     db: Session = Depends(get_session)
 ):
@@ -452,23 +535,55 @@ async def generar_pdf_transaccion_endpoint(
 
 # Envío por email deshabilitado (ruta eliminada)
 
+# Exportación en lote de PDFs de cierres (antes de /cierres/{cierre_id})
+@router.get("/cierres/exportar")
+def exportar_cierres_pdf(
+    desde: str,
+    hasta: str,
+    transacciones: bool = False,
+    db: Session = Depends(get_session)
+):
+    """
+    Descarga un zip con el PDF de cada cierre entre `desde` y `hasta`
+    (YYYY-MM-DD, ambos inclusive) y, con `transacciones=true`, el PDF de cada
+    transacción del cierre. Los documentos se renderizan en paralelo en el
+    pool de procesos y el zip se envía a medida que están listos.
+    """
+    try:
+        fecha_desde = datetime.strptime(desde, "%Y-%m-%d")
+        fecha_hasta = datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1) - timedelta(microseconds=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas inválidas, use el formato YYYY-MM-DD")
+    if fecha_desde > fecha_hasta:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+
+    # Los snapshots se arman aquí, con la sesión de la dependencia abierta
+    contenido = exportar_cierres_zip(db, fecha_desde, fecha_hasta, transacciones)
+
+    nombre = f"cierres_{fecha_desde.strftime('%Y%m%d')}_a_{fecha_hasta.strftime('%Y%m%d')}.zip"
+    return StreamingResponse(
+        contenido,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={nombre}"}
+    )
+
 # Detalle de cierre de caja específico
 @router.get("/cierres/{cierre_id}", response_class=HTMLResponse)
 async def detalle_cierre(
     request: Request,
     cierre_id: int,
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """
     Muestra el detalle de un cierre de caja específico.
     """
-    cierre = obtener_cierre_por_id(db, cierre_id)
+    # El cierre y sus transacciones en dos consultas
+    cierre = await obtener_cierre_detalle_async(db, cierre_id)
     
     if not cierre:
         raise HTTPException(status_code=404, detail="Cierre no encontrado")
     
-    # Obtener las transacciones asociadas a este cierre
-    transacciones = db.exec(select(Orden).where(Orden.cierre_id == cierre_id)).all()
+    transacciones = sorted(cierre.ordenes, key=lambda t: t.id)
     
     return templates.TemplateResponse(
         "cierre_caja_detalle.html",
@@ -481,7 +596,7 @@ async def detalle_cierre(
 
 # Generar PDF de cierre de caja
 @router.get("/cierres/{cierre_id}/pdf")
-async def generar_pdf_cierre(
+def generar_pdf_cierre(
     cierre_id: int,
     db: Session = Depends(get_session)
 ):
@@ -512,7 +627,7 @@ async def generar_pdf_cierre(
 
 # Generar PDF del reporte de período
 @router.get("/cierres/reporte/pdf")
-async def generar_pdf_reporte_periodo(
+def generar_pdf_reporte_periodo(
     desde: Optional[str] = None,
     hasta: Optional[str] = None,
     db: Session = Depends(get_session)
@@ -563,8 +678,15 @@ async def generar_pdf_reporte_periodo(
                 "periodo": f"{desde if desde else 'Inicio'} al {hasta if hasta else 'Presente'}"
             }
         
+        # Desglose por categoría desde el resumen diario
+        ventas_categoria = ventas_por_categoria(
+            db,
+            filtros["fecha_desde"].date() if filtros.get("fecha_desde") else None,
+            filtros["fecha_hasta"].date() if filtros.get("fecha_hasta") else None
+        )
+        
         # Generar el PDF con la función de services/pdf_service.py
-        pdf_contenido, pdf_nombre = generar_pdf_reporte_periodo(db, cierres, resumen, filtros)
+        pdf_contenido, pdf_nombre = generar_pdf_reporte_periodo(db, cierres, resumen, filtros, ventas_categoria)
         
         # Devolver el PDF como respuesta
         return Response(
@@ -27,6 +27,7 @@ from services.crud_services import (
     update_producto,
     delete_producto,
 )
+from services.productos_admin_service import estadisticas_productos, pagina_productos
 from utils.navigation import redirect_with_cache_control
 
 router = APIRouter(
@@ -60,65 +61,28 @@ async def index(request: Request):
     return templates.TemplateResponse("home.html", {"request": request})
 
 
-@router.get(
-    "/productos/modales",
-    response_class=HTMLResponse,
-)
-def web_listar_productos_modales(
+def _listar_productos(
     request: Request,
-    page: int = 1,
-    limit: int = 10,
-    q: Optional[str] = None,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    session: Session,
+    current_user: User,
+    page: int,
+    limit: int,
+    q: Optional[str],
+    categoria_nombre: Optional[str] = None,
 ):
-    """Vista de productos con modales para crear/editar"""
+    """
+    Listado paginado del panel: búsqueda, filtro, página y estadísticas se
+    calculan en la base de datos (ver services/productos_admin_service.py).
+    """
     # Obtener todas las categorías para el formulario (con deduplicación)
     categorias = get_categorias_unicas(session)
     
-    # Obtener todos los productos (para estadísticas y filtrado)
-    todos_productos = get_all_productos(session)
-
-    # Aplicar filtro de búsqueda global si corresponde (nombre, código de barra, categoría)
-    productos_filtrados = todos_productos
-    if q:
-        q_l = q.strip().lower()
-        if q_l:
-            def _match(p: Producto) -> bool:
-                try:
-                    nombre = (p.nombre or "").lower()
-                    codigo = (p.codigo_barra or "").lower()
-                    cat = (p.categoria.nombre if getattr(p, "categoria", None) else "").lower()
-                    return q_l in nombre or q_l in codigo or q_l in cat
-                except Exception:
-                    return q_l in (str(p) or "").lower()
-            productos_filtrados = [p for p in todos_productos if _match(p)]
-    
-    # Utilidad local para calcular estadísticas sin depender de la paginación
-    def _calc_stats(items):
-        total = len(items)
-        con_stock = len([p for p in items if getattr(p, "cantidad", 0) > 0])
-        sin_stock = len([p for p in items if getattr(p, "cantidad", 0) == 0])
-        # Promedio de margen si existe
-        margenes = [p.margen for p in items if getattr(p, "margen", None) is not None]
-        margen_promedio = round(sum(margenes) / len(margenes), 2) if margenes else None
-        return {
-            "total_productos": total,
-            "productos_con_stock": con_stock,
-            "productos_sin_stock": sin_stock,
-            "margen_promedio": margen_promedio,
-        }
-    
-    # Estadísticas sobre el conjunto vigente (filtrado si aplica)
-    stats_vigentes = _calc_stats(productos_filtrados)
-    
-    # Calcular estadísticas
-    productos_bajo_stock = len([p for p in productos_filtrados if p.cantidad <= p.umbral_stock and p.cantidad > 0])
-    total_stock_valor = sum(p.precio * p.cantidad for p in productos_filtrados if p.cantidad > 0)
+    # Estadísticas del conjunto vigente (independientes de la paginación)
+    stats = estadisticas_productos(session, q, categoria_nombre)
     
     # Paginación de productos
-    total_productos = len(productos_filtrados)
-    total_pages = (total_productos + limit - 1) // limit  # Techo de la división
+    limit = max(1, limit)
+    total_pages = (stats["total_productos"] + limit - 1) // limit  # Techo de la división
     
     # Asegurarse de que la página sea válida
     if page < 1:
@@ -127,9 +91,7 @@ def web_listar_productos_modales(
         page = total_pages
     
     # Obtener productos para la página actual
-    start_idx = (page - 1) * limit
-    end_idx = start_idx + limit
-    productos = productos_filtrados[start_idx:end_idx]
+    productos = pagina_productos(session, q, categoria_nombre, page, limit)
     
     # Mensaje de error si existe
     error_message = None
@@ -142,14 +104,14 @@ def web_listar_productos_modales(
             "productos": productos,
             "categorias": categorias,            # Para los formularios modales
             "todas_categorias": categorias,      # Para el filtro de categorías
-            "categoria_actual": None,            # Ninguna categoría seleccionada
-            # Estadísticas del conjunto vigente (puede estar filtrado por búsqueda)
-            "total_productos": stats_vigentes["total_productos"],
-            "productos_con_stock": stats_vigentes["productos_con_stock"],
-            "productos_sin_stock": stats_vigentes["productos_sin_stock"],
-            "margen_promedio": stats_vigentes["margen_promedio"],
-            "productos_bajo_stock": productos_bajo_stock,
-            "total_stock_valor": "{:,.0f}".format(total_stock_valor),
+            "categoria_actual": categoria_nombre,
+            # Estadísticas del conjunto vigente (puede estar filtrado por categoría o búsqueda)
+            "total_productos": stats["total_productos"],
+            "productos_con_stock": stats["productos_con_stock"],
+            "productos_sin_stock": stats["productos_sin_stock"],
+            "margen_promedio": stats["margen_promedio"],
+            "productos_bajo_stock": stats["productos_bajo_stock"],
+            "total_stock_valor": "{:,.0f}".format(stats["total_stock_valor"]),
             "total_categorias": len(categorias),
             "current_user": current_user,
             "error_message": error_message,
@@ -157,11 +119,27 @@ def web_listar_productos_modales(
             "total_pages": total_pages,
             "limit": limit,
             "search_query": q or "",
-            "total_productos_sistema": len(todos_productos)
+            "total_productos_sistema": stats["total_productos_sistema"]
         }
     )
 
 
+@router.get(
+    "/productos/modales",
+    response_class=HTMLResponse,
+)
+def web_listar_productos_modales(
+    request: Request,
+    page: int = 1,
+    limit: int = 10,
+    q: Optional[str] = None,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Vista de productos con modales para crear/editar"""
+    return _listar_productos(request, session, current_user, page, limit, q)
+
+
 @router.get(
     "/productos",
     response_class=HTMLResponse,
@@ -191,94 +169,8 @@ def web_listar_productos_por_categoria(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user),
 ):
-    # Implementar la paginación para productos filtrados por categoría
-    # Obtener todas las categorías para el formulario
-    categorias = get_categorias_unicas(session)
-    
-    # Obtener todos los productos para filtrar por categoría y calcular estadísticas
-    todos_productos = get_all_productos(session)
-    
-    # Filtrar por categoría
-    if categoria_nombre == "Sin categoría":
-        productos_filtrados = [p for p in todos_productos if p.categoria is None]
-    else:
-        productos_filtrados = [p for p in todos_productos if p.categoria and p.categoria.nombre == categoria_nombre]
-
-    # Filtro adicional por búsqueda global si corresponde
-    if q:
-        q_l = q.strip().lower()
-        if q_l:
-            def _match(p: Producto) -> bool:
-                try:
-                    nombre = (p.nombre or "").lower()
-                    codigo = (p.codigo_barra or "").lower()
-                    cat = (p.categoria.nombre if getattr(p, "categoria", None) else "").lower()
-                    return q_l in nombre or q_l in codigo or q_l in cat
-                except Exception:
-                    return q_l in (str(p) or "").lower()
-            productos_filtrados = [p for p in productos_filtrados if _match(p)]
-    
-    # Calcular estadísticas para el conjunto filtrado (independientes de la paginación)
-    def _calc_stats(items):
-        total = len(items)
-        con_stock = len([p for p in items if getattr(p, "cantidad", 0) > 0])
-        sin_stock = len([p for p in items if getattr(p, "cantidad", 0) == 0])
-        margenes = [p.margen for p in items if getattr(p, "margen", None) is not None]
-        margen_promedio = round(sum(margenes) / len(margenes), 2) if margenes else None
-        return {
-            "total_productos": total,
-            "productos_con_stock": con_stock,
-            "productos_sin_stock": sin_stock,
-            "margen_promedio": margen_promedio,
-        }
-    stats_filtrados = _calc_stats(productos_filtrados)
-    productos_bajo_stock = len([p for p in productos_filtrados if p.cantidad <= p.umbral_stock and p.cantidad > 0])
-    total_stock_valor = sum(p.precio * p.cantidad for p in productos_filtrados if p.cantidad > 0)
-    
-    # Paginación
-    total_productos = len(productos_filtrados)
-    total_pages = (total_productos + limit - 1) // limit  # Techo de la división
-    
-    # Asegurarse de que la página sea válida
-    if page < 1:
-        page = 1
-    elif page > total_pages and total_pages > 0:
-        page = total_pages
-    
-    # Obtener productos para la página actual
-    start_idx = (page - 1) * limit
-    end_idx = start_idx + limit
-    productos = productos_filtrados[start_idx:end_idx]
-    
-    # Mensaje de error si existe
-    error_message = None
-    if "error_message" in request.session:
-        error_message = request.session.pop("error_message")
-    
-    return templates.TemplateResponse(
-        "index_with_modals.html", {
-            "request": request, 
-            "productos": productos,
-            "categorias": categorias,            # Para los formularios modales
-            "todas_categorias": categorias,      # Para el filtro de categorías
-            "categoria_actual": categoria_nombre,
-            # Estadísticas del conjunto filtrado (independientes de la paginación)
-            "total_productos": stats_filtrados["total_productos"],
-            "productos_con_stock": stats_filtrados["productos_con_stock"],
-            "productos_sin_stock": stats_filtrados["productos_sin_stock"],
-            "margen_promedio": stats_filtrados["margen_promedio"],
-            "productos_bajo_stock": productos_bajo_stock,
-            "total_stock_valor": "{:,.0f}".format(total_stock_valor),
-            "total_categorias": len(categorias),
-            "current_user": current_user,
-            "error_message": error_message,
-            "current_page": page,
-            "total_pages": total_pages,
-            "limit": limit,
-            "search_query": q or "",
-            "total_productos_sistema": len(todos_productos)
-        }
-    )
+    # Paginación de productos filtrados por categoría ("Sin categoría" incluida)
+    return _listar_productos(request, session, current_user, page, limit, q, categoria_nombre)
 
 
 def _render_productos_template(
@@ -2,7 +2,7 @@
 
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class ItemCreate(BaseModel):
     producto_id: int
@@ -17,6 +17,27 @@ class OrdenCreate(BaseModel):
     descuento_porcentaje: Optional[float] = 0  # Porcentaje de descuento general
     datos_adicionales: Optional[Dict[str, Any]] = None
 
+class OrdenOffline(OrdenCreate):
+    """Orden vendida sin conexión y encolada en el terminal"""
+    idempotency_key: str = Field(min_length=1, max_length=255)  # Generada por el terminal
+    fecha: Optional[datetime] = None  # Momento original de la venta
+
+class OrdenesBatchCreate(BaseModel):
+    ordenes: List[OrdenOffline] = Field(min_length=1, max_length=200)
+
+class OrdenBatchResultado(BaseModel):
+    idempotency_key: str
+    estado: str  # creada, repetida, error
+    status_code: int
+    orden: Optional[Dict[str, Any]] = None
+    detail: Optional[str] = None
+
+class OrdenesBatchResultado(BaseModel):
+    creadas: int = 0
+    repetidas: int = 0
+    fallidas: int = 0
+    resultados: List[OrdenBatchResultado]
+
 class OrdenUpdate(BaseModel):
     estado: Optional[str] = None  # aprobada, anulada, reembolsada
     metodo_pago: Optional[str] = None
@@ -38,6 +59,13 @@ class OrdenRead(BaseModel):
     class Config:
         from_attributes = True
 
+class OrdenesPagina(BaseModel):
+    """Página del listado de transacciones (paginación por cursor)"""
+    items: List[OrdenRead]
+    total: int  # Transacciones que cumplen los filtros
+    limite: int
+    siguiente_cursor: Optional[str] = None  # None si es la última página
+
 class OrdenFiltro(BaseModel):
     """Esquema para filtrar órdenes por diferentes criterios"""
     fecha_desde: Optional[datetime] = None
@@ -17,3 +17,80 @@ class ProductoRead(BaseModel):
     codigo_barra: Optional[str] = None
     image_url: Optional[str] = None
     categoria: Optional[CategoriaRead] = None
+
+
+class CategoriaSnapshot:
+    """
+    Copia inmutable y compacta de una categoría para guardar en cache.
+    Usa __slots__ para no crear un __dict__ por instancia.
+    """
+    __slots__ = ("id", "nombre")
+
+    def __init__(self, id: int, nombre: str):
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "nombre", nombre)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CategoriaSnapshot es inmutable")
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "nombre": self.nombre}
+
+
+class ProductoSnapshot:
+    """
+    Copia inmutable y desacoplada de la sesión de un Producto.
+
+    Se construye una sola vez al llenar el cache, de modo que un acierto no
+    toca atributos del ORM ni relaciones perezosas (categoria, order_items).
+    Expone los mismos atributos que usan ProductoRead y las plantillas.
+    """
+    __slots__ = (
+        "id", "nombre", "precio", "costo", "margen", "cantidad",
+        "umbral_stock", "codigo_barra", "categoria_id", "categoria",
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ProductoSnapshot es inmutable")
+
+    def __repr__(self) -> str:
+        return f"ProductoSnapshot(id={self.id!r}, nombre={self.nombre!r})"
+
+    @classmethod
+    def from_producto(cls, producto, **overrides) -> "ProductoSnapshot":
+        """Copia los campos de un Producto del ORM (con su categoría ya cargada)"""
+        categoria = producto.categoria
+        values = {
+            "id": producto.id,
+            "nombre": producto.nombre,
+            "precio": producto.precio,
+            "costo": producto.costo,
+            "margen": producto.margen,
+            "cantidad": producto.cantidad if producto.cantidad is not None else 0,
+            "umbral_stock": producto.umbral_stock,
+            "codigo_barra": producto.codigo_barra,
+            "categoria_id": producto.categoria_id,
+            "categoria": CategoriaSnapshot(categoria.id, categoria.nombre) if categoria else None,
+        }
+        values.update(overrides)
+        return cls(**values)
+
+    def replace(self, **changes) -> "ProductoSnapshot":
+        """Retorna una copia con algunos campos modificados"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return ProductoSnapshot(**values)
+
+    def to_dict(self) -> dict:
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values["categoria"] = self.categoria.to_dict() if self.categoria else None
+        return values
+
+
+def snapshot_productos(productos) -> tuple:
+    """Convierte una lista de Producto en una tupla inmutable de snapshots"""
+    return tuple(ProductoSnapshot.from_producto(p) for p in productos)
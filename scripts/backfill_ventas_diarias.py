@@ -0,0 +1,45 @@
+# scripts/backfill_ventas_diarias.py
+
+"""
+Construye el resumen diario de ventas (VentaDiaria) para los cierres
+históricos. Se puede ejecutar varias veces: cada día se recalcula completo.
+
+Uso:
+    python scripts/backfill_ventas_diarias.py [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+"""
+
+import sys
+import argparse
+import logging
+from datetime import datetime
+from pathlib import Path
+
+# Añadir el directorio raíz al path para poder importar los módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlmodel import Session
+import models.models  # noqa: F401
+from db.database import engine
+from services.ventas_diarias_service import reconstruir_ventas_diarias
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("backfill_ventas_diarias")
+
+
+def _fecha(valor: str):
+    return datetime.strptime(valor, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el resumen diario de ventas desde los cierres")
+    parser.add_argument("--desde", type=_fecha, help="Primer día a recalcular (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=_fecha, help="Último día a recalcular (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    with Session(engine) as db:
+        dias = reconstruir_ventas_diarias(db, args.desde, args.hasta)
+    logger.info(f"Resumen diario recalculado para {dias} días")
+
+
+if __name__ == "__main__":
+    main()
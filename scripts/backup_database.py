@@ -6,18 +6,23 @@ import json
 import logging
 from datetime import datetime, date
 from decimal import Decimal
-import shutil
 import argparse
+import gzip
+import hashlib
+import io
+import zipfile
 
 # Agregar el directorio raíz al path para importar desde los módulos
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.backup_config import backup_settings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, or_
 from sqlmodel import Session, select
 from models.models import Producto, Categoria
-from models.order import Orden, OrdenItem, CierreCaja
+from models.order import Orden, OrdenItem, CierreCaja, OrdenIdempotencia, VentaDiaria
 from models.user import User
+from db.probe import table_counts
+from utils.timezone import now_santiago
 
 class BackupJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -30,17 +35,20 @@ class BackupJSONEncoder(json.JSONEncoder):
 # Crear engine con configuración de backup
 engine = create_engine(backup_settings.get_database_url())
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('database_backup.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def configurar_logging():
+    """Logging a consola y a database_backup.log; solo al ejecutar el script,
+    para que importar el módulo (API, tests) no escriba archivos"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('database_backup.log'),
+            logging.StreamHandler()
+        ]
+    )
+
 # Directorio de backups
 BACKUP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backups')
 
@@ -56,124 +64,300 @@ def serialize_datetime(obj):
         return obj.isoformat()
     raise TypeError(f"No se puede serializar objeto de tipo {type(obj)}")
 
-def backup_table(session, model_class, filename):
-    """Crea un backup de una tabla específica"""
-    try:
-        # Obtener todos los registros
-        items = session.exec(select(model_class)).all()
-        
-        # Convertir a diccionarios
-        data = []
-        for item in items:
-            # Usar model_dump() en lugar de dict() (depreciado en SQLModel 0.0.14)
-            item_dict = item.model_dump() if hasattr(item, 'model_dump') else item.dict()
-            # MANTENER TODOS LOS IDs para preservar relaciones y evitar conflictos
-            data.append(item_dict)
-        
-        # Guardar en archivo JSON
-        filepath = os.path.join(BACKUP_DIR, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, cls=BackupJSONEncoder, ensure_ascii=False, indent=2)
-        
-        logger.info(f"Backup de {model_class.__name__} completado: {len(data)} registros")
-        return len(data)
-    except Exception as e:
-        logger.error(f"Error al hacer backup de {model_class.__name__}: {str(e)}")
-        return 0
+# Tablas respaldadas, en orden de dependencias.
+# (modelo, archivo, filtro incremental): el filtro recibe las marcas de agua
+# del manifiesto anterior y retorna la condición de filas nuevas o cambiadas;
+# None significa que la tabla (pequeña y editable) se respalda completa.
+TABLAS_BACKUP = [
+    (Categoria, "categorias", None),
+    (Producto, "productos", None),
+    (User, "usuarios", None),
+    # Las órdenes cambian después de creadas (estado, cierre): se incluyen las
+    # nuevas y las de cada cierre (o de la caja abierta) cuya firma cambió
+    (Orden, "transacciones", lambda marcas: or_(
+        Orden.id > marcas["transacciones"].get("max_id", 0),
+        Orden.cierre_id.in_([int(c) for c in marcas["transacciones"]["cambios"] if c != "abierta"]),
+        (Orden.cierre_id == None) & ("abierta" in marcas["transacciones"]["cambios"]),
+    )),
+    (OrdenItem, "transaccion_items", lambda marcas: OrdenItem.id > marcas["transaccion_items"].get("max_id", 0)),
+    (CierreCaja, "cierres_caja", lambda marcas: or_(
+        CierreCaja.id > marcas["cierres_caja"].get("max_id", 0),
+        CierreCaja.id.in_([int(c) for c in marcas["cierres_caja"]["cambios"]]),
+    )),
+    (OrdenIdempotencia, "orden_idempotencia", lambda marcas: OrdenIdempotencia.fecha >= datetime.fromisoformat(marcas["orden_idempotencia"]["desde"])),
+    # Los días se recalculan al cerrar la caja, siempre desde el último respaldado
+    (VentaDiaria, "ventas_diarias", lambda marcas: VentaDiaria.fecha >= date.fromisoformat(marcas["ventas_diarias"].get("max_fecha", "0001-01-01"))),
+]
+
+BATCH_SIZE = 1000
+
+def _firmas(session):
+    """
+    Firmas de cambio para el respaldo incremental, a partir de las columnas
+    `version` (se incrementan en cada UPDATE):
+
+    - transacciones: (cantidad, suma de versiones) de las órdenes de cada
+      cierre, y de las sin cierre bajo "abierta"; editar una orden de un
+      cierre antiguo cambia la firma de ese cierre
+    - cierres_caja: versión de cada cierre
+    """
+    ordenes = session.execute(
+        select(Orden.cierre_id, func.count(), func.coalesce(func.sum(Orden.version), 0))
+        .group_by(Orden.cierre_id)
+    )
+    cierres = session.execute(select(CierreCaja.id, CierreCaja.version))
+    return {
+        "transacciones": {
+            "abierta" if cierre_id is None else str(cierre_id): [cantidad, versiones]
+            for cierre_id, cantidad, versiones in ordenes
+        },
+        "cierres_caja": {str(cierre_id): version for cierre_id, version in cierres},
+    }
+
+def _cambios(anteriores, actuales):
+    """Claves cuya firma es nueva o cambió (sin firmas previas, todas)"""
+    if anteriores is None:
+        return list(actuales)
+    return [clave for clave, firma in actuales.items() if anteriores.get(clave) != firma]
+
+def _abrir_compresor(raw, compresion: str):
+    """Envuelve el archivo del ZIP con el compresor elegido"""
+    if compresion == "zstd":
+        import zstandard  # Dependencia opcional
+        return zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+    return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+
+def _abrir_descompresor(raw, compresion: str):
+    if compresion == "zstd":
+        import zstandard  # Dependencia opcional
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    return gzip.GzipFile(fileobj=raw, mode="rb")
+
+def _compresion_disponible(compresion: str) -> str:
+    if compresion == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            logger.warning("zstandard no está instalado; se usará gzip")
+            return "gzip"
+    return compresion
+
+def backup_table(session, model_class, archive, member, compresion="gzip", condicion=None):
+    """
+    Escribe una tabla como NDJSON comprimido directamente dentro del ZIP.
+    
+    Lee en lotes de BATCH_SIZE filas con un cursor del lado del servidor, así
+    que la memoria no depende del tamaño de la tabla.
+    
+    Returns:
+        Diccionario para el manifiesto: archivo, registros, sha256 del NDJSON
+        sin comprimir y marcas de agua para el próximo respaldo incremental
+    """
+    tabla = model_class.__table__
+    query = select(tabla)
+    if condicion is not None:
+        query = query.where(condicion)
+    if "id" in tabla.c:
+        query = query.order_by(tabla.c.id)
+    
+    registros = 0
+    max_id = None
+    max_fecha = None
+    checksum = hashlib.sha256()
+    with archive.open(member, "w", force_zip64=True) as raw:
+        with _abrir_compresor(raw, compresion) as comprimido:
+            resultado = session.execute(query.execution_options(yield_per=BATCH_SIZE))
+            for lote in resultado.mappings().partitions():
+                bloque = "".join(
+                    json.dumps(dict(fila), cls=BackupJSONEncoder, ensure_ascii=False, separators=(",", ":")) + "\n"
+                    for fila in lote
+                ).encode("utf-8")
+                checksum.update(bloque)
+                comprimido.write(bloque)
+                registros += len(lote)
+                ultima = lote[-1]
+                if "id" in ultima and ultima["id"] is not None:
+                    max_id = max(max_id or 0, ultima["id"])
+                if model_class is VentaDiaria:
+                    fecha = max(fila["fecha"] for fila in lote)
+                    max_fecha = max(max_fecha, fecha) if max_fecha else fecha
+    
+    info = {
+        "file": member,
+        "model": model_class.__name__,
+        "records": registros,
+        "sha256": checksum.hexdigest(),
+    }
+    if max_id is not None:
+        info["max_id"] = max_id
+    if max_fecha is not None:
+        info["max_fecha"] = max_fecha.isoformat()
+    logger.info(f"Backup de {model_class.__name__} completado: {registros} registros")
+    return info
+
+def read_backup_table(archive_path, nombre, manifest=None, verificar=True):
+    """
+    Lee una tabla de un respaldo comprimido fila por fila (sin cargarla entera).
+    
+    Args:
+        archive_path: Ruta al ZIP del respaldo
+        nombre: Nombre de la tabla en el manifiesto (p. ej. "productos")
+        manifest: Manifiesto ya leído (se lee del ZIP si no se entrega)
+        verificar: Comprobar cantidad de registros y sha256 al terminar
+    
+    Raises:
+        ValueError si el contenido no coincide con el manifiesto
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        if manifest is None:
+            manifest = json.loads(archive.read("manifest.json"))
+        info = manifest["tables"][nombre]
+        checksum = hashlib.sha256()
+        registros = 0
+        with archive.open(info["file"]) as raw:
+            with _abrir_descompresor(raw, manifest.get("compression", "gzip")) as contenido:
+                for linea in io.BufferedReader(contenido):
+                    checksum.update(linea)
+                    registros += 1
+                    yield json.loads(linea)
+    if verificar and (registros != info["records"] or checksum.hexdigest() != info["sha256"]):
+        raise ValueError(f"El respaldo de {nombre} no coincide con el manifiesto")
+
+def read_manifest(archive_path):
+    """Manifiesto de un respaldo comprimido"""
+    with zipfile.ZipFile(archive_path) as archive:
+        return json.loads(archive.read("manifest.json"))
+
+def _ultimo_manifiesto():
+    """Manifiesto del respaldo comprimido más reciente, o None"""
+    for backup in list_backups():
+        if backup.get("archive"):
+            return backup["id"], read_manifest(backup["archive"])
+    return None, None
 
-def create_full_backup():
-    """Crea un backup completo de todas las tablas importantes"""
+def create_full_backup(incremental=False, compresion="gzip"):
+    """
+    Crea un respaldo de todas las tablas importantes en backups/backup_<timestamp>.zip.
+    
+    Cada tabla se escribe como NDJSON comprimido directamente dentro del ZIP
+    (una sola pasada por la base y por el disco). El manifiesto registra
+    cantidad de registros, sha256 y marcas de agua por tabla.
+    
+    Args:
+        incremental: Solo filas nuevas o cambiadas desde el último respaldo;
+            las tablas pequeñas se respaldan completas. Si no hay respaldo
+            previo se hace uno completo.
+        compresion: "gzip" o "zstd" (requiere el paquete zstandard)
+    
+    Returns:
+        (ruta del ZIP, total de registros)
+    """
     ensure_backup_dir()
+    compresion = _compresion_disponible(compresion)
+    extension = "ndjson.zst" if compresion == "zstd" else "ndjson.gz"
     
     # Generar timestamp para los archivos
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    archive_path = os.path.join(BACKUP_DIR, f"backup_{timestamp}.zip")
+    sufijo = 1
+    while os.path.exists(archive_path):  # Dos respaldos en el mismo segundo
+        archive_path = os.path.join(BACKUP_DIR, f"backup_{timestamp}_{sufijo}.zip")
+        sufijo += 1
+    inicio = now_santiago().replace(tzinfo=None)
     
-    # Crear un directorio para este backup específico
-    backup_subdir = os.path.join(BACKUP_DIR, f"backup_{timestamp}")
-    os.makedirs(backup_subdir, exist_ok=True)
-    
-    with Session(engine) as session:
-        # Mapeo de modelos a nombres de archivo
-        backups = [
-            (Categoria, "categorias.json"),
-            (Producto, "productos.json"),
-            (User, "usuarios.json"),
-            (Orden, "transacciones.json"),  # Orden actúa como transacción en este sistema
-            (OrdenItem, "transaccion_items.json"),  # Items de las transacciones
-            (CierreCaja, "cierres_caja.json")
-        ]
-        
-        total_records = 0
-        for model_class, filename in backups:
-            count = backup_table(session, model_class, os.path.join(backup_subdir, filename))
-            total_records += count
-        
-        # Crear un archivo de manifiesto con información del backup
-        manifest = {
-            "timestamp": timestamp,
-            "date": datetime.now().isoformat(),
-            "total_records": total_records,
-            "files": [b[1] for b in backups]
-        }
-        
-        with open(os.path.join(backup_subdir, "manifest.json"), 'w', encoding='utf-8') as f:
-            json.dump(manifest, f, cls=BackupJSONEncoder, ensure_ascii=False, indent=2)
-        
-        # Crear un archivo ZIP con todo el contenido para fácil descarga
-        shutil.make_archive(
-            os.path.join(BACKUP_DIR, f"backup_{timestamp}"),
-            'zip',
-            backup_subdir
-        )
-        
-        logger.info(f"Backup completo creado en {backup_subdir}")
-        logger.info(f"Archivo ZIP creado: backup_{timestamp}.zip")
-        
-        return backup_subdir, total_records
+    base_id, base = _ultimo_manifiesto() if incremental else (None, None)
+    if incremental and not base:
+        logger.info("No hay respaldo previo: se creará un respaldo completo")
+    marcas = {}
+    if base:
+        marcas = {nombre: dict(base["tables"].get(nombre, {})) for _, nombre, _ in TABLAS_BACKUP}
+        marcas["orden_idempotencia"]["desde"] = base["started_at"]
+    
+    tables = {}
+    temporal = archive_path + ".partial"
+    try:
+        with Session(engine) as session, zipfile.ZipFile(temporal, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+            # Antes de leer las filas: un cambio concurrente se vuelve a
+            # incluir en el próximo incremental en vez de perderse
+            firmas = _firmas(session)
+            for nombre, actuales in firmas.items():
+                if base:
+                    marcas[nombre]["cambios"] = _cambios(marcas[nombre].get("firmas"), actuales)
+            for model_class, nombre, filtro in TABLAS_BACKUP:
+                condicion = filtro(marcas) if base and filtro else None
+                info = backup_table(session, model_class, archive, f"{nombre}.{extension}", compresion, condicion)
+                info["mode"] = "incremental" if condicion is not None else "full"
+                # Las marcas de agua no retroceden: un incremental puede traer
+                # solo filas antiguas editadas, o ninguna
+                for clave in ("max_id", "max_fecha"):
+                    anterior = marcas.get(nombre, {}).get(clave)
+                    if anterior is not None:
+                        info[clave] = max(info.get(clave, anterior), anterior)
+                if nombre in firmas:
+                    info["firmas"] = firmas[nombre]
+                tables[nombre] = info
+            
+            total_records = sum(t["records"] for t in tables.values())
+            manifest = {
+                "version": 2,
+                "format": "ndjson",
+                "compression": compresion,
+                "timestamp": timestamp,
+                "date": datetime.now().isoformat(),
+                "started_at": inicio.isoformat(),
+                "mode": "incremental" if base else "full",
+                "base": base_id,
+                "total_records": total_records,
+                "files": [t["file"] for t in tables.values()],
+                "tables": tables,
+            }
+            archive.writestr("manifest.json", json.dumps(manifest, cls=BackupJSONEncoder, ensure_ascii=False, indent=2))
+        os.replace(temporal, archive_path)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    
+    logger.info(f"Backup {manifest['mode']} creado: {archive_path} ({total_records} registros)")
+    return archive_path, total_records
 
 def check_database_status():
     """Verifica el estado actual de la base de datos"""
     try:
-        with Session(engine) as session:
-            status = {}
-            total_records = 0
-            
-            # Verificar cada tabla
-            tables = {
-                'productos': Producto,
-                'categorias': Categoria,
-                'usuarios': User,
-                'ordenes': Orden,
-                'orden_items': OrdenItem,
-                'cierres_caja': CierreCaja
-            }
-            
-            for table_name, model_class in tables.items():
-                try:
-                    count = len(session.exec(select(model_class)).all())
-                    status[table_name] = count
-                    total_records += count
-                except Exception as e:
-                    logger.error(f"Error contando {table_name}: {str(e)}")
-                    status[table_name] = 0
-            
-            status['total_records'] = total_records
-            
-            return status
-            
+        # Un COUNT por tabla en una sola consulta; siempre el estado actual
+        status = table_counts(engine, refresh=True)
+        status['total_records'] = sum(status.values())
+        return status
+        
     except Exception as e:
         logger.error(f"Error verificando estado de la base de datos: {str(e)}")
         return {'total_records': 0, 'error': str(e)}
 
 def list_backups():
-    """Lista todos los backups disponibles"""
+    """Lista todos los backups disponibles (comprimidos y directorios antiguos)"""
     ensure_backup_dir()
     
     backups = []
     for item in os.listdir(BACKUP_DIR):
-        if os.path.isdir(os.path.join(BACKUP_DIR, item)) and item.startswith("backup_"):
+        path = os.path.join(BACKUP_DIR, item)
+        if item.startswith("backup_") and item.endswith(".zip") and os.path.isfile(path):
+            # Respaldo comprimido: el manifiesto va dentro del ZIP
+            try:
+                manifest = read_manifest(path)
+            except (KeyError, ValueError, zipfile.BadZipFile):
+                continue  # Sin manifiesto o dañado
+            if manifest.get("version", 1) < 2:
+                continue  # Copia ZIP de un directorio antiguo: ya se lista por el directorio
+            backups.append({
+                "id": item[:-len(".zip")],
+                "archive": path,
+                "date": manifest.get("date", "Desconocida"),
+                "records": manifest.get("total_records", 0),
+                "files": manifest.get("files", []),
+                "mode": manifest.get("mode", "full")
+            })
+        elif os.path.isdir(path) and item.startswith("backup_"):
             # Verificar si existe el manifiesto
-            manifest_path = os.path.join(BACKUP_DIR, item, "manifest.json")
+            manifest_path = os.path.join(path, "manifest.json")
             if os.path.exists(manifest_path):
                 try:
                     with open(manifest_path, 'r', encoding='utf-8') as f:
@@ -204,11 +388,13 @@ def main():
     parser.add_argument('--create', action='store_true', help='Crear un nuevo backup')
     parser.add_argument('--list', action='store_true', help='Listar backups disponibles')
     parser.add_argument('--status', action='store_true', help='Verificar estado de la base de datos')
+    parser.add_argument('--incremental', action='store_true', help='Solo filas nuevas o cambiadas desde el último backup')
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], default='gzip', help='Compresión de las tablas (zstd requiere zstandard)')
     
     args = parser.parse_args()
     
     if args.create:
-        backup_dir, count = create_full_backup()
+        backup_dir, count = create_full_backup(args.incremental, args.compression)
         print(f"Backup creado con éxito: {count} registros guardados en {backup_dir}")
     elif args.list:
         backups = list_backups()
@@ -226,8 +412,9 @@ def main():
             print(f"Error: {status['error']}")
     else:
         # Sin argumentos, crear un backup por defecto
-        backup_dir, count = create_full_backup()
+        backup_dir, count = create_full_backup(args.incremental, args.compression)
         print(f"Backup creado con éxito: {count} registros guardados en {backup_dir}")
 
 if __name__ == "__main__":
+    configurar_logging()
     main()
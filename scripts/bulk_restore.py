@@ -0,0 +1,506 @@
+#!/usr/bin/env python
+# scripts/bulk_restore.py
+
+"""
+Restauración masiva de respaldos.
+
+En lugar de buscar cada fila del respaldo antes de insertarla, cada tabla se
+carga primero en una tabla temporal (executemany en lotes, o COPY en
+PostgreSQL) y luego se aplica con unas pocas sentencias sobre conjuntos:
+
+1. Se remapean las claves foráneas con los IDs ya asignados a las tablas
+   referenciadas (un UPDATE por columna).
+2. Se asigna el ID final de cada fila:
+   - tablas con clave natural (categoría por nombre, producto por código de
+     barras o nombre, usuario por username): si ya existe una fila
+     equivalente se usa su ID; si no, se conserva el ID original cuando está
+     libre y si no se asigna uno nuevo;
+   - tablas sin clave natural (cierres, órdenes, ítems): la misma fila se
+     reconoce por su huella (fecha del cierre u orden, orden y producto del
+     ítem) y conserva su ID, de modo que restaurar dos veces o aplicar
+     respaldos incrementales no duplica filas; si el ID original lo ocupa
+     otra fila se asigna uno nuevo y la fila viva no se toca.
+3. Un único INSERT ... SELECT ... ON CONFLICT DO UPDATE por tabla (DO
+   NOTHING para las claves de idempotencia: la registrada en la base manda).
+
+Todo ocurre en una sola transacción: o se restaura el respaldo completo o
+no cambia nada.
+
+Todas las herramientas de restauración pasan por `restore_archive`, que
+además resuelve la cadena de un respaldo incremental.
+
+Uso:
+    python scripts/bulk_restore.py RUTA_RESPALDO
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv
+import io
+import json
+import logging
+import time
+import zipfile
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import (
+    Column, Date, DateTime, Index, Integer, MetaData, Table, and_, delete, exists,
+    func, insert, select, text, true, update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from pydantic_core import PydanticUndefined
+
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenIdempotencia, OrdenItem, VentaDiaria
+from models.user import User
+from db.probe import invalidate_database_state
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+# (nombre en el respaldo, modelo, claves naturales en orden de prioridad,
+#  claves foráneas {columna: tabla referenciada en el respaldo})
+TABLAS_RESTORE = [
+    ("categorias", Categoria, [("nombre",)], {}),
+    ("productos", Producto, [("codigo_barra",), ("nombre",)], {"categoria_id": "categorias"}),
+    ("usuarios", User, [("username",)], {}),
+    ("cierres_caja", CierreCaja, [], {}),
+    ("transacciones", Orden, [], {"cierre_id": "cierres_caja"}),
+    ("transaccion_items", OrdenItem, [], {"orden_id": "transacciones", "producto_id": "productos"}),
+    ("orden_idempotencia", OrdenIdempotencia, [], {"orden_id": "transacciones"}),
+    ("ventas_diarias", VentaDiaria, [], {"producto_id": "productos"}),
+]
+
+# Columnas que identifican la misma fila en tablas sin clave natural, para
+# reconocerla al restaurar otra vez aunque haya recibido un ID nuevo
+HUELLAS = {
+    "cierres_caja": ("fecha",),
+    "transacciones": ("fecha",),
+    "transaccion_items": ("orden_id", "producto_id"),
+}
+
+# Tablas cuyas filas existentes no se sobrescriben
+SOLO_INSERTAR = {"orden_idempotencia"}
+
+
+# ---------------------------------------------------------------------------
+# Lectura del respaldo
+# ---------------------------------------------------------------------------
+
+def _leer_json_antiguo(origen: str, nombre: str) -> Optional[List[Dict[str, Any]]]:
+    """Tabla de un respaldo antiguo (directorio o ZIP con <nombre>.json)"""
+    archivo = f"{nombre}.json"
+    if os.path.isdir(origen):
+        ruta = os.path.join(origen, archivo)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with zipfile.ZipFile(origen) as archive:
+        # En la raíz (shutil.make_archive) o dentro de una carpeta backup_*/
+        miembros = [n for n in archive.namelist() if n == archivo or n.endswith("/" + archivo)]
+        if not miembros:
+            return None
+        return json.loads(archive.read(min(miembros, key=len)))
+
+
+def leer_respaldo(origen: str) -> Iterator[tuple]:
+    """
+    Recorre las tablas de un respaldo como (nombre, filas).
+
+    Acepta respaldos comprimidos (manifiesto versión 2, se leen por
+    streaming y se verifica su checksum) y respaldos antiguos en JSON, como
+    directorio o ZIP.
+    """
+    manifest = None
+    if zipfile.is_zipfile(origen):
+        with zipfile.ZipFile(origen) as archive:
+            if "manifest.json" in archive.namelist():
+                manifest = json.loads(archive.read("manifest.json"))
+    if manifest and manifest.get("version", 1) >= 2:
+        from scripts.backup_database import read_backup_table
+        for nombre, *_ in TABLAS_RESTORE:
+            if nombre in manifest["tables"]:
+                yield nombre, read_backup_table(origen, nombre, manifest)
+        return
+    for nombre, *_ in TABLAS_RESTORE:
+        filas = _leer_json_antiguo(origen, nombre)
+        if filas is not None:
+            yield nombre, filas
+
+
+# ---------------------------------------------------------------------------
+# Carga en tablas temporales
+# ---------------------------------------------------------------------------
+
+def _conversor(columna):
+    if isinstance(columna.type, DateTime):
+        return lambda v: datetime.fromisoformat(v) if isinstance(v, str) else v
+    if isinstance(columna.type, Date):
+        return lambda v: date.fromisoformat(v[:10]) if isinstance(v, str) else v
+    return None
+
+
+def _valores_por_defecto(model) -> Dict[str, Any]:
+    """Valores por defecto del modelo para columnas ausentes en respaldos antiguos"""
+    defaults = {}
+    for nombre, campo in model.model_fields.items():
+        if campo.default is not PydanticUndefined or campo.default_factory is not None:
+            defaults[nombre] = campo.get_default(call_default_factory=True)
+    return defaults
+
+
+def _filas_normalizadas(model, filas: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Ajusta cada fila a las columnas de la tabla, con tipos de Python"""
+    tabla = model.__table__
+    defaults = _valores_por_defecto(model)
+    conversores = {c.name: _conversor(c) for c in tabla.columns}
+    for fila_num, fila in enumerate(filas, start=1):
+        normalizada = {"fila": fila_num}
+        for columna, conversor in conversores.items():
+            valor = fila.get(columna, defaults.get(columna))
+            if valor is not None and conversor is not None:
+                valor = conversor(valor)
+            normalizada[columna] = valor
+        yield normalizada
+
+
+def _crear_stage(conn, nombre: str, model) -> Table:
+    """Tabla temporal con las columnas del modelo más `fila` y `nuevo_id`"""
+    columnas = [Column(c.name, c.type) for c in model.__table__.columns]
+    stage = Table(
+        f"stage_{nombre}", MetaData(), *columnas,
+        Column("fila", Integer), Column("nuevo_id", Integer),
+        prefixes=["TEMPORARY"],
+    )
+    stage.create(conn)
+    Index(f"ix_stage_{nombre}_fila", stage.c.fila).create(conn)
+    if "id" in stage.c:
+        Index(f"ix_stage_{nombre}_id", stage.c.id).create(conn)
+    return stage
+
+
+def _valor_copy(valor) -> Any:
+    if valor is None:
+        return r"\N"
+    if isinstance(valor, bool):
+        return "t" if valor else "f"
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _copy_lote(conn, stage: Table, lote: List[Dict[str, Any]]) -> None:
+    """Carga un lote con COPY ... FROM STDIN (PostgreSQL)"""
+    columnas = [c.name for c in stage.columns if c.name != "nuevo_id"]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for fila in lote:
+        writer.writerow([_valor_copy(fila[c]) for c in columnas])
+    buffer.seek(0)
+    preparer = conn.dialect.identifier_preparer
+    sql = (
+        f"COPY {preparer.quote(stage.name)} ({', '.join(preparer.quote(c) for c in columnas)}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    )
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+
+
+def cargar_stage(conn, stage: Table, filas: Iterable[Dict[str, Any]]) -> int:
+    """Carga las filas en la tabla temporal en lotes; retorna la cantidad"""
+    usar_copy = conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+    total = 0
+    lote: List[Dict[str, Any]] = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= BATCH_SIZE:
+            _copy_lote(conn, stage, lote) if usar_copy else conn.execute(insert(stage), lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        _copy_lote(conn, stage, lote) if usar_copy else conn.execute(insert(stage), lote)
+        total += len(lote)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Operaciones sobre conjuntos
+# ---------------------------------------------------------------------------
+
+def _remapear_foraneas(conn, stage: Table, foraneas: Dict[str, str], stages: Dict[str, Table]) -> None:
+    """Reemplaza cada clave foránea por el ID asignado a la fila referenciada"""
+    for columna, referida in foraneas.items():
+        ref = stages.get(referida)
+        if ref is None or "id" not in ref.c:
+            continue
+        nuevo = select(ref.c.nuevo_id).where(ref.c.id == stage.c[columna]).scalar_subquery()
+        conn.execute(
+            update(stage)
+            .where(stage.c[columna].in_(select(ref.c.id)))
+            .values({columna: nuevo})
+        )
+
+
+def _usar_existentes(conn, stage: Table, tabla: Table, clave: tuple, condicion) -> None:
+    """Asigna a las filas pendientes el ID de la fila existente con la misma clave"""
+    existente = (
+        select(func.min(tabla.c.id))
+        .where(*(tabla.c[c] == stage.c[c] for c in clave))
+        .scalar_subquery()
+    )
+    conn.execute(
+        update(stage)
+        .where(stage.c.nuevo_id == None, condicion)
+        .values(nuevo_id=existente)
+    )
+
+
+def _asignar_ids(conn, stage: Table, tabla: Table, claves: List[tuple], huella: tuple = ()) -> None:
+    """Decide el ID final (`nuevo_id`) de cada fila de una tabla con `id` entero"""
+    pendiente = stage.c.nuevo_id == None
+
+    # 1. Filas equivalentes que ya existen, por clave natural
+    for clave in claves:
+        _usar_existentes(conn, stage, tabla, clave,
+                         and_(*(and_(stage.c[c] != None, stage.c[c] != "") for c in clave)))
+
+    # 1b. Sin clave natural: la misma fila en su ID original o, si ese ID lo
+    #     ocupa otra fila, en el ID que recibió en una restauración anterior
+    if huella:
+        misma = exists().where(tabla.c.id == stage.c.id, *(tabla.c[c] == stage.c[c] for c in huella))
+        conn.execute(update(stage).where(pendiente, misma).values(nuevo_id=stage.c.id))
+        _usar_existentes(conn, stage, tabla, huella, and_(*(stage.c[c] != None for c in huella)))
+
+    # 2. Conservar el ID original si está libre
+    libre = ~exists().where(tabla.c.id == stage.c.id)
+    conn.execute(update(stage).where(pendiente, stage.c.id != None, libre).values(nuevo_id=stage.c.id))
+
+    # 3. IDs nuevos para el resto, a continuación del mayor en uso
+    if not conn.execute(select(func.count()).select_from(stage).where(pendiente)).scalar():
+        return
+    base = max(
+        conn.execute(select(func.coalesce(func.max(tabla.c.id), 0))).scalar(),
+        conn.execute(select(func.coalesce(func.max(stage.c.nuevo_id), 0))).scalar(),
+    )
+    mapa = Table(
+        f"{stage.name}_ids", MetaData(),
+        Column("fila", Integer, primary_key=True), Column("nuevo_id", Integer),
+        prefixes=["TEMPORARY"],
+    )
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {mapa.name}")
+    mapa.create(conn)
+    conn.execute(insert(mapa).from_select(
+        ["fila", "nuevo_id"],
+        select(stage.c.fila, base + func.row_number().over(order_by=stage.c.fila)).where(pendiente),
+    ))
+    conn.execute(
+        update(stage)
+        .where(pendiente)
+        .values(nuevo_id=select(mapa.c.nuevo_id).where(mapa.c.fila == stage.c.fila).scalar_subquery())
+    )
+    mapa.drop(conn)
+
+
+def _descartar_huerfanas(conn, stage: Table, tabla: Table, foraneas: Dict[str, str]) -> int:
+    """
+    Las claves foráneas que no apuntan a una fila existente se dejan en NULL
+    si la columna lo permite; si no, la fila se descarta.
+
+    Returns:
+        Cantidad de filas descartadas
+    """
+    descartadas = 0
+    for columna in foraneas:
+        fk = next(iter(tabla.c[columna].foreign_keys)).column
+        huerfana = and_(stage.c[columna] != None, ~exists().where(fk == stage.c[columna]))
+        if tabla.c[columna].nullable:
+            conn.execute(update(stage).where(huerfana).values({columna: None}))
+        else:
+            descartadas += conn.execute(delete(stage).where(huerfana)).rowcount
+    return descartadas
+
+
+def _upsert(conn, stage: Table, tabla: Table, actualizar_existentes: bool = True) -> int:
+    """INSERT ... SELECT desde la tabla temporal, actualizando las filas que ya existen"""
+    pk = [c.name for c in tabla.primary_key.columns]
+    usa_id = pk == ["id"]
+    columnas = [c.name for c in tabla.columns]
+    origen = [stage.c.nuevo_id if (usa_id and c == "id") else stage.c[c] for c in columnas]
+    # Si varias filas del respaldo caen en la misma clave gana la última
+    clave = [stage.c.nuevo_id] if usa_id else [stage.c[c] for c in pk]
+    ultimas = select(func.max(stage.c.fila)).group_by(*clave)
+    filas = select(*origen).where(stage.c.fila.in_(ultimas))
+
+    insert_dialecto = pg_insert if conn.dialect.name == "postgresql" else sqlite_insert
+    # SQLite exige un WHERE en el SELECT para no confundir ON CONFLICT con un JOIN
+    stmt = insert_dialecto(tabla).from_select(columnas, filas.where(true()))
+    actualizar = {c: stmt.excluded[c] for c in columnas if c not in pk}
+    if actualizar and actualizar_existentes:
+        stmt = stmt.on_conflict_do_update(index_elements=pk, set_=actualizar)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=pk)
+    return conn.execute(stmt).rowcount
+
+
+def _ajustar_secuencias(conn) -> None:
+    """Deja las secuencias de PostgreSQL después del mayor ID restaurado"""
+    if conn.dialect.name != "postgresql":
+        return
+    for _, model, _, _ in TABLAS_RESTORE:
+        tabla = model.__table__
+        if "id" not in tabla.c:
+            continue
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{tabla.name}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{tabla.name}\"), 0) + 1, false)"
+        ))
+
+
+def bulk_restore(origen: str, engine=None) -> Dict[str, int]:
+    """
+    Restaura un respaldo completo o incremental en una sola transacción.
+
+    Args:
+        origen: ZIP de respaldo (nuevo o antiguo) o directorio con los JSON
+        engine: engine de destino; por defecto el de la aplicación
+
+    Returns:
+        Filas aplicadas por tabla del respaldo
+    """
+    if engine is None:
+        from db.database import engine
+
+    inicio = time.perf_counter()
+    resultado: Dict[str, int] = {}
+    stages: Dict[str, Table] = {}
+    modelos = {nombre: (model, claves, foraneas) for nombre, model, claves, foraneas in TABLAS_RESTORE}
+
+    with engine.begin() as conn:
+        for nombre, filas in leer_respaldo(origen):
+            model, claves, foraneas = modelos[nombre]
+            tabla = model.__table__
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS stage_{nombre}")
+            stage = _crear_stage(conn, nombre, model)
+            stages[nombre] = stage
+
+            cargadas = cargar_stage(conn, stage, _filas_normalizadas(model, filas))
+            _remapear_foraneas(conn, stage, foraneas, stages)
+            if "id" in tabla.c:
+                _asignar_ids(conn, stage, tabla, claves, HUELLAS.get(nombre, ()))
+            descartadas = _descartar_huerfanas(conn, stage, tabla, foraneas)
+            resultado[nombre] = _upsert(conn, stage, tabla, nombre not in SOLO_INSERTAR)
+
+            mensaje = f"{nombre}: {cargadas} filas en el respaldo, {resultado[nombre]} aplicadas"
+            if descartadas:
+                mensaje += f", {descartadas} descartadas por referencias inexistentes"
+            logger.info(mensaje)
+
+        _ajustar_secuencias(conn)
+        for stage in stages.values():
+            stage.drop(conn)
+    invalidate_database_state()
+
+    logger.info(f"Restauración masiva completada en {time.perf_counter() - inicio:.2f}s")
+    return resultado
+
+
+def leer_manifiesto(origen: str) -> Optional[Dict[str, Any]]:
+    """Manifiesto de un respaldo (directorio o ZIP), o None si no tiene"""
+    if os.path.isdir(origen):
+        ruta = os.path.join(origen, "manifest.json")
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with zipfile.ZipFile(origen) as archive:
+        miembros = [n for n in archive.namelist() if n == "manifest.json" or n.endswith("/manifest.json")]
+        if not miembros:
+            return None
+        return json.loads(archive.read(min(miembros, key=len)))
+
+
+def resolver_origen(origen: str) -> str:
+    """
+    Ubica el respaldo dentro de `origen`.
+
+    Un directorio sin tablas que contiene un único backup_* (ZIP extraído
+    o descarga de GitHub) se resuelve a esa carpeta.
+
+    Raises:
+        FileNotFoundError si no existe
+        ValueError si no es un respaldo que se pueda restaurar
+    """
+    if not os.path.exists(origen):
+        raise FileNotFoundError(f"No existe el respaldo: {origen}")
+    if not os.path.isdir(origen):
+        if not zipfile.is_zipfile(origen):
+            raise ValueError(f"No es un ZIP de respaldo: {origen}")
+        return origen
+
+    manifest = leer_manifiesto(origen)
+    if manifest and manifest.get("version", 1) >= 2:
+        raise ValueError(f"{origen} es un respaldo comprimido extraído; restaure el ZIP original")
+    if manifest or any(os.path.exists(os.path.join(origen, f"{n}.json")) for n, *_ in TABLAS_RESTORE):
+        return origen
+    internos = [n for n in os.listdir(origen) if n.startswith("backup_")]
+    if len(internos) == 1:
+        return resolver_origen(os.path.join(origen, internos[0]))
+    raise ValueError(f"No se encontró un respaldo en {origen}")
+
+
+def cadena_respaldos(origen: str) -> List[str]:
+    """
+    Respaldos a aplicar, el más antiguo primero: un incremental va precedido
+    de su respaldo base (<base>.zip en el mismo directorio), y así
+    sucesivamente.
+    """
+    cadena = [origen]
+    while True:
+        manifest = leer_manifiesto(cadena[0]) or {}
+        if manifest.get("mode") != "incremental" or not manifest.get("base"):
+            return cadena
+        base = os.path.join(os.path.dirname(cadena[0]), f"{manifest['base']}.zip")
+        if not os.path.exists(base) or base in cadena:
+            logger.warning(f"No se encontró el respaldo base de {os.path.basename(cadena[0])}; se aplica igual")
+            return cadena
+        cadena.insert(0, base)
+
+
+def restore_archive(origen: str, engine=None) -> Dict[str, int]:
+    """
+    Restaura un respaldo en cualquiera de sus formatos: ZIP comprimido
+    (versión 2, con su cadena de incrementales), ZIP antiguo con los JSON o
+    directorio de respaldo.
+
+    Cada respaldo de la cadena se aplica con `bulk_restore` en su propia
+    transacción.
+
+    Returns:
+        Filas aplicadas por tabla, sumadas sobre la cadena
+    """
+    totales: Dict[str, int] = {}
+    for archivo in cadena_respaldos(resolver_origen(origen)):
+        logger.info(f"Aplicando respaldo {os.path.basename(archivo)}")
+        for nombre, cantidad in bulk_restore(archivo, engine).items():
+            totales[nombre] = totales.get(nombre, 0) + cantidad
+    return totales
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Restaura un respaldo en bloque")
+    parser.add_argument("origen", help="ZIP de respaldo o directorio con los JSON")
+    args = parser.parse_args()
+
+    totales = restore_archive(args.origen)
+    logger.info(f"Total: {sum(totales.values())} filas restauradas")
@@ -0,0 +1,126 @@
+# scripts/check_query_plans.py
+
+"""
+Verifica con EXPLAIN que las consultas principales de órdenes y cierres de
+caja usen índices.
+
+Termina con código 1 si alguna consulta recorre una tabla completa
+(Seq Scan en PostgreSQL, SCAN en SQLite, que también recorre índices
+completos). En PostgreSQL se
+desactiva enable_seqscan durante la verificación para que el resultado no
+dependa del tamaño de las tablas: si aun así aparece un Seq Scan es porque
+no hay un índice que sirva.
+
+Uso:
+    python scripts/check_query_plans.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from typing import List, Tuple
+import logging
+import re
+
+from sqlalchemy import text
+from sqlmodel import func, select
+
+import models.models  # noqa: F401  (registra Producto antes que las órdenes)
+from models.models import Producto
+from models.order import Orden, OrdenItem
+from services.cierre_caja_service import condiciones_dia_sin_cierre
+from services.transacciones_service import _aplicar_filtros
+from utils.timezone import today_santiago
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_SCAN_SQLITE = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+
+
+def consultas_principales() -> List[Tuple[str, object, bool]]:
+    """
+    Sentencias equivalentes a las que ejecutan los servicios de órdenes, con
+    un indicador de si se acepta recorrer un índice en orden (ORDER BY ...
+    LIMIT que se detiene al completar la página).
+    """
+    abiertas = condiciones_dia_sin_cierre(today_santiago())
+    hoy = datetime.combine(today_santiago(), datetime.min.time())
+    filtros = {
+        "metodo_pago": "efectivo",
+        "estado": "aprobada",
+        "fecha_desde": hoy,
+        "fecha_hasta": hoy,
+    }
+    pagina = (Orden.fecha.desc(), Orden.id.desc())
+    return [
+        ("caja abierta por método y estado", select(
+            Orden.metodo_pago, Orden.estado, func.count(Orden.id), func.sum(Orden.total)
+        ).where(*abiertas).group_by(Orden.metodo_pago, Orden.estado), False),
+        ("costo de la caja abierta", select(func.sum(OrdenItem.cantidad * Producto.costo))
+            .select_from(OrdenItem)
+            .join(Orden, Orden.id == OrdenItem.orden_id)
+            .join(Producto, Producto.id == OrdenItem.producto_id)
+            .where(*abiertas, Orden.estado == "aprobada", Producto.costo != None), False),
+        ("órdenes de un cierre", select(
+            Orden.metodo_pago, Orden.estado, func.count(Orden.id), func.sum(Orden.total)
+        ).where(Orden.cierre_id == 1).group_by(Orden.metodo_pago, Orden.estado), False),
+        ("primera página de transacciones", select(Orden).order_by(*pagina).limit(51), True),
+        ("transacciones por método, estado y fecha",
+            _aplicar_filtros(select(Orden), filtros).order_by(*pagina).limit(51), False),
+        ("ítems de una orden", select(OrdenItem).where(OrdenItem.orden_id == 1), False),
+        ("ventas de un producto", select(OrdenItem).where(OrdenItem.producto_id == 1), False),
+    ]
+
+
+def _plan(conn, sql: str, recorrido_ordenado: bool) -> Tuple[List[str], List[str]]:
+    """Retorna (líneas del plan, tablas recorridas completas)"""
+    if conn.dialect.name == "sqlite":
+        lineas = [fila[3] for fila in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        completas = [
+            m.group(1) for m in map(_SCAN_SQLITE.match, lineas)
+            if m and not (recorrido_ordenado and "USING INDEX" in m.group(0))
+        ]
+    else:
+        lineas = [fila[0] for fila in conn.execute(text(f"EXPLAIN {sql}"))]
+        completas = [
+            linea.split("Seq Scan on ", 1)[1].split()[0]
+            for linea in lineas if "Seq Scan on " in linea
+        ]
+    return lineas, completas
+
+
+def verificar_planes(engine) -> List[Tuple[str, List[str]]]:
+    """
+    Ejecuta EXPLAIN sobre las consultas principales.
+
+    Returns:
+        Lista de (consulta, tablas recorridas completas); vacía si todas usan índices
+    """
+    fallidas = []
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for nombre, statement, recorrido_ordenado in consultas_principales():
+            sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            lineas, completas = _plan(conn, sql, recorrido_ordenado)
+            logger.debug(f"{nombre}:\n    " + "\n    ".join(lineas))
+            if completas:
+                logger.error(f"❌ {nombre}: recorre {', '.join(completas)} completa")
+                fallidas.append((nombre, completas))
+            else:
+                logger.info(f"✅ {nombre}")
+        conn.rollback()
+    return fallidas
+
+
+if __name__ == "__main__":
+    from db.database import engine
+
+    fallidas = verificar_planes(engine)
+    if fallidas:
+        logger.error(f"{len(fallidas)} consulta(s) sin índice. ¿Se aplicaron las migraciones?")
+        sys.exit(1)
+    logger.info("Todas las consultas principales usan índices")
@@ -54,7 +54,6 @@ def descargar_backup_github():
     """Descarga el último backup desde GitHub Releases o Actions"""
     try:
         import requests
-        import zipfile
         import io
         import os
         
@@ -91,16 +90,9 @@ def descargar_backup_github():
         
         logger.info(f"Backup descargado correctamente: {zip_path}")
         
-        # Extraer el archivo ZIP
-        extract_dir = os.path.join(backup_dir, 'latest_github_extract')
-        os.makedirs(extract_dir, exist_ok=True)
-        
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        logger.info(f"Backup extraído en: {extract_dir}")
-        
-        return extract_dir
+        # El ZIP se restaura directamente (scripts/bulk_restore.py acepta
+        # tanto los respaldos comprimidos como los antiguos con JSON)
+        return zip_path
     except Exception as e:
         logger.error(f"Error al descargar backup desde GitHub: {str(e)}")
         return None
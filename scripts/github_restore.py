@@ -16,7 +16,8 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importar funciones necesarias de los scripts existentes
-from scripts.restore_database import restore_backup
+from db.database import engine
+from scripts.bulk_restore import restore_archive
 
 # Configurar logging
 log_file = os.path.join(
@@ -83,52 +84,70 @@ def download_from_github(backup_url, token=None):
         traceback.print_exc()
         return None
 
+def _nombre_destino(nombre):
+    """Ruta libre en backups/ para `nombre`; si ya existe se agrega la hora"""
+    destino = os.path.join(BACKUP_DIR, nombre)
+    if os.path.exists(destino):
+        base, extension = os.path.splitext(nombre) if nombre.endswith('.zip') else (nombre, '')
+        destino = os.path.join(BACKUP_DIR, f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}")
+    return destino
+
 def extract_backup(zip_path):
     """
-    Extrae un archivo ZIP de backup
+    Deja el backup descargado en backups/ listo para restaurar
+    
+    Acepta los respaldos comprimidos (manifest.json y tablas en la raíz del
+    ZIP), que se guardan tal cual, un artefacto que envuelve un backup_*.zip
+    y los ZIP antiguos con un directorio backup_* dentro.
     
     Args:
         zip_path: Ruta al archivo ZIP
     
     Returns:
-        str: Ruta al directorio donde se extrajo el backup o None si falla
+        str: Ruta al backup (ZIP o directorio) o None si falla
     """
     try:
-        # Crear un directorio temporal para la extracción
-        extract_dir = tempfile.mkdtemp()
-        
-        logger.info(f"Extrayendo backup a: {extract_dir}")
-        
-        # Extraer el ZIP
+        os.makedirs(BACKUP_DIR, exist_ok=True)
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            nombres = zip_ref.namelist()
+            
+            # Respaldo con el manifiesto en la raíz: se restaura sin extraer
+            if "manifest.json" in nombres:
+                manifest = json.loads(zip_ref.read("manifest.json"))
+                timestamp = manifest.get("timestamp") or datetime.now().strftime("%Y%m%d_%H%M%S")
+                target = _nombre_destino(f"backup_{timestamp}.zip")
+                shutil.copyfile(zip_path, target)
+                logger.info(f"Backup copiado a: {target}")
+                return target
+            
+            # Artefacto de GitHub Actions con el ZIP del respaldo dentro
+            internos = [n for n in nombres if os.path.basename(n).startswith('backup_') and n.endswith('.zip')]
+            if internos:
+                target = _nombre_destino(os.path.basename(internos[0]))
+                with zip_ref.open(internos[0]) as origen, open(target, 'wb') as destino:
+                    shutil.copyfileobj(origen, destino)
+                logger.info(f"Backup extraído a: {target}")
+                return target
+            
+            # Formato antiguo: un directorio backup_* dentro del ZIP
+            extract_dir = tempfile.mkdtemp()
+            logger.info(f"Extrayendo backup a: {extract_dir}")
             zip_ref.extractall(extract_dir)
         
-        # Encontrar el directorio que contiene el backup dentro del ZIP extraído
-        # Suponiendo que el ZIP contiene un único directorio con el nombre del backup
         backup_dirs = [d for d in os.listdir(extract_dir) if os.path.isdir(os.path.join(extract_dir, d)) and d.startswith('backup_')]
         
         if backup_dirs:
             backup_dir = os.path.join(extract_dir, backup_dirs[0])
             logger.info(f"Backup encontrado en: {backup_dir}")
             
-            # Copiar al directorio de backups para su procesamiento
-            os.makedirs(BACKUP_DIR, exist_ok=True)
-            target_dir = os.path.join(BACKUP_DIR, os.path.basename(backup_dir))
-            
-            # Si ya existe un backup con el mismo nombre, lo renombramos primero
-            if os.path.exists(target_dir):
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                new_name = f"{target_dir}_{timestamp}_old"
-                os.rename(target_dir, new_name)
-                logger.info(f"Backup existente renombrado a: {new_name}")
-            
-            # Copiar el backup extraído al directorio de backups
+            target_dir = _nombre_destino(os.path.basename(backup_dir))
             shutil.copytree(backup_dir, target_dir)
+            shutil.rmtree(extract_dir, ignore_errors=True)
             logger.info(f"Backup copiado a: {target_dir}")
             
             return target_dir
         else:
-            logger.error("No se encontró un directorio de backup en el ZIP")
+            logger.error("No se encontró un backup en el ZIP")
             return None
     
     except Exception as e:
@@ -158,22 +177,14 @@ def github_restore(backup_url, token=None, force=False):
     """
     # 1. Verificar si hay datos en las tablas críticas (solo si no es forzado)
     if not force:
-        from db.database import engine
-        from sqlmodel import Session, select, func
-        from models.order import Orden, CierreCaja
+        from db.probe import table_presence
         
-        needs_restore = False
+        # Verificar tablas críticas (EXISTS, sin contar filas)
+        presentes = table_presence(engine)
+        logger.info(f"Estado actual de la base de datos - Órdenes: {presentes['ordenes']}, Cierres: {presentes['cierres_caja']}")
         
-        with Session(engine) as session:
-            # Verificar tablas críticas
-            ordenes_count = session.exec(select(func.count(Orden.id))).one()
-            cierres_count = session.exec(select(func.count(CierreCaja.id))).one()
-            
-            logger.info(f"Estado actual de la base de datos - Órdenes: {ordenes_count}, Cierres: {cierres_count}")
-            
-            # Determinar si necesitamos restaurar
-            if ordenes_count == 0 and cierres_count == 0:
-                needs_restore = True
+        # Determinar si necesitamos restaurar
+        needs_restore = not (presentes["ordenes"] or presentes["cierres_caja"])
         
         if not needs_restore:
             logger.info("No es necesario restaurar: las tablas ya tienen datos")
@@ -185,17 +196,22 @@ def github_restore(backup_url, token=None, force=False):
         logger.error("No se pudo descargar el backup")
         return False
     
-    # 3. Extraer el backup
-    backup_dir = extract_backup(zip_path)
-    if not backup_dir:
+    # 3. Dejar el backup en backups/
+    backup_path = extract_backup(zip_path)
+    if not backup_path:
         logger.error("No se pudo extraer el backup")
         return False
     
-    # 4. Restaurar desde el backup extraído
-    backup_id = os.path.basename(backup_dir)
+    # 4. Restaurar en bloque (con su cadena si es incremental)
+    backup_id = os.path.basename(backup_path)
     logger.info(f"Iniciando restauración desde backup {backup_id}")
     
-    success = restore_backup(backup_id)
+    try:
+        restore_archive(backup_path, engine)
+        success = True
+    except Exception as e:
+        logger.error(f"Error durante la restauración: {str(e)}")
+        success = False
     
     if success:
         logger.info(f"Restauración completada con éxito desde {backup_id}")
@@ -52,21 +52,14 @@ def post_deploy_restore(force=False):
     """
     # 1. Verificar si hay datos en las tablas críticas
     from db.database import engine
-    from sqlmodel import Session, select, func
-    from models.order import Orden, CierreCaja
+    from db.probe import table_presence
     
-    needs_restore = False
+    # Verificar tablas críticas (EXISTS, sin contar filas)
+    presentes = table_presence(engine)
+    logger.info(f"Estado actual de la base de datos - Órdenes: {presentes['ordenes']}, Cierres: {presentes['cierres_caja']}")
     
-    with Session(engine) as session:
-        # Verificar tablas críticas
-        ordenes_count = session.exec(select(func.count(Orden.id))).one()
-        cierres_count = session.exec(select(func.count(CierreCaja.id))).one()
-        
-        logger.info(f"Estado actual de la base de datos - Órdenes: {ordenes_count}, Cierres: {cierres_count}")
-        
-        # Determinar si necesitamos restaurar
-        if force or (ordenes_count == 0 and cierres_count == 0):
-            needs_restore = True
+    # Determinar si necesitamos restaurar
+    needs_restore = force or not (presentes["ordenes"] or presentes["cierres_caja"])
     
     if not needs_restore:
         logger.info("No es necesario restaurar: las tablas ya tienen datos o no se ha forzado la restauración")
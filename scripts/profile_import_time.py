@@ -0,0 +1,108 @@
+# scripts/profile_import_time.py
+
+"""
+Perfil de importación del arranque (python -X importtime).
+
+Importa `main` en un proceso nuevo, suma el tiempo por módulo y verifica
+que las dependencias pesadas (boto3, Pillow, ReportLab) no se carguen al
+arrancar: se importan recién cuando se usan. Sirve como benchmark de
+regresión del cold start en Render.
+
+Uso:
+    python scripts/profile_import_time.py [--top 15] [--repeticiones 3] [--max-ms 2500]
+
+Termina con código 1 si se importa un módulo pesado o si se supera --max-ms.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import logging
+import re
+import subprocess
+from typing import Any, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Paquetes que no deben importarse al arrancar la aplicación
+MODULOS_PESADOS = ("boto3", "botocore", "PIL", "reportlab")
+
+_LINEA = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def perfil_importacion(modulo: str = "main") -> Dict[str, Any]:
+    """
+    Importa `modulo` en un proceso nuevo con -X importtime.
+
+    Returns:
+        {"total_ms", "modulos": {nombre: (propio_ms, acumulado_ms)}, "raiz": [(nombre, acumulado_ms)]}
+    """
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{proceso.stderr[-2000:]}")
+
+    modulos: Dict[str, tuple] = {}
+    raiz: List[tuple] = []
+    total_us = 0
+    for linea in proceso.stderr.splitlines():
+        m = _LINEA.match(linea)
+        if not m:
+            continue
+        propio, acumulado, sangria, nombre = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        modulos[nombre] = (propio / 1000, acumulado / 1000)
+        if nombre == modulo:
+            total_us = acumulado
+        elif len(sangria) == 2:
+            # Hijos directos del módulo importado
+            raiz.append((nombre, acumulado / 1000))
+    raiz.sort(key=lambda x: x[1], reverse=True)
+    return {"total_ms": total_us / 1000, "modulos": modulos, "raiz": raiz}
+
+
+def modulos_pesados(perfil: Dict[str, Any]) -> List[str]:
+    """Paquetes pesados que se importaron al arrancar"""
+    return sorted({
+        nombre.split(".")[0] for nombre in perfil["modulos"]
+        if nombre.split(".")[0] in MODULOS_PESADOS
+    })
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Perfil de importación del arranque")
+    parser.add_argument("--modulo", default="main")
+    parser.add_argument("--top", type=int, default=15, help="Módulos a mostrar")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se informa la mejor corrida")
+    parser.add_argument("--max-ms", type=float, help="Presupuesto de tiempo de importación")
+    args = parser.parse_args(argv)
+
+    perfiles = [perfil_importacion(args.modulo) for _ in range(max(1, args.repeticiones))]
+    perfil = min(perfiles, key=lambda p: p["total_ms"])
+
+    logger.info(f"import {args.modulo}: {perfil['total_ms']:.1f} ms "
+                f"(mejor de {len(perfiles)}, {len(perfil['modulos'])} módulos)")
+    for nombre, acumulado in perfil["raiz"][:args.top]:
+        logger.info(f"  {acumulado:8.1f} ms  {nombre}")
+
+    ok = True
+    pesados = modulos_pesados(perfil)
+    if pesados:
+        logger.error(f"❌ Se importan al arrancar: {', '.join(pesados)}")
+        ok = False
+    if args.max_ms is not None and perfil["total_ms"] > args.max_ms:
+        logger.error(f"❌ {perfil['total_ms']:.1f} ms supera el presupuesto de {args.max_ms:.0f} ms")
+        ok = False
+    if ok:
+        logger.info("✅ Arranque sin dependencias pesadas")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
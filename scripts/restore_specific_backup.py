@@ -32,9 +32,15 @@ def restore_backup(backup_name):
     sys.path.append(str(Path(__file__).parent.parent))
     
     try:
-        from scripts.restore_from_backup import restore_from_backup
+        from scripts.restore_from_backup import get_backup_path, restore_from_backup
+        backup_path = get_backup_path(backup_name)
+        if not backup_path:
+            print(f"❌ No se encontró el backup: {backup_name}")
+            return
+        
         print(f"🔄 Restaurando backup: {backup_name}")
-        result = restore_from_backup(backup_name)
+        # El backup ya fue elegido explícitamente: no se pide otra confirmación
+        result = restore_from_backup(backup_path, confirm=False)
         
         if result:
             print("✅ ¡Backup restaurado exitosamente!")
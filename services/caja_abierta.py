@@ -0,0 +1,212 @@
+# services/caja_abierta.py
+
+"""
+Totales acumulados de la caja abierta (órdenes del día aún sin cierre).
+
+En lugar de recalcular el día completo en cada visita a la vista de cierre,
+se mantiene en memoria un resumen por (metodo_pago, estado) que se actualiza
+de forma incremental cuando se crea una orden o cambia su estado o método de
+pago. Antes de cada lectura se compara una marca barata de la base (cantidad
+de órdenes abiertas y suma de `Orden.version`, que se incrementa en cada
+UPDATE): si otro worker vendió, anuló o cambió un método de pago, o cambió
+el día o pasó max_age, el resumen se reconstruye desde cero.
+"""
+
+from datetime import date, datetime
+from threading import RLock
+from typing import Any, Dict, Optional, Tuple
+import logging
+import time
+
+from sqlmodel import Session, func, select
+
+from models.models import Producto
+from models.order import Orden, OrdenItem
+from services.cierre_caja_service import METODOS_PAGO, condiciones_dia_sin_cierre
+from utils.timezone import convert_to_santiago, today_santiago
+
+logger = logging.getLogger(__name__)
+
+ESTADOS = ("aprobada", "anulada", "reembolsada")
+
+
+def _fecha_local(fecha: datetime) -> date:
+    # Las fechas recién creadas traen zona horaria; las leídas de la base no
+    # (se guardan en hora de Santiago)
+    return convert_to_santiago(fecha).date() if fecha.tzinfo else fecha.date()
+
+
+class TotalesCajaAbierta:
+    """
+    Resumen incremental de la caja abierta de un día.
+
+    Guarda por orden (metodo_pago, estado, total, costo, version) y por cada par
+    (metodo_pago, estado) la cantidad de órdenes, la suma de totales y la
+    suma de costos, de modo que leer los totales no depende de cuántas
+    órdenes haya.
+    """
+
+    def __init__(self, max_age: int = 120):
+        self.max_age = max_age
+        self._lock = RLock()
+        self._fecha: Optional[date] = None
+        self._ordenes: Dict[int, Tuple[str, str, float, float, int]] = {}
+        self._grupos: Dict[Tuple[str, str], list] = {}
+        self._suma_versiones = 0
+        self._cargado_en: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+
+    def _sumar(self, clave: Tuple[str, str], total: float, costo: float, signo: int) -> None:
+        grupo = self._grupos.setdefault(clave, [0, 0.0, 0.0])
+        grupo[0] += signo
+        grupo[1] += signo * total
+        grupo[2] += signo * costo
+        if grupo[0] == 0:
+            del self._grupos[clave]
+
+    def _poner(self, orden_id: int, metodo_pago: str, estado: str, total: float, costo: float,
+               version: int) -> None:
+        anterior = self._ordenes.get(orden_id)
+        if anterior is not None:
+            self._sumar(anterior[:2], anterior[2], anterior[3], -1)
+            self._suma_versiones -= anterior[4]
+        self._ordenes[orden_id] = (metodo_pago, estado, total, costo, version)
+        self._sumar((metodo_pago, estado), total, costo, +1)
+        self._suma_versiones += version
+
+    def reconcile(self, db: Session, fecha: Optional[date] = None) -> None:
+        """Reconstruye el resumen desde la base de datos (dos consultas)"""
+        fecha = fecha or today_santiago()
+        condiciones = condiciones_dia_sin_cierre(fecha)
+        ordenes = db.exec(
+            select(Orden.id, Orden.metodo_pago, Orden.estado, Orden.total, Orden.version)
+            .where(*condiciones)
+        ).all()
+        costos = dict(db.exec(
+            select(OrdenItem.orden_id, func.sum(OrdenItem.cantidad * Producto.costo))
+            .join(Orden, Orden.id == OrdenItem.orden_id)
+            .join(Producto, Producto.id == OrdenItem.producto_id)
+            .where(*condiciones, Producto.costo != None)
+            .group_by(OrdenItem.orden_id)
+        ).all())
+
+        with self._lock:
+            self._fecha = fecha
+            self._ordenes = {}
+            self._grupos = {}
+            self._suma_versiones = 0
+            for orden_id, metodo_pago, estado, total, version in ordenes:
+                self._poner(orden_id, metodo_pago, estado, total or 0.0, costos.get(orden_id) or 0.0,
+                            version or 0)
+            self._cargado_en = time.time()
+        logger.debug(f"Caja abierta reconciliada: {len(ordenes)} órdenes del {fecha}")
+
+    def invalidate(self) -> None:
+        """Fuerza una reconstrucción en la próxima lectura (p. ej. tras un cierre)"""
+        with self._lock:
+            self._cargado_en = None
+
+    def registrar_orden(self, orden: Orden, costo: float) -> None:
+        """Suma una orden recién confirmada a la caja de su día"""
+        with self._lock:
+            if self._cargado_en is None or orden.cierre_id is not None:
+                return
+            if _fecha_local(orden.fecha) != self._fecha:
+                return
+            self._poner(orden.id, orden.metodo_pago, orden.estado, orden.total, costo, orden.version or 0)
+
+    def actualizar_orden(
+        self,
+        orden_id: int,
+        estado: Optional[str] = None,
+        metodo_pago: Optional[str] = None,
+        version: Optional[int] = None,
+    ) -> None:
+        """
+        Mueve una orden ya contada a otro estado o método de pago.
+        `version` es la de la orden tras el UPDATE (por defecto, una más).
+        """
+        with self._lock:
+            actual = self._ordenes.get(orden_id)
+            if actual is None:
+                return
+            metodo_actual, estado_actual, total, costo, version_actual = actual
+            self._poner(orden_id, metodo_pago or metodo_actual, estado or estado_actual, total, costo,
+                        version_actual + 1 if version is None else version)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def marca(db: Session, fecha: date) -> Tuple[int, int]:
+        """(cantidad de órdenes, suma de versiones) de la caja abierta en la base"""
+        cantidad, versiones = db.exec(
+            select(func.count(Orden.id), func.coalesce(func.sum(Orden.version), 0))
+            .where(*condiciones_dia_sin_cierre(fecha))
+        ).one()
+        return cantidad, versiones
+
+    def _vigente(self, fecha: date, marca: Tuple[int, int]) -> bool:
+        if self._cargado_en is None or self._fecha != fecha:
+            return False
+        if time.time() - self._cargado_en >= self.max_age:
+            return False
+        return marca == (len(self._ordenes), self._suma_versiones)
+
+    def resumen(
+        self,
+        db: Session,
+        fecha: Optional[date] = None,
+    ) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        """
+        Retorna (totales, contador) con la misma forma que usa la vista de
+        cierre de caja. Si la marca de la base no coincide con el resumen se
+        reconcilia desde la base.
+        """
+        fecha = fecha or today_santiago()
+        marca = self.marca(db, fecha)
+        with self._lock:
+            if not self._vigente(fecha, marca):
+                self.reconcile(db, fecha)
+
+            por_estado = {estado: [0, 0.0] for estado in ESTADOS}
+            por_metodo = {metodo: 0.0 for metodo in METODOS_PAGO}
+            costo = 0.0
+            total_ordenes = 0
+            for (metodo_pago, estado), (n, total, costo_grupo) in self._grupos.items():
+                total_ordenes += n
+                if estado in por_estado:
+                    por_estado[estado][0] += n
+                    por_estado[estado][1] += total
+                if estado == "aprobada":
+                    costo += costo_grupo
+                    if metodo_pago in por_metodo:
+                        por_metodo[metodo_pago] += total
+
+        aprobadas = por_estado["aprobada"][1]
+        ganancia = aprobadas - costo
+        totales = {
+            **por_metodo,
+            "aprobadas": aprobadas,
+            "anuladas": por_estado["anulada"][1],
+            "reembolsadas": por_estado["reembolsada"][1],
+            "total_general": aprobadas,
+            "costo": costo,
+            "ganancia": ganancia,
+            "margen": (ganancia / aprobadas * 100) if aprobadas > 0 else 0,
+        }
+        contador = {
+            "aprobadas": por_estado["aprobada"][0],
+            "anuladas": por_estado["anulada"][0],
+            "reembolsadas": por_estado["reembolsada"][0],
+            "total": total_ordenes,
+        }
+        return totales, contador
+
+
+# Resumen global de la caja abierta
+caja_abierta = TotalesCajaAbierta(max_age=120)
@@ -2,19 +2,28 @@
 
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, date, timedelta
+from sqlalchemy import update
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models.order import Orden, CierreCaja, OrdenItem
 from models.models import Producto
+from services.ventas_diarias_service import recalcular_ventas_diarias
 import logging
 import json
 from utils.timezone import now_santiago, convert_to_santiago, today_santiago, day_range_santiago
 
 logger = logging.getLogger(__name__)
 
-def obtener_ordenes_sin_cierre(db: Session, fecha: Optional[date] = None) -> List[Orden]:
+def obtener_ordenes_sin_cierre(
+    db: Session,
+    fecha: Optional[date] = None,
+    limite: Optional[int] = None,
+) -> List[Orden]:
     """
     Obtiene todas las órdenes que aún no han sido incluidas en un cierre de caja.
-    Si se especifica una fecha, solo devuelve las órdenes de ese día.
+    Si se especifica una fecha, solo devuelve las órdenes de ese día; con
+    `limite`, solo las más recientes.
     """
     query = select(Orden).where(Orden.cierre_id == None)
     
@@ -25,9 +34,76 @@ def obtener_ordenes_sin_cierre(db: Session, fecha: Optional[date] = None) -> Lis
     
     # Ordenar por fecha
     query = query.order_by(Orden.fecha.desc())
+    if limite is not None:
+        query = query.limit(limite)
     
     return db.exec(query).all()
 
+
+METODOS_PAGO = ("efectivo", "debito", "credito", "transferencia")
+
+
+def agregar_ventas(db: Session, *condiciones) -> Dict[str, Any]:
+    """
+    Agrega en la base de datos las órdenes que cumplen `condiciones`.
+
+    Usa dos consultas sin importar cuántas órdenes haya:
+    - un GROUP BY metodo_pago, estado con COUNT y SUM(total)
+    - un SUM(OrdenItem.cantidad * Producto.costo) de las órdenes aprobadas
+
+    Retorna los totales aprobados por método de pago, los totales por estado,
+    el costo de lo vendido y la cantidad de órdenes.
+    """
+    filas = db.exec(
+        select(
+            Orden.metodo_pago,
+            Orden.estado,
+            func.count(Orden.id),
+            func.coalesce(func.sum(Orden.total), 0.0),
+        )
+        .where(*condiciones)
+        .group_by(Orden.metodo_pago, Orden.estado)
+    ).all()
+
+    totales: Dict[str, Any] = {metodo: 0.0 for metodo in METODOS_PAGO}
+    totales.update({"aprobada": 0.0, "anulada": 0.0, "reembolsada": 0.0})
+    cantidad = 0
+    cantidad_aprobadas = 0
+    for metodo_pago, estado, n, total in filas:
+        cantidad += n
+        if estado in ("aprobada", "anulada", "reembolsada"):
+            totales[estado] += total
+        if estado == "aprobada":
+            cantidad_aprobadas += n
+            if metodo_pago in METODOS_PAGO:
+                totales[metodo_pago] += total
+
+    costo = 0.0
+    if cantidad_aprobadas:
+        costo = db.exec(
+            select(func.coalesce(func.sum(OrdenItem.cantidad * Producto.costo), 0.0))
+            .select_from(OrdenItem)
+            .join(Orden, Orden.id == OrdenItem.orden_id)
+            .join(Producto, Producto.id == OrdenItem.producto_id)
+            .where(*condiciones, Orden.estado == "aprobada", Producto.costo != None)
+        ).one()
+
+    totales["costo"] = float(costo or 0.0)
+    totales["cantidad"] = cantidad
+    totales["cantidad_aprobadas"] = cantidad_aprobadas
+    return totales
+
+
+def condiciones_dia_sin_cierre(fecha: date) -> tuple:
+    """Órdenes del día (zona horaria de Santiago) aún sin cierre"""
+    inicio_dia, fin_dia = day_range_santiago(fecha)
+    return (
+        Orden.fecha >= inicio_dia,
+        Orden.fecha <= fin_dia,
+        Orden.cierre_id == None,  # Solo órdenes sin cierre previo
+    )
+
+
 def calcular_totales_dia(db: Session, fecha: Optional[date] = None) -> Dict[str, Any]:
     """
     Calcula los totales de ventas del día actual o de una fecha específica,
@@ -37,54 +113,22 @@ def calcular_totales_dia(db: Session, fecha: Optional[date] = None) -> Dict[str,
         # Usar la fecha actual en zona horaria de Santiago
         fecha = today_santiago()
     
-    inicio_dia, fin_dia = day_range_santiago(fecha)
-    
-    # Obtener órdenes del día
-    ordenes = db.exec(
-        select(Orden)
-        .where(
-            Orden.fecha >= inicio_dia,
-            Orden.fecha <= fin_dia,
-            Orden.cierre_id == None  # Solo órdenes sin cierre previo
-        )
-    ).all()
-    
-    # Calcular totales por método de pago
-    efectivo = sum(o.total for o in ordenes if o.metodo_pago == "efectivo" and o.estado == "aprobada")
-    debito = sum(o.total for o in ordenes if o.metodo_pago == "debito" and o.estado == "aprobada")
-    credito = sum(o.total for o in ordenes if o.metodo_pago == "credito" and o.estado == "aprobada")
-    transferencia = sum(o.total for o in ordenes if o.metodo_pago == "transferencia" and o.estado == "aprobada")
-    
-    # Calcular totales por estado
-    aprobadas = sum(o.total for o in ordenes if o.estado == "aprobada")
-    anuladas = sum(o.total for o in ordenes if o.estado == "anulada")
-    reembolsadas = sum(o.total for o in ordenes if o.estado == "reembolsada")
-    
-    # Calcular costos y ganancias
-    total_costo = 0.0
-    ordenes_aprobadas = [o for o in ordenes if o.estado == "aprobada"]
-    
-    # Obtener todos los items de órdenes aprobadas
-    for orden in ordenes_aprobadas:
-        items = db.exec(select(OrdenItem).where(OrdenItem.orden_id == orden.id)).all()
-        for item in items:
-            producto = db.get(Producto, item.producto_id)
-            if producto and producto.costo is not None:
-                # Sumar al costo total: costo unitario * cantidad
-                total_costo += producto.costo * item.cantidad
+    ventas = agregar_ventas(db, *condiciones_dia_sin_cierre(fecha))
+    aprobadas = ventas["aprobada"]
+    total_costo = ventas["costo"]
     
     # Calcular ganancia y margen
     ganancia = aprobadas - total_costo
     margen = (ganancia / aprobadas * 100) if aprobadas > 0 else 0
     
     return {
-        "efectivo": efectivo,
-        "debito": debito,
-        "credito": credito,
-        "transferencia": transferencia,
+        "efectivo": ventas["efectivo"],
+        "debito": ventas["debito"],
+        "credito": ventas["credito"],
+        "transferencia": ventas["transferencia"],
         "aprobadas": aprobadas,
-        "anuladas": anuladas,
-        "reembolsadas": reembolsadas,
+        "anuladas": ventas["anulada"],
+        "reembolsadas": ventas["reembolsada"],
         "total_general": aprobadas,
         "costo": total_costo,
         "ganancia": ganancia,
@@ -97,95 +141,87 @@ def realizar_cierre_caja(
     usuario_id: Optional[int] = None,
     usuario_nombre: Optional[str] = None,
     notas: Optional[str] = None
-) -> Tuple[CierreCaja, List[Orden]]:
+) -> Tuple[CierreCaja, int]:
     """
     Realiza el cierre de caja para el día actual o una fecha específica.
     Asocia todas las órdenes sin cierre de ese día al nuevo cierre.
     Calcula los totales de costos, ventas y márgenes de ganancia.
     
-    Retorna el cierre creado y la lista de órdenes asociadas.
+    Todo ocurre en una sola transacción: se crea el cierre, se asocian las
+    órdenes con un único UPDATE y los totales se calculan sobre las órdenes
+    efectivamente asociadas, de modo que una venta que llegue durante el
+    cierre no puede quedar fuera de los totales ni a medio asociar. En la
+    misma transacción se recalcula el resumen diario (VentaDiaria) del día.
+    
+    Retorna el cierre creado y la cantidad de órdenes asociadas.
     """
     if not fecha:
         # Usar la fecha actual en zona horaria de Santiago
         fecha = today_santiago()
         
-    # Obtener órdenes sin cierre del día
-    inicio_dia, fin_dia = day_range_santiago(fecha)
-    
-    # Obtener órdenes del día
-    ordenes = db.exec(
-        select(Orden)
-        .where(
-            Orden.fecha >= inicio_dia,
-            Orden.fecha <= fin_dia,
-            Orden.cierre_id == None  # Solo órdenes sin cierre previo
+    inicio_dia, _ = day_range_santiago(fecha)
+    
+    try:
+        # Crear registro de cierre (los totales se completan más abajo)
+        cierre = CierreCaja(
+            fecha=inicio_dia,  # Inicio del día en Santiago
+            fecha_cierre=now_santiago(),  # Hora actual en Santiago
+            fecha_cierre_chile=fecha,  # Fecha del día en Chile
+            usuario_id=usuario_id,
+            usuario_nombre=usuario_nombre,
+            notas=notas
         )
-    ).all()
-    
-    if not ordenes:
-        raise ValueError("No hay transacciones para realizar el cierre de caja")
-    
-    # Calcular totales por método de pago
-    total_ventas = sum(o.total for o in ordenes if o.estado == "aprobada")
-    total_efectivo = sum(o.total for o in ordenes if o.metodo_pago == "efectivo" and o.estado == "aprobada")
-    total_debito = sum(o.total for o in ordenes if o.metodo_pago == "debito" and o.estado == "aprobada")
-    total_credito = sum(o.total for o in ordenes if o.metodo_pago == "credito" and o.estado == "aprobada")
-    total_transferencia = sum(o.total for o in ordenes if o.metodo_pago == "transferencia" and o.estado == "aprobada")
-    
-    # Calcular costos y ganancias
-    total_costo = 0.0
-    ordenes_aprobadas = [o for o in ordenes if o.estado == "aprobada"]
-    
-    # Obtener todos los items de órdenes aprobadas
-    for orden in ordenes_aprobadas:
-        items = db.exec(select(OrdenItem).where(OrdenItem.orden_id == orden.id)).all()
-        for item in items:
-            producto = db.get(Producto, item.producto_id)
-            if producto and producto.costo is not None:
-                # Sumar al costo total: costo unitario * cantidad
-                total_costo += producto.costo * item.cantidad
-    
-    # Calcular ganancia y margen
-    total_ganancia = total_ventas - total_costo
-    # Margen = ((Precio - Costo) / Precio) * 100
-    margen_promedio = (total_ganancia / total_ventas * 100) if total_ventas > 0 else 0
-    
-    # Contar transacciones
-    cantidad_transacciones = len(ordenes)
-    ticket_promedio = total_ventas / cantidad_transacciones if cantidad_transacciones > 0 else 0
-    
-    # Crear registro de cierre
-    cierre = CierreCaja(
-        fecha=inicio_dia,  # Inicio del día en Santiago
-        fecha_cierre=now_santiago(),  # Hora actual en Santiago
-        fecha_cierre_chile=fecha,  # Fecha del día en Chile
-        total_ventas=total_ventas,
-        total_efectivo=total_efectivo,
-        total_debito=total_debito,
-        total_credito=total_credito,
-        total_transferencia=total_transferencia,
-        total_costo=total_costo,
-        total_ganancia=total_ganancia,
-        margen_promedio=margen_promedio,
-        cantidad_transacciones=cantidad_transacciones,
-        ticket_promedio=ticket_promedio,
-        usuario_id=usuario_id,
-        usuario_nombre=usuario_nombre,
-        notas=notas
-    )
+        db.add(cierre)
+        db.flush()
+        
+        # Asociar órdenes al cierre en una sola sentencia
+        resultado = db.exec(
+            update(Orden)
+            .where(*condiciones_dia_sin_cierre(fecha))
+            .values(cierre_id=cierre.id)
+            .execution_options(synchronize_session=False)
+        )
+        asociadas = resultado.rowcount
+        if not asociadas:
+            raise ValueError("No hay transacciones para realizar el cierre de caja")
+        
+        ventas = agregar_ventas(db, Orden.cierre_id == cierre.id)
+        if ventas["cantidad"] != asociadas:
+            raise RuntimeError(
+                f"Cierre inconsistente: {asociadas} órdenes asociadas, {ventas['cantidad']} agregadas"
+            )
+        
+        # Totales por método de pago (solo órdenes aprobadas)
+        total_ventas = ventas["aprobada"]
+        cierre.total_ventas = total_ventas
+        cierre.total_efectivo = ventas["efectivo"]
+        cierre.total_debito = ventas["debito"]
+        cierre.total_credito = ventas["credito"]
+        cierre.total_transferencia = ventas["transferencia"]
+        
+        # Calcular ganancia y margen
+        cierre.total_costo = ventas["costo"]
+        cierre.total_ganancia = total_ventas - ventas["costo"]
+        # Margen = ((Precio - Costo) / Precio) * 100
+        cierre.margen_promedio = (cierre.total_ganancia / total_ventas * 100) if total_ventas > 0 else 0
+        
+        # Contar transacciones
+        cierre.cantidad_transacciones = asociadas
+        cierre.ticket_promedio = total_ventas / asociadas
+        
+        db.add(cierre)
+        db.flush()
+        
+        # Resumen diario para reportes de período, en la misma transacción
+        recalcular_ventas_diarias(db, fecha)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
-    db.add(cierre)
-    db.commit()
     db.refresh(cierre)
-    
-    # Asociar órdenes al cierre
-    for orden in ordenes:
-        orden.cierre_id = cierre.id
-        db.add(orden)
-    
-    db.commit()
-    
-    return cierre, ordenes
+    logger.info(f"Cierre {cierre.id} realizado con {asociadas} órdenes")
+    return cierre, asociadas
 
 def obtener_cierres_por_periodo(
     db: Session, 
@@ -203,6 +239,9 @@ def obtener_cierres_por_periodo(
     Returns:
         Lista de objetos CierreCaja
     """
+    return db.exec(_consulta_cierres_periodo(fecha_desde, fecha_hasta)).all()
+
+def _consulta_cierres_periodo(fecha_desde: Optional[datetime], fecha_hasta: Optional[datetime]):
     query = select(CierreCaja)
     
     if fecha_desde:
@@ -212,9 +251,44 @@ def obtener_cierres_por_periodo(
         query = query.where(CierreCaja.fecha <= fecha_hasta)
     
     # Ordenar por fecha descendente
-    query = query.order_by(CierreCaja.fecha.desc())
-    
-    return db.exec(query).all()
+    return query.order_by(CierreCaja.fecha.desc())
+
+async def obtener_cierres_por_periodo_async(
+    db: AsyncSession,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None
+) -> List[CierreCaja]:
+    """Versión asíncrona de obtener_cierres_por_periodo"""
+    return (await db.exec(_consulta_cierres_periodo(fecha_desde, fecha_hasta))).all()
+
+def cargar_ordenes_cierre(con_items: bool = False):
+    """
+    Opción de carga de las órdenes de un cierre; con `con_items`, también sus
+    ítems y productos. Una consulta por nivel, sin importar cuántas filas haya.
+    """
+    opcion = selectinload(CierreCaja.ordenes)
+    if con_items:
+        opcion = opcion.selectinload(Orden.items).selectinload(OrdenItem.producto)
+    return opcion
+
+def _consulta_cierre_detalle(cierre_id: int, con_items: bool):
+    return select(CierreCaja).where(CierreCaja.id == cierre_id).options(cargar_ordenes_cierre(con_items))
+
+def obtener_cierre_detalle(db: Session, cierre_id: int, con_items: bool = False) -> Optional[CierreCaja]:
+    """
+    Un cierre con sus órdenes ya cargadas en `cierre.ordenes` (y, con
+    `con_items`, los ítems y productos de cada una). La usan el detalle y
+    el PDF del cierre.
+    """
+    return db.exec(_consulta_cierre_detalle(cierre_id, con_items)).first()
+
+async def obtener_cierre_detalle_async(
+    db: AsyncSession,
+    cierre_id: int,
+    con_items: bool = False
+) -> Optional[CierreCaja]:
+    """Versión asíncrona de obtener_cierre_detalle"""
+    return (await db.exec(_consulta_cierre_detalle(cierre_id, con_items))).first()
 
 def obtener_cierre_por_id(db: Session, cierre_id: int) -> Optional[CierreCaja]:
     """
@@ -283,21 +357,12 @@ def calcular_margenes_cierre(db: Session, cierre_id: int) -> bool:
         logger.error(f"Cierre con ID {cierre_id} no encontrado")
         return False
     
-    # Obtener todas las órdenes del cierre
-    ordenes = db.exec(select(Orden).where(Orden.cierre_id == cierre_id, Orden.estado == "aprobada")).all()
-    if not ordenes:
+    # Costos de las órdenes aprobadas del cierre
+    ventas = agregar_ventas(db, Orden.cierre_id == cierre_id)
+    if not ventas["cantidad_aprobadas"]:
         logger.warning(f"No hay órdenes aprobadas para el cierre {cierre_id}")
         return False
-    
-    # Calcular costos
-    total_costo = 0.0
-    
-    for orden in ordenes:
-        items = db.exec(select(OrdenItem).where(OrdenItem.orden_id == orden.id)).all()
-        for item in items:
-            producto = db.get(Producto, item.producto_id)
-            if producto and producto.costo is not None:
-                total_costo += producto.costo * item.cantidad
+    total_costo = ventas["costo"]
     
     # Actualizar cierre
     cierre.total_costo = total_costo
@@ -3,6 +3,8 @@ from db.database import engine
 from typing import List, Optional
 from models.models import Categoria
 from sqlmodel import Session, select
+from services.product_index import product_index
+from utils.cache import CATALOG_NAMESPACE, invalidate_cache
 
 
 def get_all_categorias() -> List[Categoria]:
@@ -49,6 +51,9 @@ def update_categoria_db(id: int, data: Categoria) -> Categoria:
         session.add(cat)
         session.commit()
         session.refresh(cat)
+        # El índice y el cache guardan el nombre de la categoría en cada producto
+        invalidate_cache(CATALOG_NAMESPACE)
+        product_index.invalidate()
         return cat
 
 def delete_categoria_db(id: int) -> None:
@@ -60,4 +65,6 @@ def delete_categoria_db(id: int) -> None:
                 detail="Categoría no encontrada"
             )
         session.delete(cat)
-        session.commit()
\ No newline at end of file
+        session.commit()
+        invalidate_cache(CATALOG_NAMESPACE)
+        product_index.invalidate()
\ No newline at end of file
@@ -1,36 +1,45 @@
 from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 from sqlalchemy.exc import IntegrityError
-from utils.cache import cached, invalidate_cache
+from utils.cache import CATALOG_NAMESPACE, cached, invalidate_cache, producto_tags
+from services.product_index import product_index
 
 from db.database import engine
 from models.models import Producto
+from schemas.producto import ProductoSnapshot
 
 
-@cached(ttl=180, cache_key_prefix="productos_all")
-def get_all_productos(session: Session) -> list[Producto]:
+def _snapshot_catalogo(productos) -> tuple:
+    # costo y margen se exponen como 0.0 cuando no están definidos, sin
+    # modificar las instancias del ORM (eso las marcaría como sucias en la sesión)
+    return tuple(
+        ProductoSnapshot.from_producto(p, costo=p.costo or 0.0, margen=p.margen or 0.0)
+        for p in productos
+    )
+
+
+@cached(
+    ttl=180,
+    cache_key_prefix="productos_all",
+    snapshot=_snapshot_catalogo,
+    namespace=CATALOG_NAMESPACE,
+    tags=producto_tags,
+)
+def get_all_productos(session: Session) -> tuple[ProductoSnapshot, ...]:
     """
     Retrieve all products from the database with cache, including their associated categories.
     Cache TTL: 3 minutos para balance entre performance y datos actualizados.
 
     Returns:
-        list[Producto]: A list of Producto instances with all fields including costo and margen.
+        tuple[ProductoSnapshot, ...]: Immutable, session-detached copies of every
+        product (costo y margen en 0.0 si no están definidos).
     """
     statement = (
         select(Producto)
         .options(selectinload(Producto.categoria))
         .order_by(Producto.categoria_id.asc(), Producto.nombre.asc())  # Ordenamiento optimizado
     )
-    productos = session.exec(statement).all()
-    
-    # Asegurarnos de que costo y margen estén incluidos en la respuesta
-    for p in productos:
-        if hasattr(p, "costo") and p.costo is None:
-            p.costo = 0.0
-        if hasattr(p, "margen") and p.margen is None:
-            p.margen = 0.0
-            
-    return productos
+    return session.exec(statement).all()
 
 
 def get_producto(producto_id: int, session: Session) -> Producto | None:
@@ -79,10 +88,9 @@ def create_producto(producto: Producto, session: Session) -> Producto:
         session.commit()
         session.refresh(producto)
         
-        # Invalidar cache después de crear producto
-        invalidate_cache("productos_all")
-        invalidate_cache("pos_products")
-        invalidate_cache("pos_search")
+        # Invalidar cache y actualizar el índice de búsqueda después de crear producto
+        invalidate_cache(CATALOG_NAMESPACE)
+        product_index.upsert(producto)
         
         return producto
     except IntegrityError as e:
@@ -130,10 +138,9 @@ def update_producto(producto_id: int, data: Producto, session: Session) -> Produ
         session.commit()
         session.refresh(producto)
         
-        # Invalidar cache después de actualizar producto
-        invalidate_cache("productos_all")
-        invalidate_cache("pos_products")
-        invalidate_cache("pos_search")
+        # Invalidar cache y actualizar el índice de búsqueda después de actualizar producto
+        invalidate_cache(CATALOG_NAMESPACE)
+        product_index.upsert(producto)
         
         return producto
     except IntegrityError as e:
@@ -174,10 +181,9 @@ def delete_producto(producto_id: int, session: Session) -> dict:
         session.delete(producto)
         session.commit()
         
-        # Invalidar cache después de eliminar producto
-        invalidate_cache("productos_all")
-        invalidate_cache("pos_products")
-        invalidate_cache("pos_search")
+        # Invalidar cache y actualizar el índice de búsqueda después de eliminar producto
+        invalidate_cache(CATALOG_NAMESPACE)
+        product_index.remove(producto_id)
         
         return {"success": True, "message": "Producto eliminado exitosamente"}
     except Exception as e:
@@ -0,0 +1,392 @@
+# services/pdf_render.py
+
+"""
+Renderizado de PDFs con ReportLab a partir de snapshots.
+
+Este módulo se ejecuta en los procesos del pool de services/pdf_service.py:
+recibe diccionarios con tipos simples (str, int, float, listas), nunca
+objetos ORM ni sesiones, y devuelve los bytes del PDF. No importa la
+aplicación (modelos, base de datos, configuración), así que un worker solo
+carga ReportLab.
+
+Las fechas llegan como texto ISO 8601 y se formatean aquí. La hoja de
+estilos y los TableStyle se construyen una sola vez por proceso
+(`_estilos`), no en cada documento: en una exportación en lote cada worker
+renderiza muchos PDFs.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Callable, Dict
+
+
+def _fecha(valor: str, formato: str) -> str:
+    return datetime.fromisoformat(valor).strftime(formato) if valor else "N/A"
+
+
+@lru_cache(maxsize=1)
+def _estilos() -> Dict[str, Any]:
+    """Hoja de estilos y estilos de tabla, compartidos por todos los documentos del proceso"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+
+    def encabezado(tamano: int, *extra) -> TableStyle:
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), tamano),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            *extra,
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+    return {
+        "titulo": styles['Heading1'],
+        "subtitulo": styles['Heading2'],
+        "normal": styles['Normal'],
+        # Pares etiqueta/valor (datos generales del cierre o la transacción)
+        "datos": TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('BACKGROUND', (1, 0), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]),
+        "tabla": encabezado(12, ('BACKGROUND', (0, 1), (-1, -1), colors.white)),
+        # Con fila de total al final
+        "totales": encabezado(
+            12,
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+        ),
+        "tabla_reporte": encabezado(10, ('BACKGROUND', (0, 1), (-1, -1), colors.white)),
+        "tabla_detalle": encabezado(
+            10,
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ),
+        # Dos bloques de pares etiqueta/valor lado a lado
+        "resumen": TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('BACKGROUND', (2, 0), (2, -1), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (1, -1), 1, colors.black),
+            ('GRID', (2, 0), (3, -1), 1, colors.black),
+        ]),
+    }
+
+
+def inicializar_worker() -> None:
+    """Inicializador del pool: importa ReportLab y arma los estilos antes del primer documento"""
+    _estilos()
+
+
+def render_cierre(snapshot: Dict[str, Any]) -> bytes:
+    """PDF del cierre de caja (ver pdf_service.snapshot_cierre)"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+    cierre = snapshot["cierre"]
+    transacciones = snapshot["transacciones"]
+
+    # Crear un buffer para almacenar el PDF
+    buffer = BytesIO()
+
+    # Crear el documento PDF
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+
+    # Estilos para el PDF (construidos una vez por proceso)
+    estilos = _estilos()
+
+    # Título
+    elements.append(Paragraph(f"Cierre de Caja #{cierre['id']}", estilos['titulo']))
+    elements.append(Spacer(1, 12))
+
+    # Información general del cierre
+    elements.append(Paragraph("Información General", estilos['subtitulo']))
+
+    # Datos generales en formato de tabla
+    data = [
+        ["ID:", str(cierre['id'])],
+        ["Fecha:", _fecha(cierre['fecha'], '%d/%m/%Y')],
+        ["Hora de Cierre:", _fecha(cierre['fecha_cierre'], '%d/%m/%Y %H:%M')],
+        ["Total de Ventas:", f"${cierre['total_ventas']:,.0f}"],
+        ["Total de Transacciones:", str(cierre['cantidad_transacciones'])],
+        ["Ticket Promedio:", f"${cierre['ticket_promedio']:,.0f}"]
+    ]
+
+    # Si hay usuario, añadir a la tabla
+    if cierre['usuario_nombre']:
+        data.append(["Usuario:", cierre['usuario_nombre']])
+
+    t = Table(data, colWidths=[100, 300])
+    t.setStyle(estilos['datos'])
+
+    elements.append(t)
+    elements.append(Spacer(1, 20))
+
+    # Desglose por método de pago
+    elements.append(Paragraph("Desglose por Método de Pago", estilos['subtitulo']))
+
+    metodos_data = [
+        ["Método", "Monto"],
+        ["Efectivo", f"${cierre['total_efectivo']:,.0f}"],
+        ["Débito", f"${cierre['total_debito']:,.0f}"],
+        ["Crédito", f"${cierre['total_credito']:,.0f}"],
+        ["Transferencia", f"${cierre['total_transferencia']:,.0f}"],
+        ["TOTAL", f"${cierre['total_ventas']:,.0f}"]
+    ]
+
+    metodos_table = Table(metodos_data, colWidths=[150, 150])
+    metodos_table.setStyle(estilos['totales'])
+
+    elements.append(metodos_table)
+    elements.append(Spacer(1, 20))
+
+    # Información de rentabilidad
+    elements.append(Paragraph("Información de Rentabilidad", estilos['subtitulo']))
+
+    rentabilidad_data = [
+        ["Concepto", "Valor"],
+        ["Costo de Productos", f"${cierre['total_costo']:,.0f}"],
+        ["Ganancia", f"${cierre['total_ganancia']:,.0f}"],
+        ["Margen Promedio", f"{cierre['margen_promedio']:.2f}%"]
+    ]
+
+    rentabilidad_table = Table(rentabilidad_data, colWidths=[150, 150])
+    rentabilidad_table.setStyle(estilos['tabla'])
+
+    elements.append(rentabilidad_table)
+    elements.append(Spacer(1, 20))
+
+    # Listado de transacciones
+    if transacciones:
+        elements.append(Paragraph("Detalle de Transacciones", estilos['subtitulo']))
+
+        # Cabecera de la tabla de transacciones
+        transacciones_data = [["ID", "Hora", "Método", "Estado", "Subtotal", "Descuento", "Total"]]
+
+        # Agregar cada transacción
+        for t in transacciones:
+            subtotal = t['subtotal'] or t['total']
+            descuento = t['descuento'] or 0
+
+            transacciones_data.append([
+                str(t['id']),
+                _fecha(t['fecha'], '%H:%M'),
+                t['metodo_pago'].capitalize(),
+                t['estado'].capitalize(),
+                f"${subtotal:,.0f}",
+                f"${descuento:,.0f}" if descuento > 0 else "-",
+                f"${t['total']:,.0f}"
+            ])
+
+        # Crear tabla de transacciones
+        trans_table = Table(transacciones_data, colWidths=[40, 40, 70, 70, 70, 70, 70])
+        trans_table.setStyle(estilos['tabla_detalle'])
+
+        elements.append(trans_table)
+
+    # Notas
+    if cierre['notas']:
+        elements.append(Spacer(1, 20))
+        elements.append(Paragraph("Notas:", estilos['subtitulo']))
+        elements.append(Paragraph(cierre['notas'], estilos['normal']))
+
+    # Construir el PDF
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_reporte_periodo(snapshot: Dict[str, Any]) -> bytes:
+    """PDF del reporte de período (ver pdf_service.snapshot_reporte_periodo)"""
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+    from reportlab.lib.units import inch
+
+    resumen = snapshot["resumen"]
+    cierres = snapshot["cierres"]
+    ventas_categoria = snapshot["ventas_categoria"]
+
+    # Crear un buffer para almacenar el PDF
+    buffer = BytesIO()
+
+    # Crear el documento PDF en orientación horizontal
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
+    elements = []
+
+    # Estilos para el PDF (construidos una vez por proceso)
+    estilos = _estilos()
+
+    # Título
+    periodo = resumen.get("periodo", "completo")
+    elements.append(Paragraph(f"Reporte de Período: {periodo}", estilos['titulo']))
+    elements.append(Spacer(1, 12))
+
+    # Información del resumen en formato de tabla
+    elements.append(Paragraph("Resumen del Período", estilos['subtitulo']))
+    elements.append(Spacer(1, 6))
+
+    # Datos generales en formato de tabla
+    resumen_data = [
+        ["Total Ventas:", f"${resumen['total_ventas']:,.0f}", "Transacciones:", f"{resumen['total_transacciones']}"],
+        ["Efectivo:", f"${resumen['total_efectivo']:,.0f}", "Ticket Promedio:", f"${resumen['ticket_promedio']:,.0f}"],
+        ["Transferencia:", f"${resumen['total_transferencia']:,.0f}", "Venta Promedio Diaria:", f"${resumen['promedio_diario']:,.0f}"],
+        ["Débito:", f"${resumen['total_debito']:,.0f}", "", ""],
+        ["Crédito:", f"${resumen['total_credito']:,.0f}", "", ""],
+        ["Otros:", f"${resumen['total_otros']:,.0f}", "", ""],
+    ]
+
+    t = Table(resumen_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
+    t.setStyle(estilos['resumen'])
+
+    elements.append(t)
+    elements.append(Spacer(1, 20))
+
+    # Ventas por categoría
+    if ventas_categoria:
+        elements.append(Paragraph("Ventas por Categoría", estilos['subtitulo']))
+        elements.append(Spacer(1, 6))
+
+        categorias_data = [["Categoría", "Unidades", "Ventas", "Costo", "Ganancia"]]
+        for fila in ventas_categoria:
+            categorias_data.append([
+                fila["categoria"],
+                str(fila["cantidad"]),
+                f"${fila['ingresos']:,.0f}",
+                f"${fila['costo']:,.0f}",
+                f"${fila['ganancia']:,.0f}"
+            ])
+
+        categorias_table = Table(categorias_data, repeatRows=1)
+        categorias_table.setStyle(estilos['tabla_reporte'])
+
+        elements.append(categorias_table)
+        elements.append(Spacer(1, 20))
+
+    # Lista de cierres
+    if cierres:
+        elements.append(Paragraph("Cierres de Caja en el Período", estilos['subtitulo']))
+        elements.append(Spacer(1, 6))
+
+        # Cabecera de la tabla de cierres
+        cierres_data = [["ID", "Fecha", "Ventas", "Efectivo", "Transferencia", "Débito", "Crédito", "Transacciones", "Ticket Promedio"]]
+
+        # Agregar cada cierre
+        for cierre in cierres:
+            cierres_data.append([
+                str(cierre['id']),
+                _fecha(cierre['fecha'], '%d/%m/%Y'),
+                f"${cierre['total_ventas']:,.0f}",
+                f"${cierre['total_efectivo']:,.0f}",
+                f"${cierre['total_transferencia']:,.0f}",
+                f"${cierre['total_debito']:,.0f}",
+                f"${cierre['total_credito']:,.0f}",
+                str(cierre['cantidad_transacciones']),
+                f"${cierre['ticket_promedio']:,.0f}"
+            ])
+
+        # Crear tabla de cierres
+        cierres_table = Table(cierres_data, repeatRows=1)
+        cierres_table.setStyle(estilos['tabla_reporte'])
+
+        elements.append(cierres_table)
+    else:
+        elements.append(Paragraph("No hay cierres de caja en el período seleccionado.", estilos['normal']))
+
+    # Construir el PDF
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_transaccion(snapshot: Dict[str, Any]) -> bytes:
+    """PDF (factura) de una transacción (ver pdf_service.snapshot_transaccion)"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+    transaccion = snapshot["transaccion"]
+
+    # Crear un buffer para almacenar el PDF
+    buffer = BytesIO()
+
+    # Crear el documento PDF
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+
+    # Estilos para el PDF (construidos una vez por proceso)
+    estilos = _estilos()
+
+    # Título
+    elements.append(Paragraph(f"Factura de Venta #{transaccion['id']}", estilos['titulo']))
+    elements.append(Spacer(1, 12))
+
+    # Información de la transacción
+    elements.append(Paragraph("Información de la Transacción", estilos['subtitulo']))
+
+    # Datos generales en formato de tabla
+    data = [
+        ["ID:", str(transaccion['id'])],
+        ["Fecha:", _fecha(transaccion['fecha'], '%d/%m/%Y %H:%M')],
+        ["Estado:", transaccion['estado']],
+        ["Método de Pago:", transaccion['metodo_pago']],
+        ["Total:", f"${transaccion['total']:,.0f}"]
+    ]
+
+    t = Table(data, colWidths=[100, 300])
+    t.setStyle(estilos['datos'])
+
+    elements.append(t)
+    elements.append(Spacer(1, 20))
+
+    # Productos
+    elements.append(Paragraph("Productos", estilos['subtitulo']))
+
+    # Cabecera de la tabla de productos
+    productos_data = [["Producto", "Cantidad", "Precio Unitario", "Subtotal"]]
+
+    # Agregar cada producto
+    for item in transaccion['items']:
+        productos_data.append([
+            item['producto'],
+            str(item['cantidad']),
+            f"${item['precio_unitario']:,.0f}",
+            f"${item['cantidad'] * item['precio_unitario']:,.0f}"
+        ])
+
+    # Crear tabla de productos
+    productos_table = Table(productos_data, colWidths=[200, 70, 100, 100])
+    productos_table.setStyle(estilos['tabla'])
+
+    elements.append(productos_table)
+
+    # Construir el PDF
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+# Tipo de documento -> función de renderizado
+RENDERERS: Dict[str, Callable[[Dict[str, Any]], bytes]] = {
+    "cierre": render_cierre,
+    "reporte_periodo": render_reporte_periodo,
+    "transaccion": render_transaccion,
+}
+
+
+def render(tipo: str, snapshot: Dict[str, Any]) -> bytes:
+    """Punto de entrada de los workers"""
+    return RENDERERS[tipo](snapshot)
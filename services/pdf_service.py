@@ -1,14 +1,284 @@
 # services/pdf_service.py
 
-from typing import Tuple, List, Optional, Dict, Any
+"""
+Generación de PDFs de cierres, reportes de período y transacciones.
+
+La consulta a la base de datos se hace aquí, en el proceso de la aplicación,
+y produce un snapshot con tipos simples. El renderizado con ReportLab (CPU
+intensivo) corre en un ProcessPoolExecutor (services/pdf_render.py), fuera
+del proceso que atiende las peticiones.
+
+`exportar_cierres_zip` arma en una sola sesión los snapshots de los cierres
+de un rango de fechas (y opcionalmente de sus transacciones), los renderiza
+en paralelo en el pool y entrega un zip por partes.
+
+Los documentos que ya no cambian (cierres de caja y transacciones de una
+caja cerrada) se guardan en disco con una clave de id y hash del snapshot:
+una descarga repetida es una lectura de archivo. Si los datos cambian (por
+ejemplo, se anula una venta del cierre), el hash cambia y el PDF se vuelve a
+generar.
+"""
+
+from typing import Tuple, List, Optional, Dict, Any, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, date
 from sqlmodel import Session, select
-from io import BytesIO
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from core.config import settings
 from models.order import CierreCaja, Orden
+from services.cierre_caja_service import cargar_ordenes_cierre, obtener_cierre_detalle
+from services import pdf_render
 import logging
 
 logger = logging.getLogger(__name__)
 
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _iso(valor) -> Optional[str]:
+    return valor.isoformat() if isinstance(valor, (datetime, date)) else valor
+
+
+# — Snapshots —
+
+def _snapshot_cierre_fila(cierre: CierreCaja) -> Dict[str, Any]:
+    return {
+        "id": cierre.id,
+        "fecha": _iso(cierre.fecha),
+        "fecha_cierre": _iso(cierre.fecha_cierre),
+        "total_ventas": cierre.total_ventas,
+        "cantidad_transacciones": cierre.cantidad_transacciones,
+        "ticket_promedio": cierre.ticket_promedio,
+        "total_efectivo": cierre.total_efectivo,
+        "total_debito": cierre.total_debito,
+        "total_credito": cierre.total_credito,
+        "total_transferencia": cierre.total_transferencia,
+        "total_costo": cierre.total_costo,
+        "total_ganancia": cierre.total_ganancia,
+        "margen_promedio": cierre.margen_promedio,
+        "usuario_nombre": cierre.usuario_nombre,
+        "notas": cierre.notas,
+    }
+
+
+def snapshot_cierre(cierre: CierreCaja, transacciones: List[Orden]) -> Dict[str, Any]:
+    """Datos del PDF de un cierre, sin objetos ORM"""
+    return {
+        "cierre": _snapshot_cierre_fila(cierre),
+        "transacciones": [
+            {
+                "id": t.id,
+                "fecha": _iso(t.fecha),
+                "metodo_pago": t.metodo_pago,
+                "estado": t.estado,
+                "subtotal": t.subtotal,
+                "descuento": t.descuento,
+                "total": t.total,
+            }
+            # Orden fijo: el hash del snapshot es la clave de la cache
+            for t in sorted(transacciones, key=lambda t: t.id)
+        ],
+    }
+
+
+def snapshot_reporte_periodo(
+    cierres: List[CierreCaja],
+    resumen: Dict[str, Any],
+    ventas_categoria: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Datos del PDF del reporte de período, sin objetos ORM"""
+    return {
+        "resumen": dict(resumen),
+        "cierres": [_snapshot_cierre_fila(c) for c in cierres],
+        "ventas_categoria": [dict(fila) for fila in ventas_categoria or []],
+    }
+
+
+def snapshot_transaccion(transaccion: Orden) -> Dict[str, Any]:
+    """Datos del PDF de una transacción, sin objetos ORM"""
+    return {
+        "transaccion": {
+            "id": transaccion.id,
+            "fecha": _iso(transaccion.fecha),
+            "estado": transaccion.estado,
+            "metodo_pago": transaccion.metodo_pago,
+            "total": transaccion.total,
+            "items": [
+                {
+                    "producto": item.producto.nombre if hasattr(item.producto, 'nombre') else "Producto desconocido",
+                    "cantidad": item.cantidad,
+                    "precio_unitario": item.precio_unitario,
+                }
+                for item in sorted(transaccion.items, key=lambda item: item.id)
+            ],
+        },
+    }
+
+
+# — Pool de procesos —
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """Pool de renderizado, creado en el primer uso (None si PDF_WORKERS es 0)"""
+    global _pool
+    if settings.PDF_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el worker no hereda hilos ni conexiones del proceso de la aplicación
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=pdf_render.inicializar_worker,
+            )
+            logger.info(f"Pool de PDFs iniciado con {settings.PDF_WORKERS} procesos")
+        return _pool
+
+
+def cerrar_pool() -> None:
+    """Detiene los procesos del pool (al apagar la aplicación)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def renderizar(tipo: str, snapshot: Dict[str, Any]) -> bytes:
+    """Renderiza el snapshot en un proceso del pool y espera el resultado"""
+    pool = _get_pool()
+    if pool is None:
+        return pdf_render.render(tipo, snapshot)
+    try:
+        return pool.submit(pdf_render.render, tipo, snapshot).result()
+    except BrokenProcessPool:
+        # Un worker murió (p. ej. por memoria): se recrea el pool en la próxima llamada
+        logger.warning("Pool de PDFs roto; se renderiza en el proceso actual")
+        cerrar_pool()
+        return pdf_render.render(tipo, snapshot)
+
+
+# — Cache en disco —
+
+def _directorio_cache() -> str:
+    directorio = settings.PDF_CACHE_DIR or os.path.join(tempfile.gettempdir(), "pos_pdf_cache")
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _hash_snapshot(snapshot: Dict[str, Any]) -> str:
+    contenido = json.dumps(snapshot, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:32]
+
+
+def _ruta_cache(tipo: str, documento_id: int, snapshot: Dict[str, Any]) -> str:
+    return os.path.join(_directorio_cache(), f"{tipo}_{documento_id}_{_hash_snapshot(snapshot)}.pdf")
+
+
+def _leer_cache(ruta: str) -> Optional[bytes]:
+    try:
+        with open(ruta, "rb") as archivo:
+            return archivo.read()
+    except FileNotFoundError:
+        return None
+
+
+def _guardar_cache(ruta: str, tipo: str, documento_id: int, contenido: bytes) -> None:
+    directorio = os.path.dirname(ruta)
+    try:
+        # Las versiones anteriores del mismo documento ya no se van a pedir
+        for anterior in glob.glob(os.path.join(directorio, f"{tipo}_{documento_id}_*.pdf")):
+            os.remove(anterior)
+        # Escritura atómica: otro worker nunca lee un archivo a medias
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+        with os.fdopen(fd, "wb") as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el PDF en cache ({ruta}): {e}")
+
+
+def renderizar_cacheado(tipo: str, documento_id: int, snapshot: Dict[str, Any]) -> bytes:
+    """
+    Como `renderizar`, pero guarda el PDF en disco con clave
+    (tipo, id, hash del snapshot). Solo para documentos inmutables.
+    """
+    ruta = _ruta_cache(tipo, documento_id, snapshot)
+    contenido = _leer_cache(ruta)
+    if contenido is None:
+        contenido = renderizar(tipo, snapshot)
+        _guardar_cache(ruta, tipo, documento_id, contenido)
+    return contenido
+
+
+def renderizar_lote(documentos: List[Dict[str, Any]]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Renderiza varios documentos repartidos entre los procesos del pool.
+
+    Cada documento es un dict con "tipo", "id", "snapshot" y "nombre"; todos
+    son inmutables (se leen y guardan en la cache). Entrega (nombre, pdf) en
+    el mismo orden de `documentos`, a medida que cada uno está listo.
+    """
+    rutas = [_ruta_cache(d["tipo"], d["id"], d["snapshot"]) for d in documentos]
+    en_cache = [_leer_cache(ruta) for ruta in rutas]
+    pendientes = [d for d, contenido in zip(documentos, en_cache) if contenido is None]
+    logger.info(f"Lote de PDFs: {len(documentos)} documentos, {len(pendientes)} por renderizar")
+
+    tipos = [d["tipo"] for d in pendientes]
+    snapshots = [d["snapshot"] for d in pendientes]
+    pool = _get_pool()
+    if pool is None:
+        renderizados = map(pdf_render.render, tipos, snapshots)
+    else:
+        # Lotes de varios documentos por envío para no pagar IPC por cada PDF
+        chunksize = max(1, len(pendientes) // (settings.PDF_WORKERS * 4))
+        renderizados = pool.map(pdf_render.render, tipos, snapshots, chunksize=chunksize)
+
+    for documento, ruta, contenido in zip(documentos, rutas, en_cache):
+        if contenido is None:
+            contenido = next(renderizados)
+            _guardar_cache(ruta, documento["tipo"], documento["id"], contenido)
+        yield documento["nombre"], contenido
+
+
+class _SalidaZip:
+    """Destino no buscable para ZipFile: acumula lo escrito hasta que se consume"""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, datos: bytes) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def consumir(self) -> bytes:
+        datos, self._partes = b"".join(self._partes), []
+        return datos
+
+
+def zip_en_partes(archivos: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """Arma un zip con (nombre, contenido) y lo entrega archivo por archivo"""
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for nombre, contenido in archivos:
+            archivo_zip.writestr(nombre, contenido)
+            yield salida.consumir()
+    yield salida.consumir()
+
+
+# — Documentos —
+
 def generar_pdf_cierre(db: Session, cierre_id: int) -> Tuple[bytes, str]:
     """
     Genera un PDF con los detalles del cierre de caja.
@@ -20,181 +290,14 @@ def generar_pdf_cierre(db: Session, cierre_id: int) -> Tuple[bytes, str]:
     Returns:
         Tupla con (contenido_pdf, nombre_archivo)
     """
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.lib.units import cm
-    
-    # Obtener el cierre con sus transacciones
-    cierre = db.get(CierreCaja, cierre_id)
+    # Obtener el cierre con sus transacciones (dos consultas)
+    cierre = obtener_cierre_detalle(db, cierre_id)
     
     if not cierre:
         raise ValueError(f"Cierre no encontrado: {cierre_id}")
     
-    # Obtener las transacciones asociadas al cierre
-    query = select(Orden).where(Orden.cierre_id == cierre_id)
-    transacciones = db.exec(query).all()
-    
-    # Crear un buffer para almacenar el PDF
-    buffer = BytesIO()
-    
-    # Crear el documento PDF
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    # Estilos para el PDF
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    subtitle_style = styles['Heading2']
-    normal_style = styles['Normal']
-    
-    # Título
-    elements.append(Paragraph(f"Cierre de Caja #{cierre.id}", title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Información general del cierre
-    elements.append(Paragraph("Información General", subtitle_style))
-    
-    # Formatear fechas
-    fecha_formateada = cierre.fecha.strftime('%d/%m/%Y')
-    fecha_cierre_formateada = cierre.fecha_cierre.strftime('%d/%m/%Y %H:%M')
-    
-    # Datos generales en formato de tabla
-    data = [
-        ["ID:", str(cierre.id)],
-        ["Fecha:", fecha_formateada],
-        ["Hora de Cierre:", fecha_cierre_formateada],
-        ["Total de Ventas:", f"${cierre.total_ventas:,.0f}"],
-        ["Total de Transacciones:", str(cierre.cantidad_transacciones)],
-        ["Ticket Promedio:", f"${cierre.ticket_promedio:,.0f}"]
-    ]
-    
-    # Si hay usuario, añadir a la tabla
-    if cierre.usuario_nombre:
-        data.append(["Usuario:", cierre.usuario_nombre])
-    
-    t = Table(data, colWidths=[100, 300])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('BACKGROUND', (1, 0), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(t)
-    elements.append(Spacer(1, 20))
-    
-    # Desglose por método de pago
-    elements.append(Paragraph("Desglose por Método de Pago", subtitle_style))
-    
-    metodos_data = [
-        ["Método", "Monto"],
-        ["Efectivo", f"${cierre.total_efectivo:,.0f}"],
-        ["Débito", f"${cierre.total_debito:,.0f}"],
-        ["Crédito", f"${cierre.total_credito:,.0f}"],
-        ["Transferencia", f"${cierre.total_transferencia:,.0f}"],
-        ["TOTAL", f"${cierre.total_ventas:,.0f}"]
-    ]
-    
-    metodos_table = Table(metodos_data, colWidths=[150, 150])
-    metodos_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),  # Fila total
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(metodos_table)
-    elements.append(Spacer(1, 20))
-    
-    # Información de rentabilidad
-    elements.append(Paragraph("Información de Rentabilidad", subtitle_style))
-    
-    rentabilidad_data = [
-        ["Concepto", "Valor"],
-        ["Costo de Productos", f"${cierre.total_costo:,.0f}"],
-        ["Ganancia", f"${cierre.total_ganancia:,.0f}"],
-        ["Margen Promedio", f"{cierre.margen_promedio:.2f}%"]
-    ]
-    
-    rentabilidad_table = Table(rentabilidad_data, colWidths=[150, 150])
-    rentabilidad_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(rentabilidad_table)
-    elements.append(Spacer(1, 20))
-    
-    # Listado de transacciones
-    if transacciones:
-        elements.append(Paragraph("Detalle de Transacciones", subtitle_style))
-        
-        # Cabecera de la tabla de transacciones
-        transacciones_data = [["ID", "Hora", "Método", "Estado", "Subtotal", "Descuento", "Total"]]
-        
-        # Agregar cada transacción
-        for t in transacciones:
-            hora = t.fecha.strftime('%H:%M')
-            subtotal = t.subtotal or t.total
-            descuento = t.descuento or 0
-            
-            transacciones_data.append([
-                str(t.id),
-                hora,
-                t.metodo_pago.capitalize(),
-                t.estado.capitalize(),
-                f"${subtotal:,.0f}",
-                f"${descuento:,.0f}" if descuento > 0 else "-",
-                f"${t.total:,.0f}"
-            ])
-        
-        # Crear tabla de transacciones
-        trans_table = Table(transacciones_data, colWidths=[40, 40, 70, 70, 70, 70, 70])
-        trans_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(trans_table)
-    
-    # Notas
-    if cierre.notas:
-        elements.append(Spacer(1, 20))
-        elements.append(Paragraph("Notas:", subtitle_style))
-        elements.append(Paragraph(cierre.notas, normal_style))
-    
-    # Construir el PDF
-    doc.build(elements)
-    
-    # Obtener el contenido del buffer
-    pdf_contenido = buffer.getvalue()
-    buffer.close()
+    # Un cierre de caja ya está cerrado: se puede guardar en cache
+    pdf_contenido = renderizar_cacheado("cierre", cierre.id, snapshot_cierre(cierre, cierre.ordenes))
     
     # Nombre del archivo
     fecha_str = cierre.fecha.strftime('%Y%m%d')
@@ -202,7 +305,13 @@ def generar_pdf_cierre(db: Session, cierre_id: int) -> Tuple[bytes, str]:
     
     return pdf_contenido, pdf_nombre
     
-def generar_pdf_reporte_periodo(db: Session, cierres: List[CierreCaja], resumen: Dict[str, Any], filtros: Dict[str, Any]) -> Tuple[bytes, str]:
+def generar_pdf_reporte_periodo(
+    db: Session,
+    cierres: List[CierreCaja],
+    resumen: Dict[str, Any],
+    filtros: Dict[str, Any],
+    ventas_categoria: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[bytes, str]:
     """
     Genera un PDF con el reporte de un período de tiempo.
     
@@ -211,111 +320,15 @@ def generar_pdf_reporte_periodo(db: Session, cierres: List[CierreCaja], resumen:
         cierres: Lista de objetos CierreCaja del período
         resumen: Diccionario con los totales y estadísticas del período
         filtros: Filtros aplicados al reporte
+        ventas_categoria: Ventas por categoría del período (resumen diario)
     
     Returns:
         Tupla con (contenido_pdf, nombre_archivo)
     """
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter, landscape
-    from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.lib.units import inch
-    
-    # Crear un buffer para almacenar el PDF
-    buffer = BytesIO()
-    
-    # Crear el documento PDF en orientación horizontal
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-    elements = []
-    
-    # Estilos para el PDF
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    subtitle_style = styles['Heading2']
-    normal_style = styles['Normal']
-    
-    # Título
-    periodo = resumen.get("periodo", "completo")
-    elements.append(Paragraph(f"Reporte de Período: {periodo}", title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Información del resumen en formato de tabla
-    elements.append(Paragraph("Resumen del Período", subtitle_style))
-    elements.append(Spacer(1, 6))
-    
-    # Datos generales en formato de tabla
-    resumen_data = [
-        ["Total Ventas:", f"${resumen['total_ventas']:,.0f}", "Transacciones:", f"{resumen['total_transacciones']}"],
-        ["Efectivo:", f"${resumen['total_efectivo']:,.0f}", "Ticket Promedio:", f"${resumen['ticket_promedio']:,.0f}"],
-        ["Transferencia:", f"${resumen['total_transferencia']:,.0f}", "Venta Promedio Diaria:", f"${resumen['promedio_diario']:,.0f}"],
-        ["Débito:", f"${resumen['total_debito']:,.0f}", "", ""],
-        ["Crédito:", f"${resumen['total_credito']:,.0f}", "", ""],
-        ["Otros:", f"${resumen['total_otros']:,.0f}", "", ""],
-    ]
-    
-    t = Table(resumen_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('BACKGROUND', (2, 0), (2, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (1, -1), 1, colors.black),
-        ('GRID', (2, 0), (3, -1), 1, colors.black),
-    ]))
-    
-    elements.append(t)
-    elements.append(Spacer(1, 20))
-    
-    # Lista de cierres
-    if cierres:
-        elements.append(Paragraph("Cierres de Caja en el Período", subtitle_style))
-        elements.append(Spacer(1, 6))
-        
-        # Cabecera de la tabla de cierres
-        cierres_data = [["ID", "Fecha", "Ventas", "Efectivo", "Transferencia", "Débito", "Crédito", "Transacciones", "Ticket Promedio"]]
-        
-        # Agregar cada cierre
-        for cierre in cierres:
-            fecha = cierre.fecha.strftime('%d/%m/%Y') if cierre.fecha else "N/A"
-            cierres_data.append([
-                str(cierre.id),
-                fecha,
-                f"${cierre.total_ventas:,.0f}",
-                f"${cierre.total_efectivo:,.0f}",
-                f"${cierre.total_transferencia:,.0f}",
-                f"${cierre.total_debito:,.0f}",
-                f"${cierre.total_credito:,.0f}",
-                str(cierre.cantidad_transacciones),
-                f"${cierre.ticket_promedio:,.0f}"
-            ])
-        
-        # Crear tabla de cierres
-        cierres_table = Table(cierres_data, repeatRows=1)
-        cierres_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(cierres_table)
-    else:
-        elements.append(Paragraph("No hay cierres de caja en el período seleccionado.", normal_style))
-    
-    # Construir el PDF
-    doc.build(elements)
-    
-    # Obtener el contenido del buffer
-    pdf_contenido = buffer.getvalue()
-    buffer.close()
+    # El período puede seguir abierto ("al Presente"): no se guarda en cache
+    pdf_contenido = renderizar(
+        "reporte_periodo", snapshot_reporte_periodo(cierres, resumen, ventas_categoria)
+    )
     
     # Determinar el rango de fechas para el nombre del archivo
     desde = filtros.get("fecha_desde", "").strftime("%Y%m%d") if filtros.get("fecha_desde") else "inicio"
@@ -325,3 +338,70 @@ def generar_pdf_reporte_periodo(db: Session, cierres: List[CierreCaja], resumen:
     pdf_nombre = f"reporte_periodo_{desde}_a_{hasta}.pdf"
     
     return pdf_contenido, pdf_nombre
+
+
+def pdf_transaccion(transaccion: Orden) -> bytes:
+    """
+    PDF de una transacción (ver transacciones_service.generar_pdf_transaccion). Las de una caja ya cerrada se guardan en cache;
+    las de la caja abierta se renderizan cada vez.
+    """
+    snapshot = snapshot_transaccion(transaccion)
+    if transaccion.cierre_id is not None:
+        return renderizar_cacheado("transaccion", transaccion.id, snapshot)
+    return renderizar("transaccion", snapshot)
+
+
+def documentos_cierres(
+    db: Session,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    incluir_transacciones: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Snapshots de los cierres del período (y de sus transacciones), con las
+    órdenes, ítems y productos cargados en un número fijo de consultas.
+    Devuelve documentos para `renderizar_lote`.
+    """
+    query = (
+        select(CierreCaja)
+        .options(cargar_ordenes_cierre(con_items=incluir_transacciones))
+        .order_by(CierreCaja.fecha, CierreCaja.id)
+    )
+    if fecha_desde:
+        query = query.where(CierreCaja.fecha >= fecha_desde)
+    if fecha_hasta:
+        query = query.where(CierreCaja.fecha <= fecha_hasta)
+
+    documentos = []
+    for cierre in db.exec(query).all():
+        carpeta = f"cierre_caja_{cierre.id}_{cierre.fecha.strftime('%Y%m%d')}"
+        documentos.append({
+            "tipo": "cierre",
+            "id": cierre.id,
+            "snapshot": snapshot_cierre(cierre, cierre.ordenes),
+            "nombre": f"{carpeta}.pdf",
+        })
+        if incluir_transacciones:
+            for orden in sorted(cierre.ordenes, key=lambda o: o.id):
+                documentos.append({
+                    "tipo": "transaccion",
+                    "id": orden.id,
+                    "snapshot": snapshot_transaccion(orden),
+                    "nombre": f"{carpeta}/transaccion_{orden.id}.pdf",
+                })
+    return documentos
+
+
+def exportar_cierres_zip(
+    db: Session,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    incluir_transacciones: bool = False
+) -> Iterator[bytes]:
+    """
+    Zip con los PDFs de los cierres del período, como iterador de bytes para
+    una StreamingResponse. La base de datos se consulta antes de devolverlo:
+    el iterador no usa la sesión.
+    """
+    documentos = documentos_cierres(db, fecha_desde, fecha_hasta, incluir_transacciones)
+    return zip_en_partes(renderizar_lote(documentos))
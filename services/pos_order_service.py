@@ -0,0 +1,278 @@
+# services/pos_order_service.py
+
+"""
+Registro de ventas del POS.
+
+El stock de todo el carrito se descuenta con una sola sentencia condicional
+(UPDATE ... SET cantidad = cantidad - n WHERE id = :id AND cantidad >= n),
+de modo que dos terminales vendiendo el mismo producto no pueden dejar el
+stock negativo, y los ítems se insertan en bloque. El número de viajes a la
+base de datos no depende del tamaño del carrito.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import logging
+
+from fastapi import HTTPException
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models.models import Producto
+from models.order import Orden, OrdenIdempotencia, OrdenItem
+from schemas.order import OrdenBatchResultado, OrdenCreate, OrdenOffline
+from utils.timezone import convert_to_santiago, now_santiago
+
+logger = logging.getLogger(__name__)
+
+
+def cargar_precios(session: Session, producto_ids) -> Dict[int, Tuple[float, Optional[float]]]:
+    """Precio y costo actuales de varios productos en una sola consulta"""
+    filas = session.exec(
+        select(Producto.id, Producto.precio, Producto.costo).where(Producto.id.in_(list(producto_ids)))
+    ).all()
+    return {producto_id: (precio, costo) for producto_id, precio, costo in filas}
+
+
+def descontar_stock(session: Session, cantidades: Dict[int, int]) -> Dict[int, int]:
+    """
+    Descuenta stock de varios productos en una sola sentencia.
+
+    Solo se actualizan las filas con stock suficiente; retorna el nuevo stock
+    de cada producto actualizado. Si falta alguno, quien llama debe revertir
+    la transacción.
+    """
+    if not cantidades:
+        return {}
+    descuento = case(cantidades, value=Producto.id)
+    statement = (
+        update(Producto)
+        .where(Producto.id.in_(list(cantidades)), Producto.cantidad >= descuento)
+        .values(cantidad=Producto.cantidad - descuento)
+        .returning(Producto.id, Producto.cantidad)
+        .execution_options(synchronize_session=False)
+    )
+    return {producto_id: cantidad for producto_id, cantidad in session.execute(statement)}
+
+
+def registrar_orden(
+    session: Session,
+    order_in: OrdenCreate,
+    fecha: Optional[datetime] = None,
+    precios: Optional[Dict[int, Tuple[float, Optional[float]]]] = None,
+) -> Tuple[Orden, Dict[int, int], float]:
+    """
+    Crea la orden, sus ítems y descuenta stock dentro de la transacción de
+    `session` (sin hacer commit).
+
+    fecha: momento original de la venta (órdenes encoladas sin conexión).
+    precios: (precio, costo) ya cargados por producto, para no consultarlos otra vez.
+
+    Returns:
+        (orden, stock_actualizado, costo): la orden creada, el nuevo stock por
+        producto y el costo de lo vendido (productos sin costo no suman)
+
+    Raises:
+        HTTPException 404 si algún producto no existe, 400 si falta stock.
+    """
+    # Un mismo producto puede venir en varias líneas del carrito
+    cantidades: Dict[int, int] = defaultdict(int)
+    for item in order_in.items:
+        cantidades[item.producto_id] += item.cantidad
+
+    if precios is None:
+        precios = cargar_precios(session, cantidades)
+    if any(producto_id not in precios for producto_id in cantidades):
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    stock_actualizado = descontar_stock(session, cantidades)
+    if len(stock_actualizado) < len(cantidades):
+        raise HTTPException(status_code=400, detail="Stock insuficiente")
+
+    # Inicializar la orden con los datos recibidos
+    orden = Orden(
+        total=0.0,
+        subtotal=order_in.subtotal if order_in.subtotal is not None else 0.0,
+        descuento=order_in.descuento if order_in.descuento is not None else 0.0,
+        descuento_porcentaje=order_in.descuento_porcentaje or 0.0,
+        metodo_pago=order_in.metodo_pago,
+        datos_adicionales=order_in.datos_adicionales
+    )
+    if fecha is not None:
+        orden.fecha = fecha
+    session.add(orden)
+    session.flush()
+
+    # Registrar los ítems en bloque
+    session.execute(insert(OrdenItem), [
+        {
+            "orden_id": orden.id,
+            "producto_id": item.producto_id,
+            "cantidad": item.cantidad,
+            "precio_unitario": precios[item.producto_id][0],
+            "descuento": item.descuento or 0.0,
+        }
+        for item in order_in.items
+    ])
+
+    # Si no se proporcionó subtotal, usamos el calculado
+    if orden.subtotal == 0.0:
+        orden.subtotal = sum(precios[item.producto_id][0] * item.cantidad for item in order_in.items)
+
+    # Calcular el total final considerando descuentos
+    orden.total = orden.subtotal - orden.descuento
+    session.add(orden)
+    costo = sum(
+        precios[item.producto_id][1] * item.cantidad
+        for item in order_in.items
+        if precios[item.producto_id][1] is not None
+    )
+    return orden, stock_actualizado, costo
+
+
+def huella_solicitud(order_in: OrdenCreate) -> str:
+    """Huella del cuerpo de una orden para detectar reutilización de la clave"""
+    # Solo los campos de OrdenCreate: un reintento directo y la misma venta
+    # sincronizada desde la cola offline producen la misma huella
+    campos = set(OrdenCreate.model_fields)
+    return hashlib.sha256(order_in.model_dump_json(include=campos).encode()).hexdigest()
+
+
+def buscar_respuesta_idempotente(
+    session: Session,
+    key: str,
+    request_hash: str,
+) -> Optional[OrdenIdempotencia]:
+    """
+    Retorna la respuesta guardada para una Idempotency-Key, o None si la clave
+    es nueva.
+
+    Raises:
+        HTTPException 422 si la clave ya se usó con un cuerpo distinto.
+    """
+    registro = session.get(OrdenIdempotencia, key)
+    if registro is not None and registro.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="La Idempotency-Key ya se usó con una orden distinta"
+        )
+    return registro
+
+
+def guardar_respuesta_idempotente(
+    session: Session,
+    key: str,
+    request_hash: str,
+    orden: Orden,
+    response: Dict[str, Any],
+) -> None:
+    """Registra la respuesta en la misma transacción que crea la orden"""
+    session.add(OrdenIdempotencia(
+        key=key,
+        orden_id=orden.id,
+        request_hash=request_hash,
+        status_code=201,
+        response=response,
+    ))
+
+
+def _resultado_registrado(key: str, request_hash: str, registro: OrdenIdempotencia) -> OrdenBatchResultado:
+    """Resultado de una orden cuya Idempotency-Key ya estaba registrada"""
+    if registro.request_hash != request_hash:
+        return OrdenBatchResultado(
+            idempotency_key=key, estado="error", status_code=422,
+            detail="La Idempotency-Key ya se usó con una orden distinta",
+        )
+    return OrdenBatchResultado(
+        idempotency_key=key, estado="repetida",
+        status_code=registro.status_code, orden=registro.response,
+    )
+
+
+def registrar_ordenes_offline(
+    session: Session,
+    ordenes: List[OrdenOffline],
+) -> Tuple[List[OrdenBatchResultado], Dict[int, int], List[Tuple[Orden, float]]]:
+    """
+    Registra un lote de órdenes encoladas sin conexión en una sola transacción.
+
+    Se procesan en orden cronológico para que el stock se consuma en el mismo
+    orden en que ocurrieron las ventas. Cada orden va en su propio SAVEPOINT:
+    si una falla (p. ej. stock insuficiente) solo se revierte esa. Las claves
+    ya registradas se responden con la orden guardada, sin volver a crearla.
+    El commit queda a cargo de quien llama.
+
+    Returns:
+        (resultados en el orden recibido, nuevo stock por producto,
+         órdenes creadas con su costo)
+    """
+    ahora = now_santiago()
+    fechas = {
+        i: min(convert_to_santiago(o.fecha), ahora) if o.fecha else ahora
+        for i, o in enumerate(ordenes)
+    }
+
+    # Claves ya registradas y precios de todo el lote en dos consultas
+    keys = {o.idempotency_key for o in ordenes}
+    registrados = {
+        r.key: r for r in session.exec(
+            select(OrdenIdempotencia).where(OrdenIdempotencia.key.in_(list(keys)))
+        ).all()
+    }
+    precios = cargar_precios(session, {item.producto_id for o in ordenes for item in o.items})
+
+    resultados: Dict[int, OrdenBatchResultado] = {}
+    stock_actualizado: Dict[int, int] = {}
+    creadas: List[Tuple[Orden, float]] = []
+    for i in sorted(fechas, key=lambda i: fechas[i]):
+        order_in = ordenes[i]
+        key = order_in.idempotency_key
+        request_hash = huella_solicitud(order_in)
+
+        registro = registrados.get(key)
+        if registro is not None:
+            resultados[i] = _resultado_registrado(key, request_hash, registro)
+            continue
+
+        try:
+            with session.begin_nested():
+                orden, stock, costo = registrar_orden(session, order_in, fecha=fechas[i], precios=precios)
+                session.flush()
+                session.refresh(orden)
+                respuesta = orden.model_dump(mode="json")
+                guardar_respuesta_idempotente(session, key, request_hash, orden, respuesta)
+                session.flush()
+        except HTTPException as e:
+            resultados[i] = OrdenBatchResultado(
+                idempotency_key=key, estado="error", status_code=e.status_code, detail=e.detail,
+            )
+            continue
+        except IntegrityError:
+            # Otra solicitud con la misma clave se confirmó primero: el
+            # SAVEPOINT ya revirtió esta orden; se responde con la guardada
+            registro = session.exec(
+                select(OrdenIdempotencia)
+                .where(OrdenIdempotencia.key == key)
+                .execution_options(populate_existing=True)
+            ).first()
+            if registro is None:
+                raise
+            registrados[key] = registro
+            resultados[i] = _resultado_registrado(key, request_hash, registro)
+            continue
+
+        registrados[key] = session.get(OrdenIdempotencia, key)
+        stock_actualizado.update(stock)
+        creadas.append((orden, costo))
+        resultados[i] = OrdenBatchResultado(
+            idempotency_key=key, estado="creada", status_code=201, orden=respuesta,
+        )
+
+    logger.info(
+        f"Lote offline: {sum(r.estado == 'creada' for r in resultados.values())} creadas "
+        f"de {len(ordenes)} recibidas"
+    )
+    return [resultados[i] for i in range(len(ordenes))], stock_actualizado, creadas
@@ -0,0 +1,253 @@
+# services/product_index.py
+
+"""
+Índice de búsqueda en memoria para el catálogo de productos del POS.
+
+Evita los `ilike('%term%')` sobre la tabla producto (que no pueden usar
+los índices de la base de datos) manteniendo en el proceso:
+- un mapa exacto codigo_barra -> id
+- una lista ordenada de nombres para búsquedas por prefijo (bisect)
+- postings de trigramas para búsquedas por subcadena
+
+El índice se construye una vez desde la base de datos y luego se actualiza
+de forma incremental desde los servicios que modifican productos.
+"""
+
+from bisect import bisect_left, insort
+from threading import RLock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import time
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+from models.models import Producto
+from schemas.producto import ProductoSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+def _normalizar(texto: Optional[str]) -> str:
+    """Normaliza un texto para comparación sin distinguir mayúsculas (como ILIKE)"""
+    return (texto or "").strip().lower()
+
+
+def _trigramas(texto: str) -> Set[str]:
+    """Retorna el conjunto de trigramas de un texto ya normalizado"""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class ProductSearchIndex:
+    """
+    Índice en memoria del catálogo con ranking equivalente a la búsqueda SQL:
+    coincidencia exacta de código de barras primero, luego los nombres que
+    empiezan con el término y después el resto, ambos ordenados por nombre.
+    """
+
+    def __init__(self, max_age: int = 300):
+        # max_age acota cuánto puede divergir el índice de cambios hechos por
+        # otros workers; pasado ese tiempo se reconstruye en la siguiente búsqueda
+        self.max_age = max_age
+        self._lock = RLock()
+        self._productos: Dict[int, ProductoSnapshot] = {}
+        self._por_codigo: Dict[str, int] = {}
+        self._nombres: List[Tuple[str, int]] = []
+        self._trigramas: Dict[str, Set[int]] = {}
+        self._claves: Dict[int, Tuple[str, str]] = {}
+        self._cargado_en: Optional[float] = None
+        # Versión del índice: cambia cada vez que se reconstruye o se marca como
+        # obsoleto (los cambios puntuales se invalidan en el cache por namespace
+        # o por tag desde quien los hace)
+        self._version = 0
+
+    # ------------------------------------------------------------------
+    # Construcción y mantenimiento
+    # ------------------------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _touch(self) -> None:
+        self._version += 1
+
+    def is_loaded(self) -> bool:
+        if self._cargado_en is None:
+            return False
+        return (time.time() - self._cargado_en) < self.max_age
+
+    def rebuild(self, session: Session) -> int:
+        """Reconstruye el índice completo desde la base de datos"""
+        statement = select(Producto).options(selectinload(Producto.categoria))
+        productos = session.exec(statement).all()
+        return self.load([ProductoSnapshot.from_producto(p) for p in productos])
+
+    def load(self, snapshots: List[ProductoSnapshot]) -> int:
+        """Carga el índice completo a partir de snapshots de productos"""
+        with self._lock:
+            self._productos.clear()
+            self._por_codigo.clear()
+            self._nombres = []
+            self._trigramas.clear()
+            self._claves.clear()
+            for snap in snapshots:
+                self._agregar(snap)
+            self._nombres.sort()
+            self._cargado_en = time.time()
+            self._touch()
+
+        logger.info(f"Índice de productos construido: {len(snapshots)} productos")
+        return len(snapshots)
+
+    def ensure_loaded(self, session: Session) -> None:
+        if not self.is_loaded():
+            self.rebuild(session)
+
+    def invalidate(self) -> None:
+        """Marca el índice como obsoleto; se reconstruirá en la próxima búsqueda"""
+        with self._lock:
+            self._cargado_en = None
+            self._touch()
+
+    def upsert(self, producto: Producto) -> None:
+        """Agrega o actualiza un producto en el índice"""
+        if producto is None or producto.id is None:
+            return
+        self.upsert_snapshot(ProductoSnapshot.from_producto(producto))
+
+    def upsert_snapshot(self, snap: ProductoSnapshot) -> None:
+        with self._lock:
+            if self._cargado_en is None:
+                # Sin índice construido no hay nada que mantener
+                return
+            self._quitar(snap.id)
+            self._agregar(snap, ordenado=True)
+
+    def update_stock(self, producto_id: int, cantidad: int) -> None:
+        """Actualiza solo la cantidad de un producto (no cambia claves de búsqueda)"""
+        with self._lock:
+            snap = self._productos.get(producto_id)
+            if snap is not None:
+                self._productos[producto_id] = snap.replace(cantidad=cantidad)
+
+    def remove(self, producto_id: int) -> None:
+        with self._lock:
+            self._quitar(producto_id)
+
+    def _agregar(self, snap: ProductoSnapshot, ordenado: bool = False) -> None:
+        producto_id = snap.id
+        nombre = _normalizar(snap.nombre)
+        codigo = _normalizar(snap.codigo_barra)
+
+        self._productos[producto_id] = snap
+        self._claves[producto_id] = (nombre, codigo)
+        if snap.codigo_barra:
+            self._por_codigo[snap.codigo_barra.strip()] = producto_id
+
+        if ordenado:
+            insort(self._nombres, (nombre, producto_id))
+        else:
+            self._nombres.append((nombre, producto_id))
+
+        for tri in _trigramas(nombre) | _trigramas(codigo):
+            self._trigramas.setdefault(tri, set()).add(producto_id)
+
+    def _quitar(self, producto_id: int) -> None:
+        snap = self._productos.pop(producto_id, None)
+        if snap is None:
+            return
+        nombre, codigo = self._claves.pop(producto_id)
+
+        codigo_original = (snap.codigo_barra or "").strip()
+        if codigo_original and self._por_codigo.get(codigo_original) == producto_id:
+            del self._por_codigo[codigo_original]
+
+        pos = bisect_left(self._nombres, (nombre, producto_id))
+        if pos < len(self._nombres) and self._nombres[pos] == (nombre, producto_id):
+            del self._nombres[pos]
+
+        for tri in _trigramas(nombre) | _trigramas(codigo):
+            ids = self._trigramas.get(tri)
+            if ids is not None:
+                ids.discard(producto_id)
+                if not ids:
+                    del self._trigramas[tri]
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _prefijo(self, termino: str) -> Iterable[int]:
+        """Ids cuyo nombre empieza con el término, en orden alfabético"""
+        pos = bisect_left(self._nombres, (termino, -1))
+        while pos < len(self._nombres):
+            nombre, producto_id = self._nombres[pos]
+            if not nombre.startswith(termino):
+                break
+            yield producto_id
+            pos += 1
+
+    def _candidatos_subcadena(self, termino: str) -> Iterable[int]:
+        """Ids que pueden contener el término (filtrados luego por verificación exacta)"""
+        if len(termino) < 3:
+            # Con menos de 3 caracteres no hay trigramas: se revisa el catálogo
+            return self._productos.keys()
+        postings = [self._trigramas.get(tri) for tri in _trigramas(termino)]
+        if not all(postings):
+            return ()
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    def search(self, session: Session, query: str, limit: int = 20) -> List[ProductoSnapshot]:
+        """
+        Busca productos por nombre o código de barras.
+        Retorna snapshots inmutables con los campos de ProductoRead.
+        """
+        self.ensure_loaded(session)
+        termino_original = query.strip()
+        termino = _normalizar(query)
+        if not termino:
+            return []
+
+        with self._lock:
+            # 1. Coincidencia exacta de código de barras
+            exacto = self._por_codigo.get(termino_original)
+            if exacto is not None:
+                return [self._productos[exacto]]
+
+            # 2. Nombres que empiezan con el término (ya vienen ordenados)
+            resultados: List[int] = []
+            vistos: Set[int] = set()
+            for producto_id in self._prefijo(termino):
+                resultados.append(producto_id)
+                vistos.add(producto_id)
+                if len(resultados) >= limit:
+                    return [self._productos[i] for i in resultados]
+
+            # 3. Resto de coincidencias por subcadena en nombre o código
+            resto = []
+            for producto_id in self._candidatos_subcadena(termino):
+                if producto_id in vistos:
+                    continue
+                nombre, codigo = self._claves[producto_id]
+                if termino in nombre or termino in codigo:
+                    resto.append((nombre, producto_id))
+            resto.sort()
+            resultados.extend(producto_id for _, producto_id in resto[:limit - len(resultados)])
+
+            return [self._productos[i] for i in resultados]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "productos": len(self._productos),
+                "codigos_barra": len(self._por_codigo),
+                "trigramas": len(self._trigramas),
+                "cargado": self.is_loaded(),
+                "version": self._version,
+            }
+
+
+# Índice global del catálogo
+product_index = ProductSearchIndex(max_age=300)
@@ -0,0 +1,96 @@
+# services/productos_admin_service.py
+
+"""
+Consultas del listado de productos del panel de administración.
+
+La búsqueda, el filtro por categoría, la paginación (LIMIT/OFFSET) y las
+estadísticas se resuelven en la base de datos: una consulta de agregados y
+otra para la página, sin cargar el catálogo completo en memoria.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+from models.models import Categoria, Producto
+
+SIN_CATEGORIA = "Sin categoría"
+
+
+def _filtrar(query, q: Optional[str] = None, categoria_nombre: Optional[str] = None):
+    """
+    Aplica la búsqueda global (nombre, código de barras o categoría, sin
+    distinguir mayúsculas) y el filtro por nombre de categoría.
+    """
+    query = query.outerjoin(Categoria, Categoria.id == Producto.categoria_id)
+    if categoria_nombre == SIN_CATEGORIA:
+        query = query.where(Producto.categoria_id == None)
+    elif categoria_nombre:
+        query = query.where(Categoria.nombre == categoria_nombre)
+
+    # lower() de SQLite solo pasa a minúsculas ASCII: en la base de desarrollo
+    # "ÉCLAIR" no encuentra "éclair" (en PostgreSQL sí)
+    termino = (q or "").strip().lower()
+    if termino:
+        query = query.where(or_(
+            func.lower(Producto.nombre).contains(termino, autoescape=True),
+            func.lower(func.coalesce(Producto.codigo_barra, "")).contains(termino, autoescape=True),
+            func.lower(func.coalesce(Categoria.nombre, "")).contains(termino, autoescape=True),
+        ))
+    return query
+
+
+def estadisticas_productos(
+    db: Session,
+    q: Optional[str] = None,
+    categoria_nombre: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Estadísticas del conjunto filtrado en una sola consulta de agregados:
+    total, con y sin stock, bajo stock (entre 1 y el umbral), valor del stock,
+    margen promedio y el total de productos del sistema.
+    """
+    con_stock = Producto.cantidad > 0
+    query = _filtrar(
+        select(
+            func.count(Producto.id),
+            func.sum(case((con_stock, 1), else_=0)),
+            func.sum(case((Producto.cantidad == 0, 1), else_=0)),
+            func.sum(case((con_stock & (Producto.cantidad <= Producto.umbral_stock), 1), else_=0)),
+            func.sum(case((con_stock, Producto.precio * Producto.cantidad), else_=0)),
+            # Sin margen cuenta como 0, como en el listado (ProductoSnapshot)
+            func.avg(func.coalesce(Producto.margen, 0.0)),
+            select(func.count(Producto.id)).scalar_subquery(),
+        ).select_from(Producto),
+        q, categoria_nombre,
+    )
+    total, con, sin, bajo, valor, margen, total_sistema = db.exec(query).one()
+    return {
+        "total_productos": total,
+        "productos_con_stock": con or 0,
+        "productos_sin_stock": sin or 0,
+        "productos_bajo_stock": bajo or 0,
+        "total_stock_valor": valor or 0,
+        "margen_promedio": round(margen, 2) if margen is not None else None,
+        "total_productos_sistema": total_sistema,
+    }
+
+
+def pagina_productos(
+    db: Session,
+    q: Optional[str] = None,
+    categoria_nombre: Optional[str] = None,
+    page: int = 1,
+    limit: int = 10,
+) -> List[Producto]:
+    """Productos de una página, en el orden del catálogo (categoría y nombre)"""
+    query = _filtrar(select(Producto), q, categoria_nombre)
+    query = (
+        query.options(selectinload(Producto.categoria))
+        .order_by(Producto.categoria_id.asc(), Producto.nombre.asc(), Producto.id.asc())
+        .offset((page - 1) * limit)
+        .limit(limit)
+    )
+    return db.exec(query).all()
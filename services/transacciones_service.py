@@ -1,14 +1,49 @@
 # services/transacciones_service.py
 
-from sqlmodel import Session, select
-from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime, date, timedelta
+import base64
+import binascii
+import csv
+import io
 import json
 
-from models.order import Orden, CierreCaja
+from models.models import Producto
+from models.order import Orden, CierreCaja, OrdenItem
 from schemas.order import OrdenRead, OrdenUpdate, OrdenFiltro
+from services.caja_abierta import caja_abierta
 from utils.timezone import now_santiago
 
+def _aplicar_filtros(query, filtros: Optional[Dict[str, Any]]):
+    """Agrega a `query` las condiciones de los filtros de transacciones"""
+    if not filtros:
+        return query
+
+    if "fecha_desde" in filtros and filtros["fecha_desde"]:
+        query = query.where(Orden.fecha >= filtros["fecha_desde"])
+    
+    if "fecha_hasta" in filtros and filtros["fecha_hasta"]:
+        fecha_fin = filtros["fecha_hasta"].replace(hour=23, minute=59, second=59)
+        query = query.where(Orden.fecha <= fecha_fin)
+    
+    if "metodo_pago" in filtros and filtros["metodo_pago"]:
+        query = query.where(Orden.metodo_pago == filtros["metodo_pago"])
+    
+    if "estado" in filtros and filtros["estado"]:
+        query = query.where(Orden.estado == filtros["estado"])
+    
+    if "cierre_caja_id" in filtros and filtros["cierre_caja_id"] is not None:
+        if filtros["cierre_caja_id"] == 0:  # 0 significa sin cierre
+            query = query.where(Orden.cierre_id == None)
+        else:
+            query = query.where(Orden.cierre_id == filtros["cierre_caja_id"])
+
+    return query
+
 def obtener_transacciones(
     db: Session, 
     filtros: Optional[Dict[str, Any]] = None
@@ -23,33 +58,200 @@ def obtener_transacciones(
     Returns:
         Lista de transacciones filtradas
     """
-    query = select(Orden)
-    
-    if filtros:
-        if "fecha_desde" in filtros and filtros["fecha_desde"]:
-            query = query.where(Orden.fecha >= filtros["fecha_desde"])
-        
-        if "fecha_hasta" in filtros and filtros["fecha_hasta"]:
-            fecha_fin = filtros["fecha_hasta"].replace(hour=23, minute=59, second=59)
-            query = query.where(Orden.fecha <= fecha_fin)
-        
-        if "metodo_pago" in filtros and filtros["metodo_pago"]:
-            query = query.where(Orden.metodo_pago == filtros["metodo_pago"])
-        
-        if "estado" in filtros and filtros["estado"]:
-            query = query.where(Orden.estado == filtros["estado"])
-        
-        if "cierre_caja_id" in filtros and filtros["cierre_caja_id"] is not None:
-            if filtros["cierre_caja_id"] == 0:  # 0 significa sin cierre
-                query = query.where(Orden.cierre_id == None)
-            else:
-                query = query.where(Orden.cierre_id == filtros["cierre_caja_id"])
+    query = _aplicar_filtros(select(Orden), filtros)
     
     # Ordenar por fecha descendente (más recientes primero)
-    query = query.order_by(Orden.fecha.desc())
+    query = query.order_by(Orden.fecha.desc(), Orden.id.desc())
     
     return db.exec(query).all()
 
+def codificar_cursor(orden: Orden) -> str:
+    """Cursor opaco que apunta justo después de `orden` en el listado"""
+    valor = json.dumps([orden.fecha.isoformat(), orden.id])
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Retorna (fecha, id) de un cursor generado por codificar_cursor.
+    
+    Raises:
+        ValueError si el cursor no es válido
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        fecha, orden_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(fecha), int(orden_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError("Cursor inválido") from e
+
+def obtener_pagina_transacciones(
+    db: Session,
+    filtros: Optional[Dict[str, Any]] = None,
+    cursor: Optional[str] = None,
+    limite: int = 50
+) -> Tuple[List[Orden], Optional[str]]:
+    """
+    Obtiene una página de transacciones ordenadas por (fecha, id) descendente.
+    
+    Usa paginación por cursor (keyset): en lugar de OFFSET se filtra por las
+    filas posteriores a la última de la página anterior, de modo que el costo
+    de cada página no crece con el historial.
+    
+    Args:
+        db: Sesión de base de datos
+        filtros: Diccionario con filtros a aplicar
+        cursor: Cursor de la página anterior (None para la primera)
+        limite: Cantidad máxima de transacciones por página
+    
+    Returns:
+        (transacciones de la página, cursor de la siguiente página o None)
+    
+    Raises:
+        ValueError si el cursor no es válido
+    """
+    query = _consulta_pagina(filtros, cursor, limite)
+    return _cortar_pagina(db.exec(query).all(), limite)
+
+def _consulta_pagina(filtros: Optional[Dict[str, Any]], cursor: Optional[str], limite: int):
+    query = _aplicar_filtros(select(Orden), filtros)
+    
+    if cursor:
+        fecha, orden_id = decodificar_cursor(cursor)
+        query = query.where(or_(
+            Orden.fecha < fecha,
+            and_(Orden.fecha == fecha, Orden.id < orden_id)
+        ))
+    
+    # Se pide una fila extra para saber si hay página siguiente
+    return query.order_by(Orden.fecha.desc(), Orden.id.desc()).limit(limite + 1)
+
+def _cortar_pagina(transacciones: List[Orden], limite: int) -> Tuple[List[Orden], Optional[str]]:
+    siguiente = None
+    if len(transacciones) > limite:
+        transacciones = transacciones[:limite]
+        siguiente = codificar_cursor(transacciones[-1])
+    
+    return transacciones, siguiente
+
+def contar_transacciones(
+    db: Session,
+    filtros: Optional[Dict[str, Any]] = None
+) -> int:
+    """Cantidad de transacciones que cumplen los filtros (un solo COUNT)"""
+    query = _aplicar_filtros(select(func.count(Orden.id)), filtros)
+    return db.exec(query).one()
+
+async def obtener_pagina_transacciones_async(
+    db: AsyncSession,
+    filtros: Optional[Dict[str, Any]] = None,
+    cursor: Optional[str] = None,
+    limite: int = 50
+) -> Tuple[List[Orden], Optional[str]]:
+    """Versión asíncrona de obtener_pagina_transacciones"""
+    query = _consulta_pagina(filtros, cursor, limite)
+    return _cortar_pagina((await db.exec(query)).all(), limite)
+
+async def contar_transacciones_async(
+    db: AsyncSession,
+    filtros: Optional[Dict[str, Any]] = None
+) -> int:
+    """Versión asíncrona de contar_transacciones"""
+    query = _aplicar_filtros(select(func.count(Orden.id)), filtros)
+    return (await db.exec(query)).one()
+
+def _consulta_transaccion_detalle(orden_id: int):
+    # Tres consultas en total (orden, ítems, productos), sin importar cuántos ítems tenga
+    return (
+        select(Orden)
+        .where(Orden.id == orden_id)
+        .options(selectinload(Orden.items).selectinload(OrdenItem.producto))
+    )
+
+def obtener_transaccion_detalle(db: Session, orden_id: int) -> Optional[Orden]:
+    """
+    Una transacción con sus ítems y productos ya cargados (sin lazy loading).
+    La usan el detalle y el PDF de la transacción.
+    """
+    return db.exec(_consulta_transaccion_detalle(orden_id)).first()
+
+async def obtener_transaccion_async(db: AsyncSession, orden_id: int) -> Optional[Orden]:
+    """Versión asíncrona de obtener_transaccion_detalle"""
+    return (await db.exec(_consulta_transaccion_detalle(orden_id))).first()
+
+COLUMNAS_ORDEN = [
+    "id", "fecha", "subtotal", "descuento", "descuento_porcentaje", "total",
+    "metodo_pago", "estado", "cierre_id"
+]
+COLUMNAS_ITEM = ["producto_id", "producto", "cantidad", "precio_unitario", "descuento"]
+
+def _filas_exportacion(db: Session, filtros: Optional[Dict[str, Any]], tamano_lote: int):
+    """
+    Recorre órdenes e ítems (una fila por ítem) con un cursor del lado del
+    servidor: solo `tamano_lote` filas en memoria a la vez. Se seleccionan
+    columnas sueltas en lugar de objetos para no llenar el identity map.
+    """
+    query = _aplicar_filtros(
+        select(
+            *(getattr(Orden, columna) for columna in COLUMNAS_ORDEN),
+            OrdenItem.producto_id, Producto.nombre, OrdenItem.cantidad,
+            OrdenItem.precio_unitario, OrdenItem.descuento
+        )
+        .select_from(Orden)
+        .outerjoin(OrdenItem, OrdenItem.orden_id == Orden.id)
+        .outerjoin(Producto, Producto.id == OrdenItem.producto_id),
+        filtros
+    ).order_by(Orden.fecha, Orden.id, OrdenItem.id)
+    resultado = db.execute(query.execution_options(yield_per=tamano_lote))
+    for lote in resultado.partitions():
+        yield lote
+
+def exportar_transacciones_csv(
+    db: Session,
+    filtros: Optional[Dict[str, Any]] = None,
+    tamano_lote: int = 1000
+) -> Iterator[str]:
+    """
+    Genera un CSV de transacciones por partes, una fila por ítem (las
+    órdenes sin ítems salen con las columnas del ítem vacías).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["orden_id"] + COLUMNAS_ORDEN[1:] + COLUMNAS_ITEM[:-1] + ["descuento_item"])
+    for lote in _filas_exportacion(db, filtros, tamano_lote):
+        writer.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # Sin filas: solo el encabezado
+        yield buffer.getvalue()
+
+def exportar_transacciones_ndjson(
+    db: Session,
+    filtros: Optional[Dict[str, Any]] = None,
+    tamano_lote: int = 1000
+) -> Iterator[str]:
+    """
+    Genera NDJSON de transacciones por partes: una línea por orden con sus
+    ítems anidados. Las filas llegan ordenadas por orden, así que basta con
+    agrupar las consecutivas.
+    """
+    actual: Optional[Dict[str, Any]] = None
+    for lote in _filas_exportacion(db, filtros, tamano_lote):
+        lineas = []
+        for fila in lote:
+            orden = dict(zip(COLUMNAS_ORDEN, fila[:len(COLUMNAS_ORDEN)]))
+            if actual is None or actual["id"] != orden["id"]:
+                if actual is not None:
+                    lineas.append(json.dumps(actual, default=str, ensure_ascii=False))
+                actual = {**orden, "fecha": orden["fecha"].isoformat() if orden["fecha"] else None, "items": []}
+            item = dict(zip(COLUMNAS_ITEM, fila[len(COLUMNAS_ORDEN):]))
+            if item["producto_id"] is not None:
+                actual["items"].append(item)
+        if lineas:
+            yield "\n".join(lineas) + "\n"
+    if actual is not None:
+        yield json.dumps(actual, default=str, ensure_ascii=False) + "\n"
+
 def obtener_transaccion_por_id(db: Session, transaccion_id: int) -> Optional[Orden]:
     """
     Obtiene una transacción por su ID.
@@ -93,6 +295,7 @@ def actualizar_estado_transaccion(
     db.add(transaccion)
     db.commit()
     db.refresh(transaccion)
+    caja_abierta.actualizar_orden(transaccion_id, estado=nuevo_estado, version=transaccion.version)
     
     return transaccion
 
@@ -149,102 +352,16 @@ def generar_pdf_transaccion(db: Session, transaccion_id: int) -> Tuple[bytes, st
     Returns:
         Tupla con (contenido_pdf, nombre_archivo)
     """
-    from sqlmodel import select
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
+    from services.pdf_service import pdf_transaccion
     
-    # Obtener la transacción con todos sus items
-    query = select(Orden).where(Orden.id == transaccion_id)
-    transaccion = db.exec(query).first()
+    # Obtener la transacción con todos sus items y productos
+    transaccion = obtener_transaccion_detalle(db, transaccion_id)
     
     if not transaccion:
         raise ValueError(f"Transacción no encontrada: {transaccion_id}")
     
-    # Crear un buffer para almacenar el PDF
-    buffer = BytesIO()
-    
-    # Crear el documento PDF
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    # Estilos para el PDF
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    subtitle_style = styles['Heading2']
-    normal_style = styles['Normal']
-    
-    # Título
-    elements.append(Paragraph(f"Factura de Venta #{transaccion.id}", title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Información de la transacción
-    elements.append(Paragraph("Información de la Transacción", subtitle_style))
-    
-    # Datos generales en formato de tabla
-    fecha_formateada = transaccion.fecha.strftime('%d/%m/%Y %H:%M')
-    data = [
-        ["ID:", str(transaccion.id)],
-        ["Fecha:", fecha_formateada],
-        ["Estado:", transaccion.estado],
-        ["Método de Pago:", transaccion.metodo_pago],
-        ["Total:", f"${transaccion.total:,.0f}"]
-    ]
-    
-    t = Table(data, colWidths=[100, 300])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('BACKGROUND', (1, 0), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(t)
-    elements.append(Spacer(1, 20))
-    
-    # Productos
-    elements.append(Paragraph("Productos", subtitle_style))
-    
-    # Cabecera de la tabla de productos
-    productos_data = [["Producto", "Cantidad", "Precio Unitario", "Subtotal"]]
-    
-    # Agregar cada producto
-    for item in transaccion.items:
-        subtotal = item.cantidad * item.precio_unitario
-        productos_data.append([
-            item.producto.nombre if hasattr(item.producto, 'nombre') else "Producto desconocido",
-            str(item.cantidad),
-            f"${item.precio_unitario:,.0f}",
-            f"${subtotal:,.0f}"
-        ])
-    
-    # Crear tabla de productos
-    productos_table = Table(productos_data, colWidths=[200, 70, 100, 100])
-    productos_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(productos_table)
-    
-    # Construir el PDF
-    doc.build(elements)
-    
-    # Obtener el contenido del buffer
-    pdf_contenido = buffer.getvalue()
-    buffer.close()
+    # El renderizado corre en el pool de procesos de services/pdf_service.py
+    pdf_contenido = pdf_transaccion(transaccion)
     
     # Nombre del archivo
     pdf_nombre = f"transaccion_{transaccion_id}_{now_santiago().strftime('%Y%m%d')}.pdf"
@@ -0,0 +1,182 @@
+# services/ventas_diarias_service.py
+
+"""
+Resumen diario de ventas (tabla VentaDiaria).
+
+Cada fila acumula las ventas aprobadas ya cerradas de un día, un producto y
+un método de pago; los ingresos descuentan el descuento por ítem y la parte
+prorrateada del descuento de la orden. El día se recalcula completo
+(DELETE + INSERT ... SELECT) cada vez que se cierra su caja, así que varios
+cierres el mismo día o un recálculo repetido dejan siempre el mismo
+resultado. Los reportes de período
+agregan estas filas en vez de recorrer todos los ítems de las órdenes.
+"""
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+import logging
+
+from sqlalchemy import Date, delete, insert, literal, or_, and_
+from sqlmodel import Session, func, select
+
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem, VentaDiaria
+from utils.timezone import day_range_santiago
+
+logger = logging.getLogger(__name__)
+
+
+def _cierres_del_dia(fecha: date):
+    """Cierres de un día; los cierres antiguos sin fecha_cierre_chile se ubican por su fecha"""
+    inicio_dia, fin_dia = day_range_santiago(fecha)
+    return select(CierreCaja.id).where(or_(
+        CierreCaja.fecha_cierre_chile == fecha,
+        and_(
+            CierreCaja.fecha_cierre_chile == None,
+            CierreCaja.fecha >= inicio_dia,
+            CierreCaja.fecha <= fin_dia,
+        ),
+    ))
+
+
+def recalcular_ventas_diarias(db: Session, fecha: date) -> int:
+    """
+    Reconstruye el resumen de un día a partir de las órdenes aprobadas de sus
+    cierres, dentro de la transacción de `db` (sin hacer commit).
+
+    Returns:
+        Cantidad de filas (producto, método de pago) del día
+    """
+    db.exec(delete(VentaDiaria).where(VentaDiaria.fecha == fecha))
+    condiciones = (Orden.cierre_id.in_(_cierres_del_dia(fecha)), Orden.estado == "aprobada")
+    linea = OrdenItem.cantidad * OrdenItem.precio_unitario
+
+    # Valor bruto de cada orden, para repartir su descuento general
+    bruto = (
+        select(OrdenItem.orden_id, func.sum(linea).label("bruto"))
+        .join(Orden, Orden.id == OrdenItem.orden_id)
+        .where(*condiciones)
+        .group_by(OrdenItem.orden_id)
+        .subquery()
+    )
+    # El descuento de la orden (modo 'total' del POS) se prorratea entre sus
+    # ítems según el valor de cada línea
+    descuento_orden = func.coalesce(
+        func.coalesce(Orden.descuento, 0.0) * linea / func.nullif(bruto.c.bruto, 0), 0.0
+    )
+    ventas = (
+        select(
+            literal(fecha, type_=Date()),
+            OrdenItem.producto_id,
+            Orden.metodo_pago,
+            func.sum(OrdenItem.cantidad),
+            func.sum(linea - func.coalesce(OrdenItem.descuento, 0.0) - descuento_orden),
+            func.sum(OrdenItem.cantidad * func.coalesce(Producto.costo, 0.0)),
+        )
+        .select_from(OrdenItem)
+        .join(Orden, Orden.id == OrdenItem.orden_id)
+        .join(bruto, bruto.c.orden_id == OrdenItem.orden_id)
+        .join(Producto, Producto.id == OrdenItem.producto_id)
+        .where(*condiciones)
+        .group_by(OrdenItem.producto_id, Orden.metodo_pago)
+    )
+    resultado = db.exec(insert(VentaDiaria).from_select(
+        ["fecha", "producto_id", "metodo_pago", "cantidad", "ingresos", "costo"], ventas
+    ))
+    return resultado.rowcount
+
+
+def reconstruir_ventas_diarias(
+    db: Session,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+) -> int:
+    """
+    Recalcula el resumen de todos los días con cierres en el rango (backfill).
+    Hace commit después de cada día para no mantener una transacción larga.
+
+    Returns:
+        Cantidad de días recalculados
+    """
+    cierres = db.exec(select(CierreCaja.fecha_cierre_chile, CierreCaja.fecha)).all()
+    dias = sorted({
+        fecha_chile or fecha.date()
+        for fecha_chile, fecha in cierres
+        if fecha_chile or fecha
+    })
+    dias = [
+        dia for dia in dias
+        if (fecha_desde is None or dia >= fecha_desde) and (fecha_hasta is None or dia <= fecha_hasta)
+    ]
+
+    for dia in dias:
+        filas = recalcular_ventas_diarias(db, dia)
+        db.commit()
+        logger.info(f"Ventas diarias {dia}: {filas} filas")
+    return len(dias)
+
+
+def _rango(query, fecha_desde: Optional[date], fecha_hasta: Optional[date]):
+    if fecha_desde:
+        query = query.where(VentaDiaria.fecha >= fecha_desde)
+    if fecha_hasta:
+        query = query.where(VentaDiaria.fecha <= fecha_hasta)
+    return query
+
+
+def ventas_por_producto(
+    db: Session,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limite: Optional[int] = 20,
+) -> List[Dict[str, Any]]:
+    """Productos más vendidos del período (por ingresos), desde el resumen diario"""
+    ingresos = func.sum(VentaDiaria.ingresos)
+    query = _rango(
+        select(
+            VentaDiaria.producto_id,
+            Producto.nombre,
+            func.sum(VentaDiaria.cantidad),
+            ingresos,
+            func.sum(VentaDiaria.costo),
+        )
+        .join(Producto, Producto.id == VentaDiaria.producto_id)
+        .group_by(VentaDiaria.producto_id, Producto.nombre)
+        .order_by(ingresos.desc()),
+        fecha_desde, fecha_hasta,
+    )
+    if limite:
+        query = query.limit(limite)
+    return [
+        {"producto_id": producto_id, "nombre": nombre, "cantidad": cantidad,
+         "ingresos": ingresos, "costo": costo, "ganancia": ingresos - costo}
+        for producto_id, nombre, cantidad, ingresos, costo in db.exec(query).all()
+    ]
+
+
+def ventas_por_categoria(
+    db: Session,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """Ventas del período agrupadas por categoría, desde el resumen diario"""
+    ingresos = func.sum(VentaDiaria.ingresos)
+    query = _rango(
+        select(
+            Categoria.nombre,
+            func.sum(VentaDiaria.cantidad),
+            ingresos,
+            func.sum(VentaDiaria.costo),
+        )
+        .select_from(VentaDiaria)
+        .join(Producto, Producto.id == VentaDiaria.producto_id)
+        .outerjoin(Categoria, Categoria.id == Producto.categoria_id)
+        .group_by(Categoria.nombre)
+        .order_by(ingresos.desc()),
+        fecha_desde, fecha_hasta,
+    )
+    return [
+        {"categoria": categoria or "Sin categoría", "cantidad": cantidad,
+         "ingresos": ingresos, "costo": costo, "ganancia": ingresos - costo}
+        for categoria, cantidad, ingresos, costo in db.exec(query).all()
+    ]
@@ -551,6 +551,53 @@ const getPerformanceMonitor = () => {
   }
 
   // Inicialización principal
+  // ===== Cola offline de ventas =====
+  const OFFLINE_QUEUE_KEY = 'pos_offline_queue';
+
+  function getOfflineQueue(){
+    try { return JSON.parse(localStorage.getItem(OFFLINE_QUEUE_KEY)) || []; } catch { return []; }
+  }
+
+  function enqueueOfflineOrder(order){
+    const queue = getOfflineQueue();
+    queue.push(order);
+    localStorage.setItem(OFFLINE_QUEUE_KEY, JSON.stringify(queue));
+  }
+
+  let syncingOffline = false;
+  async function flushOfflineQueue(){
+    const queue = getOfflineQueue();
+    if (!queue.length || syncingOffline || !navigator.onLine) return;
+    syncingOffline = true;
+    try {
+      const lote = queue.slice(0, 200);
+      const res = await fetch('/pos/orders/batch', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ordenes: lote})
+      });
+      if (!res.ok) return;
+      const data = await res.json();
+      // Se quitan de la cola todas las procesadas (creadas, repetidas o rechazadas)
+      const procesadas = new Set(data.resultados.map(r => r.idempotency_key));
+      const pendientes = getOfflineQueue().filter(o => !procesadas.has(o.idempotency_key));
+      localStorage.setItem(OFFLINE_QUEUE_KEY, JSON.stringify(pendientes));
+      const rechazadas = data.resultados.filter(r => r.estado === 'error');
+      if (rechazadas.length){
+        console.warn('Ventas offline rechazadas:', rechazadas);
+        alert(`⚠️ ${rechazadas.length} venta(s) sin conexión no se pudieron registrar:\n` + rechazadas.map(r => r.detail).join('\n'));
+      }
+      if (data.creadas) { await fetchProducts(); renderProducts(allProducts); }
+    } catch (e) {
+      console.warn('No se pudo sincronizar la cola offline:', e);
+    } finally {
+      syncingOffline = false;
+    }
+  }
+
+  window.addEventListener('online', flushOfflineQueue);
+  setInterval(flushOfflineQueue, 60000);
+
   async function init(){
     // Umbral inicial
     getUmbral();
@@ -572,6 +619,8 @@ const getPerformanceMonitor = () => {
       console.debug('[POS] Cargando productos iniciales...');
       await loadInitialProducts();
       console.debug(`[POS] Productos cargados: ${allProducts.length}`);
+      // Enviar ventas que hayan quedado pendientes sin conexión
+      flushOfflineQueue();
     } catch (e) {
       console.error('Error cargando productos', e);
       if (productsSection){
@@ -611,10 +660,29 @@ const getPerformanceMonitor = () => {
         descuento: descuentoTotal,
         descuento_porcentaje: discountMode==='total'?discountPercentage:0
       };
-      const res = await fetch('/pos/order',{method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)});
-      if (res.ok){
-        const data = await res.json();
-        alert(`✅ Orden #${data.id} registrada\nTotal: ${formatCurrency(data.total)}`);
+      // Misma clave en todos los reintentos: el servidor no duplica la venta
+      const idempotencyKey = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+      let res;
+      for (let intento = 1; ; intento++){
+        try {
+          res = await fetch('/pos/order',{method:'POST', headers:{'Content-Type':'application/json','Idempotency-Key': idempotencyKey}, body: JSON.stringify(payload)});
+          break;
+        } catch (e) {
+          if (intento >= 3) {
+            // Sin conexión: la venta queda en la cola local y se sincroniza luego
+            enqueueOfflineOrder({...payload, idempotency_key: idempotencyKey, fecha: new Date().toISOString()});
+            alert('📴 Sin conexión. La venta quedó guardada en este equipo y se enviará al reconectar.');
+            res = null;
+            break;
+          }
+          await new Promise(r=>setTimeout(r, 500*intento));
+        }
+      }
+      if (!res || res.ok){
+        if (res){
+          const data = await res.json();
+          alert(`✅ Orden #${data.id} registrada\nTotal: ${formatCurrency(data.total)}`);
+        }
         // Reset UI
         cart = []; renderCart();
         paymentSelect.disabled = true; 
@@ -626,7 +694,7 @@ const getPerformanceMonitor = () => {
         
         checkoutBtn.disabled = true;
         document.querySelectorAll('.product-btn').forEach(b=>b.disabled=false);
-        await fetchProducts(); populateCategories(); renderProducts(allProducts);
+        if (res) { await fetchProducts(); populateCategories(); renderProducts(allProducts); }
       } else {
         const err = await res.json().catch(()=>({detail:'Error en checkout'}));
         alert(`❌ ${err.detail||'Error en checkout'}`);
@@ -3,3 +3,26 @@ from dotenv import load_dotenv
 
 # Esto se ejecuta antes de cualquier test, incluyendo imports
 load_dotenv("tests/.env.test", override=True)
+
+import pytest
+from sqlalchemy import delete
+
+
+def limpiar_tablas(session, *extra):
+    """
+    Borra ventas, cierres y agregados en orden seguro para las claves
+    foráneas (hijas primero) y luego las tablas `extra` (p. ej. Producto,
+    User), que solo se referencian desde las anteriores.
+    No hace commit: queda en la transacción de `session`.
+    """
+    # Import diferido: models.order solo se importa después de models.models
+    from models.order import CierreCaja, Orden, OrdenIdempotencia, OrdenItem, VentaDiaria
+
+    for model in (VentaDiaria, OrdenIdempotencia, OrdenItem, Orden, CierreCaja) + extra:
+        session.exec(delete(model))
+
+
+@pytest.fixture
+def limpiar_db():
+    """Función para vaciar las tablas de ventas dentro de una sesión del test"""
+    return limpiar_tablas
@@ -0,0 +1,104 @@
+# tests/test_backup.py
+
+import pytest
+from sqlmodel import Session, select
+
+import scripts.backup_database as backup_database
+from db.database import engine
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem
+from scripts.backup_database import create_full_backup, read_backup_table, read_manifest
+from utils.timezone import now_santiago
+
+
+@pytest.fixture(autouse=True)
+def datos(tmp_path, monkeypatch, limpiar_db):
+    monkeypatch.setattr(backup_database, "BACKUP_DIR", str(tmp_path))
+    monkeypatch.setattr(backup_database, "BATCH_SIZE", 2)
+    with Session(engine) as session:
+        limpiar_db(session)
+        if not session.get(Categoria, 1):
+            session.add(Categoria(id=1, nombre="Categoría Test"))
+        if not session.get(Producto, 1):
+            session.add(Producto(id=1, nombre="Pan", precio=50, cantidad=10, categoria_id=1))
+        cierre = CierreCaja(total_ventas=300)
+        session.add(cierre)
+        session.flush()
+        for i in range(5):
+            orden = Orden(fecha=now_santiago(), total=100, subtotal=100, metodo_pago="efectivo",
+                          cierre_id=cierre.id if i < 3 else None)
+            session.add(orden)
+            session.flush()
+            session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=1, precio_unitario=100))
+        session.commit()
+    yield
+
+
+def test_backup_completo_en_lotes_con_checksum():
+    archive, total = create_full_backup()
+    manifest = read_manifest(archive)
+
+    assert manifest["mode"] == "full"
+    assert manifest["tables"]["transacciones"]["records"] == 5
+    assert manifest["tables"]["transaccion_items"]["records"] == 5
+    assert total == sum(t["records"] for t in manifest["tables"].values())
+
+    ordenes = list(read_backup_table(archive, "transacciones", manifest))
+    assert [o["total"] for o in ordenes] == [100] * 5
+    assert ordenes[0]["fecha"]
+
+    # Un manifiesto alterado se detecta al terminar de leer
+    manifest["tables"]["transacciones"]["sha256"] = "0" * 64
+    with pytest.raises(ValueError):
+        list(read_backup_table(archive, "transacciones", manifest))
+
+
+def test_backup_incremental_solo_filas_nuevas_o_abiertas():
+    create_full_backup()
+    with Session(engine) as session:
+        orden = Orden(fecha=now_santiago(), total=700, subtotal=700, metodo_pago="debito")
+        session.add(orden)
+        session.flush()
+        session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=7, precio_unitario=100))
+        session.commit()
+
+    archive, _ = create_full_backup(incremental=True)
+    manifest = read_manifest(archive)
+
+    assert manifest["mode"] == "incremental"
+    assert manifest["base"]
+    # La nueva más las dos que siguen sin cierre
+    assert manifest["tables"]["transacciones"]["records"] == 3
+    items = list(read_backup_table(archive, "transaccion_items", manifest))
+    assert [i["cantidad"] for i in items] == [7]
+    # Las tablas pequeñas van completas
+    assert manifest["tables"]["productos"]["mode"] == "full"
+
+
+def test_backup_incremental_incluye_ediciones_de_cierres_anteriores():
+    create_full_backup()
+    with Session(engine) as session:
+        cerrada = session.exec(select(Orden).where(Orden.cierre_id != None)).first()
+        cerrada.estado = "anulada"
+        session.add(cerrada)
+        cierre = session.get(CierreCaja, cerrada.cierre_id)
+        cierre.notas = "Corregido"
+        session.add(cierre)
+        session.commit()
+        cerrada_id, cierre_id = cerrada.id, cierre.id
+
+    archive, _ = create_full_backup(incremental=True)
+    manifest = read_manifest(archive)
+
+    # Las tres del cierre editado; las abiertas no cambiaron
+    ordenes = list(read_backup_table(archive, "transacciones", manifest))
+    assert len(ordenes) == 3 and all(o["cierre_id"] == cierre_id for o in ordenes)
+    assert next(o for o in ordenes if o["id"] == cerrada_id)["estado"] == "anulada"
+    cierres = list(read_backup_table(archive, "cierres_caja", manifest))
+    assert [c["notas"] for c in cierres] == ["Corregido"]
+
+    # Sin cambios, el siguiente incremental no repite nada
+    archive, _ = create_full_backup(incremental=True)
+    manifest = read_manifest(archive)
+    assert manifest["tables"]["transacciones"]["records"] == 0
+    assert manifest["tables"]["cierres_caja"]["records"] == 0
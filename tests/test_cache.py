@@ -0,0 +1,169 @@
+# tests/test_cache.py
+
+import time
+
+import pytest
+from sqlmodel import Session
+
+from db.database import engine
+from schemas.producto import ProductoSnapshot
+from utils.cache import SimpleCache, cached, clear_cache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = SimpleCache(max_entries=2, policy="lru", sweep_interval=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")          # "b" queda como la menos reciente
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lfu_evicts_least_frequently_used():
+    cache = SimpleCache(max_entries=2, policy="lfu", sweep_interval=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+
+def test_lfu_por_buckets_empata_por_antiguedad():
+    cache = SimpleCache(max_entries=3, policy="lfu", sweep_interval=0)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    cache.get("a")
+    cache.get("c")
+    cache.get("c")
+    cache.set("d", "d")     # "b" no tiene hits
+    cache.get("d")
+    cache.set("e", "e")     # "a" y "d" con un hit: sale "a", la menos reciente
+
+    assert cache.get("b") is None and cache.get("a") is None
+    assert [cache.get(k) for k in ("c", "d", "e")] == ["c", "d", "e"]
+    assert cache.stats()["evictions"] == 2
+
+    # Sobrescribir y borrar mantiene los buckets consistentes
+    cache.set("c", "C")
+    cache.invalidate_pattern("d")
+    cache.set("f", "f")
+    cache.set("g", "g")
+    assert cache.stats()["total_entries"] == 3
+    assert cache.get("e") == "e"
+
+
+def test_tamano_se_calcula_una_vez_al_guardar(monkeypatch):
+    import utils.cache as cache_module
+
+    medidos = []
+    estimar = cache_module._estimate_size
+    monkeypatch.setattr(cache_module, "_estimate_size", lambda obj, *a: medidos.append(obj) or estimar(obj, *a))
+    cache = SimpleCache(max_bytes=10_000, sweep_interval=0)
+    cache.set("respuesta", b"x" * 500, size=500)
+    cache.get("respuesta")
+
+    # Solo se mide la clave: el tamaño del valor lo entrega quien guarda
+    assert medidos == ["respuesta"]
+    assert cache.stats()["approx_bytes"] == estimar("respuesta") + 500
+
+
+def test_listas_largas_se_estiman_por_muestra(monkeypatch):
+    import utils.cache as cache_module
+
+    filas = [{"id": i, "nombre": f"Producto {i}"} for i in range(cache_module.SIZE_SAMPLE * 10)]
+    estimado = cache_module._estimate_size(filas)
+    monkeypatch.setattr(cache_module, "SIZE_SAMPLE", len(filas))
+    exacto = cache_module._estimate_size(filas)
+    assert abs(estimado - exacto) < exacto * 0.1
+
+
+def test_byte_budget_and_stats():
+    cache = SimpleCache(max_entries=None, max_bytes=2000, sweep_interval=0)
+    for i in range(20):
+        cache.set(f"k{i}", "x" * 200)
+
+    stats = cache.stats()
+    assert stats["approx_bytes"] <= 2000
+    assert stats["evictions"] > 0
+    assert cache.get("k19") is not None
+    assert cache.get("k0") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_sweep_removes_expired_entries():
+    cache = SimpleCache(sweep_interval=0)
+    cache.set("a", 1, ttl=1)
+    cache.cache["a"]["expires"] = time.time() - 1
+
+    assert cache.sweep() == 1
+    assert cache.stats()["total_entries"] == 0
+    assert cache.stats()["approx_bytes"] == 0
+
+
+def test_cached_guarda_snapshots_inmutables():
+    llamadas = []
+
+    class _Fila:
+        id, nombre, precio, costo, margen = 1, "Pan", 100, None, None
+        cantidad, umbral_stock, codigo_barra = None, 5, None
+        categoria_id, categoria = None, None
+
+    @cached(ttl=60, cache_key_prefix="test_snap",
+            snapshot=lambda filas: tuple(ProductoSnapshot.from_producto(f) for f in filas))
+    def _listar(session):
+        llamadas.append(1)
+        return [_Fila()]
+
+    clear_cache()
+    # La sesión posicional no debe formar parte de la clave
+    with Session(engine) as s1, Session(engine) as s2:
+        primero = _listar(s1)
+        segundo = _listar(s2)
+
+    assert len(llamadas) == 1
+    assert primero is segundo
+    assert isinstance(primero[0], ProductoSnapshot)
+    assert primero[0].cantidad == 0
+    with pytest.raises(AttributeError):
+        primero[0].cantidad = 3
+
+
+def test_namespace_invalida_en_o1_y_tags_solo_lo_afectado():
+    cache = SimpleCache(sweep_interval=0)
+    k_todos = cache.namespaced_key("catalogo", "todos")
+    cache.set(k_todos, "todos", tags=["producto:1", "producto:2"])
+    cache.set(cache.namespaced_key("catalogo", "pan"), "pan", tags=["producto:1"])
+    cache.set(cache.namespaced_key("catalogo", "leche"), "leche", tags=["producto:2"])
+
+    # Un cambio de stock en el producto 1 no toca la búsqueda "leche"
+    assert cache.invalidate_tags(["producto:1"]) == 2
+    assert cache.get(cache.namespaced_key("catalogo", "leche")) == "leche"
+    assert cache.get(k_todos) is None
+
+    # Un cambio estructural deja inalcanzable todo el namespace
+    cache.invalidate_namespace("catalogo")
+    assert cache.get(cache.namespaced_key("catalogo", "leche")) is None
+    assert cache.stats()["namespaces"] == {"catalogo": 1}
+
+
+def test_admin_invalida_por_generacion_solo_namespaces_conocidos():
+    from routers.admin import invalidate_cache_pattern
+    from utils.cache import CATALOG_NAMESPACE, app_cache
+
+    generacion = app_cache.generation(CATALOG_NAMESPACE)
+    invalidate_cache_pattern(CATALOG_NAMESPACE, current_user=None)
+    assert app_cache.generation(CATALOG_NAMESPACE) == generacion + 1
+
+    # Cualquier otro patrón se elimina por búsqueda, sin crear un namespace
+    app_cache.set("reporte_ventas_1", "x")
+    invalidate_cache_pattern("reporte_ventas", current_user=None)
+    assert app_cache.get("reporte_ventas_1") is None
+    assert "reporte_ventas" not in app_cache.stats()["namespaces"]
@@ -0,0 +1,220 @@
+# tests/test_cierre_caja.py
+
+import pytest
+from sqlmodel import Session, select
+
+from db.database import engine
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem, VentaDiaria
+from services.caja_abierta import TotalesCajaAbierta
+from services.cierre_caja_service import (
+    calcular_margenes_cierre,
+    calcular_totales_dia,
+    realizar_cierre_caja,
+)
+from services.ventas_diarias_service import (
+    reconstruir_ventas_diarias,
+    ventas_por_categoria,
+    ventas_por_producto,
+)
+from utils.timezone import now_santiago, today_santiago
+
+
+@pytest.fixture(autouse=True)
+def db_vacia(limpiar_db):
+    with Session(engine) as session:
+        limpiar_db(session, Producto)
+        session.commit()
+
+
+def _preparar(session: Session):
+    if not session.get(Categoria, 1):
+        session.add(Categoria(id=1, nombre="Categoría Test"))
+    session.add(Producto(id=1, nombre="Pan", precio=1000, costo=600, cantidad=50, categoria_id=1))
+    session.add(Producto(id=2, nombre="Leche", precio=500, costo=None, cantidad=50, categoria_id=1))
+    session.commit()
+
+    ventas = [
+        ("efectivo", "aprobada", 2000, [(1, 2)]),
+        ("debito", "aprobada", 1500, [(1, 1), (2, 1)]),
+        ("efectivo", "anulada", 1000, [(1, 1)]),
+        ("credito", "reembolsada", 500, [(2, 1)]),
+    ]
+    for metodo, estado, total, items in ventas:
+        orden = Orden(fecha=now_santiago(), total=total, subtotal=total, metodo_pago=metodo, estado=estado)
+        session.add(orden)
+        session.flush()
+        for producto_id, cantidad in items:
+            session.add(OrdenItem(orden_id=orden.id, producto_id=producto_id, cantidad=cantidad, precio_unitario=0))
+    session.commit()
+
+
+def test_totales_dia_agregados_en_sql():
+    with Session(engine) as session:
+        _preparar(session)
+        totales = calcular_totales_dia(session)
+
+    assert totales["efectivo"] == 2000
+    assert totales["debito"] == 1500
+    assert totales["credito"] == 0
+    assert totales["aprobadas"] == 3500
+    assert totales["anuladas"] == 1000
+    assert totales["reembolsadas"] == 500
+    # Solo órdenes aprobadas y productos con costo: 3 panes x 600
+    assert totales["costo"] == 1800
+    assert totales["ganancia"] == 1700
+
+
+def test_margenes_de_cierre_existente():
+    with Session(engine) as session:
+        _preparar(session)
+        cierre = CierreCaja(total_ventas=3500)
+        session.add(cierre)
+        session.commit()
+        for orden in session.exec(select(Orden)).all():
+            orden.cierre_id = cierre.id
+        session.commit()
+
+        assert calcular_margenes_cierre(session, cierre.id)
+        session.refresh(cierre)
+        assert cierre.total_costo == 1800
+        assert round(cierre.margen_promedio, 2) == round(1700 / 3500 * 100, 2)
+
+
+def test_cierre_asocia_ordenes_en_una_transaccion():
+    with Session(engine) as session:
+        _preparar(session)
+        cierre, asociadas = realizar_cierre_caja(session)
+
+        assert asociadas == 4
+        assert cierre.cantidad_transacciones == 4
+        assert cierre.total_ventas == 3500
+        assert cierre.total_costo == 1800
+        assert all(o.cierre_id == cierre.id for o in session.exec(select(Orden)).all())
+
+        # Sin órdenes pendientes no se crea un cierre vacío
+        with pytest.raises(ValueError):
+            realizar_cierre_caja(session)
+        assert len(session.exec(select(CierreCaja)).all()) == 1
+
+
+def _sin_reconstruir(*args):
+    raise AssertionError("se esperaba usar el resumen incremental")
+
+
+def test_caja_abierta_incremental_coincide_con_recalculo():
+    caja = TotalesCajaAbierta(max_age=3600)
+    with Session(engine) as session:
+        _preparar(session)
+        totales, contador = caja.resumen(session)
+        assert totales == calcular_totales_dia(session)
+        assert contador == {"aprobadas": 2, "anuladas": 1, "reembolsadas": 1, "total": 4}
+
+        # Anular la venta en débito y registrar una nueva sin volver a consultar
+        orden = session.exec(select(Orden).where(Orden.metodo_pago == "debito")).one()
+        orden.estado = "anulada"
+        nueva = Orden(fecha=now_santiago(), total=700, subtotal=700, metodo_pago="credito")
+        session.add_all([orden, nueva])
+        session.commit()
+        session.refresh(nueva)
+        caja.actualizar_orden(orden.id, estado="anulada", version=orden.version)
+        caja.registrar_orden(nueva, costo=100)
+
+        # La marca de la base coincide: no hace falta reconstruir
+        caja.reconcile = _sin_reconstruir
+        totales, contador = caja.resumen(session)
+        assert totales["debito"] == 0
+        assert totales["credito"] == 700
+        assert totales["anuladas"] == 2500
+        assert totales["costo"] == 1300
+        assert contador["total"] == 5
+
+
+def test_caja_abierta_detecta_cambios_de_otro_worker():
+    caja = TotalesCajaAbierta(max_age=3600)
+    with Session(engine) as session:
+        _preparar(session)
+        caja.resumen(session)
+
+        # Otro worker anula una venta y cambia el método de pago de otra
+        # sin pasar por este resumen: la cantidad de órdenes no cambia
+        efectivo = session.exec(
+            select(Orden).where(Orden.metodo_pago == "efectivo", Orden.estado == "aprobada")
+        ).one()
+        efectivo.estado = "anulada"
+        debito = session.exec(select(Orden).where(Orden.metodo_pago == "debito")).one()
+        debito.metodo_pago = "transferencia"
+        session.add_all([efectivo, debito])
+        session.commit()
+
+        totales, contador = caja.resumen(session)
+        assert totales == calcular_totales_dia(session)
+        assert totales["efectivo"] == 0 and totales["transferencia"] == 1500
+        assert contador["anuladas"] == 2
+
+
+def test_cierre_llena_resumen_diario_y_backfill_es_idempotente():
+    with Session(engine) as session:
+        _preparar(session)
+        realizar_cierre_caja(session)
+
+        filas = {(v.producto_id, v.metodo_pago): v for v in session.exec(select(VentaDiaria)).all()}
+        # Solo órdenes aprobadas: 2 panes en efectivo, 1 pan y 1 leche en débito
+        assert set(filas) == {(1, "efectivo"), (1, "debito"), (2, "debito")}
+        assert filas[(1, "efectivo")].cantidad == 2
+        assert filas[(1, "efectivo")].costo == 1200
+        assert all(v.fecha == today_santiago() for v in filas.values())
+
+        antes = ventas_por_producto(session)
+        assert reconstruir_ventas_diarias(session) == 1
+        assert ventas_por_producto(session) == antes
+        assert antes[0]["nombre"] == "Pan" and antes[0]["cantidad"] == 3
+
+        categorias = ventas_por_categoria(session, today_santiago(), today_santiago())
+        assert [c["cantidad"] for c in categorias] == [4]
+        assert categorias[0]["costo"] == 1800
+
+
+def test_vista_cierre_lista_solo_las_mas_recientes(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import routers.transacciones as transacciones
+    from main import app
+
+    monkeypatch.setattr(transacciones, "LIMITE_CIERRE", 2)
+    with Session(engine) as session:
+        _preparar(session)
+    respuesta = TestClient(app).get("/transacciones/cierre-caja")
+    assert respuesta.status_code == 200
+    assert "Mostrando las 2 transacciones más recientes de 4" in respuesta.text
+
+
+def test_descuento_de_la_orden_se_prorratea_en_ventas_diarias():
+    """Con el descuento general del POS (modo 'total') Σ ingresos == total_ventas del cierre"""
+    with Session(engine) as session:
+        if not session.get(Categoria, 1):
+            session.add(Categoria(id=1, nombre="Categoría Test"))
+        session.add(Producto(id=1, nombre="Pan", precio=1000, costo=600, cantidad=50, categoria_id=1))
+        session.add(Producto(id=2, nombre="Leche", precio=500, costo=300, cantidad=50, categoria_id=1))
+        session.commit()
+
+        # 2 panes y 1 leche con 10% de descuento general; 1 pan sin descuento
+        ventas = [("efectivo", 250, [(1, 2, 1000), (2, 1, 500)]), ("debito", 0, [(1, 1, 1000)])]
+        for metodo, descuento, items in ventas:
+            subtotal = sum(cantidad * precio for _, cantidad, precio in items)
+            orden = Orden(fecha=now_santiago(), subtotal=subtotal, descuento=descuento,
+                          total=subtotal - descuento, metodo_pago=metodo)
+            session.add(orden)
+            session.flush()
+            for producto_id, cantidad, precio in items:
+                session.add(OrdenItem(orden_id=orden.id, producto_id=producto_id, cantidad=cantidad,
+                                      precio_unitario=precio))
+        session.commit()
+
+        cierre, _ = realizar_cierre_caja(session)
+        filas = {(v.producto_id, v.metodo_pago): v.ingresos for v in session.exec(select(VentaDiaria)).all()}
+
+    assert sum(filas.values()) == pytest.approx(cierre.total_ventas) == 3250
+    assert filas[(1, "efectivo")] == pytest.approx(1800)
+    assert filas[(2, "efectivo")] == pytest.approx(450)
+    assert filas[(1, "debito")] == pytest.approx(1000)
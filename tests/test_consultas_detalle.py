@@ -0,0 +1,115 @@
+# tests/test_consultas_detalle.py
+
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+from core.config import settings
+from db.async_database import get_async_engine
+from db.database import engine
+from main import app
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem
+from services.cierre_caja_service import obtener_cierre_detalle
+from services.pdf_service import generar_pdf_cierre
+from services.transacciones_service import generar_pdf_transaccion, obtener_transaccion_detalle
+from utils.timezone import now_santiago
+
+client = TestClient(app)
+
+ORDENES = 5
+ITEMS_POR_ORDEN = 4
+
+
+@contextmanager
+def contar_consultas(motor=engine):
+    """Cuenta las sentencias que llegan a la base de datos"""
+    consultas = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(motor, "before_cursor_execute", registrar)
+    try:
+        yield consultas
+    finally:
+        event.remove(motor, "before_cursor_execute", registrar)
+
+
+@pytest.fixture
+def cierre_id(tmp_path, monkeypatch, limpiar_db):
+    """Un cierre con varias órdenes, cada una con ítems de productos distintos"""
+    monkeypatch.setattr(settings, "PDF_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PDF_WORKERS", 0)
+    with Session(engine) as session:
+        limpiar_db(session)
+        if not session.get(Categoria, 1):
+            session.add(Categoria(id=1, nombre="Categoría Test"))
+        for producto_id in range(101, 101 + ITEMS_POR_ORDEN):
+            if not session.get(Producto, producto_id):
+                session.add(Producto(id=producto_id, nombre=f"Producto {producto_id}", precio=10,
+                                     cantidad=100, categoria_id=1))
+        cierre = CierreCaja(cantidad_transacciones=ORDENES)
+        session.add(cierre)
+        session.flush()
+        for _ in range(ORDENES):
+            orden = Orden(fecha=now_santiago(), total=40, metodo_pago="efectivo", cierre_id=cierre.id)
+            session.add(orden)
+            session.flush()
+            for producto_id in range(101, 101 + ITEMS_POR_ORDEN):
+                session.add(OrdenItem(orden_id=orden.id, producto_id=producto_id, cantidad=1, precio_unitario=10))
+        session.commit()
+        yield cierre.id
+
+
+def _primera_orden(cierre_id):
+    with Session(engine) as session:
+        return obtener_cierre_detalle(session, cierre_id).ordenes[0].id
+
+
+def test_detalle_de_transaccion_en_tres_consultas(cierre_id):
+    orden_id = _primera_orden(cierre_id)
+    with Session(engine) as session, contar_consultas() as consultas:
+        orden = obtener_transaccion_detalle(session, orden_id)
+        nombres = [item.producto.nombre for item in orden.items]
+    assert len(nombres) == ITEMS_POR_ORDEN
+    assert len(consultas) == 3
+
+
+def test_detalle_de_cierre_con_items_sin_n_mas_uno(cierre_id):
+    with Session(engine) as session, contar_consultas() as consultas:
+        cierre = obtener_cierre_detalle(session, cierre_id, con_items=True)
+        nombres = [item.producto.nombre for orden in cierre.ordenes for item in orden.items]
+    assert len(nombres) == ORDENES * ITEMS_POR_ORDEN
+    # Cierre, órdenes, ítems y productos
+    assert len(consultas) == 4
+
+
+def test_pdfs_en_numero_fijo_de_consultas(cierre_id):
+    orden_id = _primera_orden(cierre_id)
+    with Session(engine) as session, contar_consultas() as consultas:
+        generar_pdf_transaccion(session, orden_id)
+    assert len(consultas) == 3
+
+    with Session(engine) as session, contar_consultas() as consultas:
+        generar_pdf_cierre(session, cierre_id)
+    assert len(consultas) == 2
+
+
+def test_vistas_de_detalle_en_numero_fijo_de_consultas(cierre_id):
+    orden_id = _primera_orden(cierre_id)
+    motor_async = get_async_engine().sync_engine
+
+    with contar_consultas(motor_async) as consultas:
+        respuesta = client.get(f"/transacciones/cierres/{cierre_id}")
+    assert respuesta.status_code == 200
+    assert len(consultas) == 2
+
+    with contar_consultas(motor_async) as consultas:
+        respuesta = client.get(f"/transacciones/{orden_id}")
+    assert respuesta.status_code == 200
+    assert "Producto 101" in respuesta.text
+    assert len(consultas) == 3
@@ -0,0 +1,10 @@
+# tests/test_import_time.py
+
+from scripts.profile_import_time import modulos_pesados, perfil_importacion
+
+
+def test_arranque_no_importa_dependencias_pesadas():
+    perfil = perfil_importacion("main")
+    assert perfil["total_ms"] > 0
+    assert "routers.images" in perfil["modulos"]
+    assert modulos_pesados(perfil) == []
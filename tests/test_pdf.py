@@ -0,0 +1,164 @@
+# tests/test_pdf.py
+
+import io
+import json
+import os
+import zipfile
+
+import pytest
+from sqlmodel import Session, select
+
+from core.config import settings
+from db.database import engine
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem
+from services import pdf_service
+from services.pdf_service import (
+    cerrar_pool, documentos_cierres, generar_pdf_cierre, renderizar, renderizar_lote, snapshot_cierre
+)
+from services.transacciones_service import generar_pdf_transaccion
+from utils.timezone import now_santiago
+
+
+@pytest.fixture
+def cache_pdf(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PDF_WORKERS", 0)
+    return tmp_path
+
+
+@pytest.fixture
+def cierre_id(limpiar_db):
+    """Un cierre con dos ventas y una venta de la caja abierta"""
+    with Session(engine) as session:
+        limpiar_db(session)
+        if not session.get(Categoria, 1):
+            session.add(Categoria(id=1, nombre="Categoría Test"))
+        if not session.get(Producto, 1):
+            session.add(Producto(id=1, nombre="Pan", precio=50, cantidad=10, categoria_id=1))
+        cierre = CierreCaja(total_ventas=300, total_efectivo=300, cantidad_transacciones=2,
+                            ticket_promedio=150, usuario_nombre="admin", notas="Sin novedad")
+        session.add(cierre)
+        session.flush()
+        for total, cierre_orden in ((100, cierre.id), (200, cierre.id), (50, None)):
+            orden = Orden(fecha=now_santiago(), total=total, subtotal=total,
+                          metodo_pago="efectivo", cierre_id=cierre_orden)
+            session.add(orden)
+            session.flush()
+            session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=2, precio_unitario=total / 2))
+        session.commit()
+        yield cierre.id
+
+
+def _pdf_cierre(cierre_id):
+    with Session(engine) as session:
+        return generar_pdf_cierre(session, cierre_id)
+
+
+def _sin_renderizar(*args):
+    raise AssertionError("se esperaba leer el PDF desde la cache")
+
+
+def test_pdf_cierre_se_guarda_y_se_lee_desde_disco(cache_pdf, cierre_id, monkeypatch):
+    contenido, nombre = _pdf_cierre(cierre_id)
+    assert contenido.startswith(b"%PDF")
+    assert nombre.startswith(f"cierre_caja_{cierre_id}_")
+    archivos = os.listdir(cache_pdf)
+    assert len(archivos) == 1 and archivos[0].startswith(f"cierre_{cierre_id}_")
+
+    monkeypatch.setattr(pdf_service, "renderizar", _sin_renderizar)
+    assert _pdf_cierre(cierre_id)[0] == contenido
+
+
+def test_pdf_cierre_se_regenera_si_cambian_los_datos(cache_pdf, cierre_id):
+    _pdf_cierre(cierre_id)
+    anterior = os.listdir(cache_pdf)
+
+    with Session(engine) as session:
+        orden = session.exec(select(Orden).where(Orden.cierre_id == cierre_id)).first()
+        orden.estado = "anulada"
+        session.add(orden)
+        session.commit()
+
+    _pdf_cierre(cierre_id)
+    actual = os.listdir(cache_pdf)
+    assert len(actual) == 1 and actual != anterior
+
+
+def test_pdf_transaccion_solo_se_guarda_con_caja_cerrada(cache_pdf, cierre_id):
+    with Session(engine) as session:
+        cerrada = session.exec(select(Orden).where(Orden.cierre_id == cierre_id)).first().id
+        abierta = session.exec(select(Orden).where(Orden.cierre_id == None)).first().id
+
+        assert generar_pdf_transaccion(session, abierta)[0].startswith(b"%PDF")
+        assert os.listdir(cache_pdf) == []
+        assert generar_pdf_transaccion(session, cerrada)[0].startswith(b"%PDF")
+        assert [a.split("_")[:2] for a in os.listdir(cache_pdf)] == [["transaccion", str(cerrada)]]
+
+
+def test_snapshot_sin_objetos_orm_se_renderiza_en_el_pool(cierre_id, monkeypatch):
+    with Session(engine) as session:
+        cierre = session.get(CierreCaja, cierre_id)
+        snapshot = snapshot_cierre(cierre, cierre.ordenes)
+    # Solo tipos simples: se puede serializar y enviar a otro proceso
+    assert json.loads(json.dumps(snapshot)) == snapshot
+
+    monkeypatch.setattr(settings, "PDF_WORKERS", 1)
+    try:
+        assert renderizar("cierre", snapshot).startswith(b"%PDF")
+    finally:
+        cerrar_pool()
+
+
+def test_exportar_cierres_zip_con_transacciones(cache_pdf, cierre_id):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    hoy = now_santiago().strftime("%Y-%m-%d")
+    respuesta = TestClient(app).get(
+        "/transacciones/cierres/exportar", params={"desde": hoy, "hasta": hoy, "transacciones": True}
+    )
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"] == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(respuesta.content)) as archivo_zip:
+        nombres = archivo_zip.namelist()
+        assert all(archivo_zip.read(n).startswith(b"%PDF") for n in nombres)
+    # El cierre y sus dos transacciones; la venta de la caja abierta queda fuera
+    assert len(nombres) == 3
+    assert nombres[0].startswith(f"cierre_caja_{cierre_id}_")
+    assert all(n.startswith(nombres[0][:-4] + "/transaccion_") for n in nombres[1:])
+    assert len(os.listdir(cache_pdf)) == 3
+
+
+def test_exportar_cierres_fechas_invalidas():
+    from fastapi import HTTPException
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+    # El manejador global vuelve a lanzar los HTTPException que no son 401/403
+    for params in ({"desde": "x", "hasta": "2024-01-01"}, {"desde": "2024-02-01", "hasta": "2024-01-01"}):
+        with pytest.raises(HTTPException) as error:
+            client.get("/transacciones/cierres/exportar", params=params)
+        assert error.value.status_code == 400
+
+
+def test_lote_en_pool_construye_estilos_una_vez_por_worker(cierre_id, cache_pdf, monkeypatch):
+    with Session(engine) as session:
+        documentos = documentos_cierres(session, incluir_transacciones=True)
+
+    monkeypatch.setattr(settings, "PDF_WORKERS", 2)
+    try:
+        pdfs = list(renderizar_lote(documentos))
+        estilos = pdf_service._get_pool().map(_estilos_del_worker, range(4))
+    finally:
+        cerrar_pool()
+    assert [nombre for nombre, _ in pdfs] == [d["nombre"] for d in documentos]
+    assert all(contenido.startswith(b"%PDF") for _, contenido in pdfs)
+    assert all(misses == 1 for misses in estilos)
+
+
+def _estilos_del_worker(_):
+    from services.pdf_render import _estilos
+    return _estilos.cache_info().misses
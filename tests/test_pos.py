@@ -3,23 +3,20 @@ from fastapi.testclient import TestClient
 from main import app
 from db.dependencies import get_session
 from models.models import Producto
-from models.order import Orden, OrdenItem
+from models.order import Orden, OrdenIdempotencia, OrdenItem
 from models.user import User
-from sqlalchemy import delete, text
-from sqlmodel import Session
+from sqlalchemy import text
+from sqlmodel import Session, select
 from passlib.hash import bcrypt
 
 client = TestClient(app)
 
 @pytest.fixture(autouse=True)
-def setup_db():
+def setup_db(limpiar_db):
     session = next(get_session())
-    # Limpieza de tablas usando la API delete()
+    # Limpieza de tablas en orden seguro para las claves foráneas (conftest)
     try:
-        session.exec(delete(OrdenItem))
-        session.exec(delete(Orden))
-        session.exec(delete(Producto))
-        session.exec(delete(User))
+        limpiar_db(session, Producto, User)
         session.commit()
     except Exception as e:
         print(f"Error al limpiar datos: {e}")
@@ -88,4 +85,114 @@ def test_crear_orden_stock_insuficiente():
     except Exception as e:
         # Si hay excepción, verificamos que es la esperada
         print(f"Excepción capturada: {type(e).__name__}: {str(e)}")
-        assert "400: Stock insuficiente" in str(e)
\ No newline at end of file
+        assert "400: Stock insuficiente" in str(e)
+def test_orden_con_stock_insuficiente_no_descuenta_nada():
+    session = next(get_session())
+    session.add(Producto(id=2, nombre="Té Test", precio=500, cantidad=1, categoria_id=1))
+    session.commit()
+
+    # El producto 1 tiene stock, el 2 no: la orden completa debe fallar
+    payload = {
+        "items": [{"producto_id": 1, "cantidad": 3}, {"producto_id": 2, "cantidad": 2}],
+        "metodo_pago": "efectivo"
+    }
+    try:
+        res = client.post("/pos/order", json=payload)
+        assert res.status_code == 400
+    except Exception as e:
+        # El middleware de rendimiento puede relanzar la HTTPException
+        assert "400: Stock insuficiente" in str(e)
+
+    session.expire_all()
+    assert session.get(Producto, 1).cantidad == 10
+    assert session.get(Producto, 2).cantidad == 1
+    assert session.exec(select(Orden)).first() is None
+
+def test_orden_agrupa_lineas_del_mismo_producto():
+    payload = {
+        "items": [{"producto_id": 1, "cantidad": 4}, {"producto_id": 1, "cantidad": 3, "descuento": 100}],
+        "metodo_pago": "efectivo"
+    }
+    res = client.post("/pos/order", json=payload)
+    assert res.status_code == 201
+    assert res.json()["total"] == 7000
+
+    session = next(get_session())
+    assert session.get(Producto, 1).cantidad == 3
+    items = session.exec(select(OrdenItem).where(OrdenItem.orden_id == res.json()["id"])).all()
+    assert sorted(i.cantidad for i in items) == [3, 4]
+
+def test_orden_idempotente_no_se_duplica():
+    payload = {"items": [{"producto_id": 1, "cantidad": 2}], "metodo_pago": "efectivo"}
+    headers = {"Idempotency-Key": "terminal-1-venta-42"}
+
+    primera = client.post("/pos/order", json=payload, headers=headers)
+    reintento = client.post("/pos/order", json=payload, headers=headers)
+
+    assert primera.status_code == 201
+    assert reintento.status_code == 201
+    assert reintento.headers["idempotent-replayed"] == "true"
+    assert reintento.json() == primera.json()
+
+    session = next(get_session())
+    assert session.get(Producto, 1).cantidad == 8
+    assert len(session.exec(select(Orden)).all()) == 1
+
+def test_lote_offline_resultado_por_orden():
+    ordenes = [
+        # Llega primero pero ocurrió después: se procesa al final y ya no hay stock
+        {"idempotency_key": "t1-3", "fecha": "2026-01-10T12:05:00-03:00",
+         "items": [{"producto_id": 1, "cantidad": 5}], "metodo_pago": "efectivo"},
+        {"idempotency_key": "t1-1", "fecha": "2026-01-10T12:00:00-03:00",
+         "items": [{"producto_id": 1, "cantidad": 4}], "metodo_pago": "efectivo"},
+        {"idempotency_key": "t1-2", "fecha": "2026-01-10T12:01:00-03:00",
+         "items": [{"producto_id": 1, "cantidad": 3}], "metodo_pago": "debito"},
+    ]
+    res = client.post("/pos/orders/batch", json={"ordenes": ordenes})
+    assert res.status_code == 200
+    body = res.json()
+    assert [r["estado"] for r in body["resultados"]] == ["error", "creada", "creada"]
+    assert body["resultados"][0]["status_code"] == 400
+    assert body["resultados"][1]["orden"]["fecha"].startswith("2026-01-10T12:00")
+
+    # Reenviar el lote no duplica ventas
+    again = client.post("/pos/orders/batch", json={"ordenes": ordenes[1:]}).json()
+    assert again["repetidas"] == 2 and again["creadas"] == 0
+
+    session = next(get_session())
+    assert session.get(Producto, 1).cantidad == 3
+    assert len(session.exec(select(Orden)).all()) == 2
+
+def test_lote_offline_clave_confirmada_por_otra_solicitud(monkeypatch):
+    """Si otra solicitud confirma la misma clave mientras se procesa el lote, se reporta como repetida"""
+    import services.pos_order_service as pos_order_service
+    from db.database import engine
+
+    payload = {"items": [{"producto_id": 1, "cantidad": 2}], "metodo_pago": "efectivo"}
+    cargar_precios = pos_order_service.cargar_precios
+
+    def concurrente(session, ids):
+        # La otra solicitud gana entre la lectura de claves y el INSERT del lote
+        with Session(engine) as otra:
+            orden = Orden(total=2000, metodo_pago="efectivo")
+            otra.add(orden)
+            otra.flush()
+            otra.add(OrdenIdempotencia(
+                key="t2-1", orden_id=orden.id, status_code=201, response={"id": orden.id},
+                request_hash=pos_order_service.huella_solicitud(
+                    pos_order_service.OrdenOffline(idempotency_key="t2-1", **payload)
+                ),
+            ))
+            otra.commit()
+        return cargar_precios(session, ids)
+
+    monkeypatch.setattr(pos_order_service, "cargar_precios", concurrente)
+    res = client.post("/pos/orders/batch", json={"ordenes": [{"idempotency_key": "t2-1", **payload}]})
+    assert res.status_code == 200
+    resultado = res.json()["resultados"][0]
+    assert resultado["estado"] == "repetida"
+
+    # El SAVEPOINT revirtió la orden y el stock del lote
+    session = next(get_session())
+    assert resultado["orden"]["id"] == session.exec(select(Orden)).one().id
+    assert session.get(Producto, 1).cantidad == 10
@@ -0,0 +1,38 @@
+# tests/test_probe.py
+
+from sqlmodel import Session
+
+from db.database import engine
+from db.probe import invalidate_database_state, is_database_empty, table_counts, table_presence
+from models.models import Categoria, Producto
+from models.order import Orden
+from scripts.backup_database import check_database_status
+
+
+def test_sonda_exists_y_count_con_cache(limpiar_db):
+    with Session(engine) as session:
+        limpiar_db(session)
+        if not session.get(Categoria, 1):
+            session.add(Categoria(id=1, nombre="Categoría Test"))
+        session.commit()
+
+    invalidate_database_state()
+    presentes = table_presence(engine)
+    assert presentes["categorias"] and not presentes["ordenes"]
+    assert not is_database_empty(engine)
+    assert table_counts(engine)["ordenes"] == 0
+
+    with Session(engine) as session:
+        session.add(Orden(total=100, subtotal=100, metodo_pago="efectivo"))
+        session.commit()
+
+    # El resultado queda guardado para el proceso hasta refrescarlo o invalidarlo
+    assert table_presence(engine)["ordenes"] is False
+    assert table_presence(engine, refresh=True)["ordenes"] is True
+    assert table_counts(engine)["ordenes"] == 0
+    invalidate_database_state()
+    assert table_counts(engine)["ordenes"] == 1
+
+    status = check_database_status()
+    assert status["ordenes"] == 1
+    assert status["total_records"] == sum(v for k, v in status.items() if k != "total_records")
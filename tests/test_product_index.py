@@ -0,0 +1,55 @@
+# tests/test_product_index.py
+
+from schemas.producto import ProductoSnapshot
+from services.product_index import ProductSearchIndex
+
+
+def _snap(id, nombre, codigo=None, cantidad=10):
+    return ProductoSnapshot(
+        id=id,
+        nombre=nombre,
+        precio=1000,
+        cantidad=cantidad,
+        umbral_stock=5,
+        codigo_barra=codigo,
+    )
+
+
+def _index():
+    index = ProductSearchIndex(max_age=3600)
+    index.load([
+        _snap(1, "Cafe Brasil", "7801"),
+        _snap(2, "Cafetera Francesa", "7802"),
+        _snap(3, "Taza de Café", "7803"),
+        _snap(4, "Filtro de papel", "9900"),
+    ])
+    return index
+
+
+def test_codigo_barra_exacto_tiene_prioridad():
+    res = _index().search(None, "7802")
+    assert [p.id for p in res] == [2]
+
+
+def test_prefijo_antes_que_subcadena():
+    res = _index().search(None, "caf")
+    # Los que empiezan con "caf" primero (orden alfabético) y luego el resto
+    assert [p.id for p in res] == [1, 2, 3]
+
+
+def test_busqueda_corta_y_por_codigo_parcial():
+    index = _index()
+    assert [p.id for p in index.search(None, "pa")] == [4]
+    assert [p.id for p in index.search(None, "780")] == [1, 2, 3]
+
+
+def test_actualizacion_incremental():
+    index = _index()
+    index.upsert_snapshot(_snap(3, "Jarra", "7803"))
+    index.remove(1)
+    index.update_stock(2, 0)
+
+    res = index.search(None, "caf")
+    assert [p.id for p in res] == [2]
+    assert res[0].cantidad == 0
+    assert [p.id for p in index.search(None, "jar")] == [3]
@@ -0,0 +1,73 @@
+# tests/test_productos_admin.py
+
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from db.database import engine
+from db.dependencies import ALGORITHM, SECRET_KEY
+from main import app
+from models.models import Categoria, Producto
+from models.user import User
+from services.productos_admin_service import estadisticas_productos, pagina_productos
+
+
+@pytest.fixture(autouse=True)
+def catalogo(limpiar_db):
+    with Session(engine) as session:
+        limpiar_db(session, Producto)
+        cafe = session.exec(select(Categoria).where(Categoria.nombre == "Café")).first()
+        if not cafe:
+            cafe = Categoria(nombre="Café")
+            session.add(cafe)
+            session.flush()
+        productos = [
+            Producto(nombre="Espresso 100%", codigo_barra="111", precio=1000, cantidad=10, umbral_stock=5, margen=40, categoria_id=cafe.id),
+            Producto(nombre="Latte", codigo_barra="222", precio=2000, cantidad=3, umbral_stock=5, margen=20, categoria_id=cafe.id),
+            Producto(nombre="Molinillo", codigo_barra="333", precio=5000, cantidad=0, umbral_stock=5),
+        ]
+        session.add_all(productos)
+        if not session.exec(select(User).where(User.username == "admin")).first():
+            session.add(User(username="admin", hashed_password="x"))
+        session.commit()
+    yield
+
+
+def test_estadisticas_y_pagina_en_sql():
+    with Session(engine) as session:
+        stats = estadisticas_productos(session)
+        assert stats["total_productos"] == stats["total_productos_sistema"] == 3
+        assert stats["productos_con_stock"] == 2
+        assert stats["productos_sin_stock"] == 1
+        assert stats["productos_bajo_stock"] == 1
+        assert stats["total_stock_valor"] == 1000 * 10 + 2000 * 3
+        # El producto sin margen cuenta como 0: (40 + 20 + 0) / 3
+        assert stats["margen_promedio"] == 20
+
+        # Búsqueda sin distinguir mayúsculas por nombre, código o categoría; "%" es literal
+        assert estadisticas_productos(session, q="CAFÉ")["total_productos"] == 2
+        assert estadisticas_productos(session, q="333")["total_productos"] == 1
+        assert estadisticas_productos(session, q="100%")["total_productos"] == 1
+        assert estadisticas_productos(session, q="0%")["total_productos"] == 1
+
+        sin_categoria = estadisticas_productos(session, categoria_nombre="Sin categoría")
+        assert sin_categoria["total_productos"] == 1
+        assert sin_categoria["total_productos_sistema"] == 3
+
+        primera = pagina_productos(session, categoria_nombre="Café", page=1, limit=1)
+        segunda = pagina_productos(session, categoria_nombre="Café", page=2, limit=1)
+        assert [p.nombre for p in primera + segunda] == ["Espresso 100%", "Latte"]
+        assert primera[0].categoria.nombre == "Café"
+
+
+def test_vista_admin_paginada():
+    client = TestClient(app)
+    token = jwt.encode({"sub": "admin", "exp": datetime.utcnow() + timedelta(minutes=5)}, SECRET_KEY, algorithm=ALGORITHM)
+    client.cookies.set("access_token", token)
+
+    res = client.get("/web/productos/categoria/Café", params={"limit": 1, "page": 5})
+    assert res.status_code == 200
+    assert "Latte" in res.text and "Espresso" not in res.text
@@ -43,3 +43,14 @@ def test_get_products_with_auth(client_with_token):
     assert res.status_code == 200
     # No validamos que sea JSON porque podría ser HTML en algunas configuraciones
     # assert isinstance(res.json(), list)
+
+def test_listado_de_productos_cacheado_y_serializado(client_with_token):
+    primera = client_with_token.get("/productos/")
+    assert primera.status_code == 200
+    assert isinstance(primera.json(), list)
+    etag = primera.headers["ETag"]
+
+    # El acierto entrega el mismo cuerpo ya codificado, o 304 si el cliente lo tiene
+    segunda = client_with_token.get("/productos/")
+    assert segunda.content == primera.content and segunda.headers["ETag"] == etag
+    assert client_with_token.get("/productos/", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,8 @@
+# tests/test_query_plans.py
+
+from db.database import engine
+from scripts.check_query_plans import verificar_planes
+
+
+def test_consultas_principales_usan_indices():
+    assert verificar_planes(engine) == []
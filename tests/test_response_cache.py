@@ -0,0 +1,65 @@
+# tests/test_response_cache.py
+
+from typing import List
+
+from pydantic import TypeAdapter
+from starlette.requests import Request
+
+from schemas.producto import ProductoRead, ProductoSnapshot
+from utils.cache import clear_cache
+from utils.response_cache import cached_json_response, etag_matches, response_cache_key
+
+_adapter = TypeAdapter(List[ProductoRead])
+
+
+def _request(if_none_match=None):
+    headers = []
+    if if_none_match:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_respuesta_serializada_una_vez_y_304():
+    clear_cache()
+    llamadas = []
+
+    def producer():
+        llamadas.append(1)
+        return [ProductoSnapshot(id=1, nombre="Pan", precio=100, cantidad=3)]
+
+    key = response_cache_key("test_resp", {"q": " pan "}, 1)
+    first = cached_json_response(_request(), key, producer, _adapter)
+    etag = first.headers["etag"]
+    second = cached_json_response(_request(etag), key, producer, _adapter)
+
+    assert len(llamadas) == 1
+    assert first.status_code == 200
+    assert first.body.startswith(b'[{"id":1,"nombre":"Pan"')
+    assert second.status_code == 304
+    assert second.body == b""
+    assert second.headers["etag"] == etag
+
+
+def test_clave_normaliza_parametros_y_depende_de_version():
+    assert response_cache_key("p", {"q": "pan "}, 1) == response_cache_key("p", {"q": " pan"}, 1)
+    assert response_cache_key("p", {"q": "pan"}, 1) != response_cache_key("p", {"q": "pan"}, 2)
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"x"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_listado_pos_guarda_una_sola_entrada_por_consulta():
+    """Solo se cachea la respuesta serializada, no además la lista de productos"""
+    from fastapi.testclient import TestClient
+
+    from main import app
+    from utils.cache import cache_stats
+
+    clear_cache()
+    respuesta = TestClient(app).get("/pos/products", params={"q": "zz-sin-resultados"})
+    assert respuesta.status_code == 200
+    assert cache_stats()["total_entries"] == 1
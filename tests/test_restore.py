@@ -0,0 +1,185 @@
+# tests/test_restore.py
+
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, func, select
+
+import scripts.backup_database as backup_database
+from db.database import engine
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem
+from scripts.backup_database import create_full_backup
+from scripts.bulk_restore import bulk_restore, restore_archive
+from utils.timezone import now_santiago
+
+
+def _contar(session, model):
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+@pytest.fixture(autouse=True)
+def datos(tmp_path, monkeypatch, limpiar_db):
+    monkeypatch.setattr(backup_database, "BACKUP_DIR", str(tmp_path))
+    with Session(engine) as session:
+        limpiar_db(session)
+        if not session.get(Categoria, 1):
+            session.add(Categoria(id=1, nombre="Categoría Test"))
+        if not session.get(Producto, 1):
+            session.add(Producto(id=1, nombre="Pan", precio=50, cantidad=10, categoria_id=1))
+        cierre = CierreCaja(total_ventas=300)
+        session.add(cierre)
+        session.flush()
+        for i in range(4):
+            orden = Orden(fecha=now_santiago(), total=100, subtotal=100, metodo_pago="efectivo",
+                          cierre_id=cierre.id if i < 2 else None)
+            session.add(orden)
+            session.flush()
+            session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=1, precio_unitario=100))
+        session.commit()
+    yield
+
+
+def test_restaurar_respaldo_conserva_ids_y_es_idempotente(limpiar_db):
+    archive, _ = create_full_backup()
+    with Session(engine) as session:
+        ids = sorted(session.exec(select(Orden.id)).all())
+        limpiar_db(session)
+        session.commit()
+
+    resultado = bulk_restore(archive, engine)
+    assert resultado["transacciones"] == 4
+    assert resultado["transaccion_items"] == 4
+
+    # Restaurar otra vez actualiza las mismas filas en vez de duplicarlas
+    bulk_restore(archive, engine)
+    with Session(engine) as session:
+        assert sorted(session.exec(select(Orden.id)).all()) == ids
+        assert _contar(session, OrdenItem) == 4
+        assert _contar(session, CierreCaja) == 1
+        cerradas = session.exec(select(Orden).where(Orden.cierre_id != None)).all()
+        assert len(cerradas) == 2
+
+
+def test_restaurar_no_sobrescribe_filas_vivas_con_el_mismo_id(limpiar_db):
+    """Una orden viva distinta con el ID de una orden del respaldo se conserva"""
+    archive, _ = create_full_backup()
+    with Session(engine) as session:
+        respaldadas = session.exec(select(Orden).order_by(Orden.id)).all()
+        primera_id = respaldadas[0].id
+        cierre_id = respaldadas[0].cierre_id
+        limpiar_db(session)
+        session.add(CierreCaja(id=cierre_id, fecha=datetime(2023, 1, 1), total_ventas=777))
+        session.add(Orden(id=primera_id, fecha=datetime(2023, 1, 1), total=777, metodo_pago="debito",
+                          cierre_id=cierre_id))
+        session.add(OrdenItem(orden_id=primera_id, producto_id=1, cantidad=7, precio_unitario=111))
+        session.commit()
+
+    bulk_restore(archive, engine)
+    with Session(engine) as session:
+        viva = session.get(Orden, primera_id)
+        assert viva.total == 777 and viva.metodo_pago == "debito"
+        assert [i.cantidad for i in viva.items] == [7]
+        assert session.get(CierreCaja, cierre_id).total_ventas == 777
+        assert _contar(session, Orden) == 5
+        assert _contar(session, OrdenItem) == 5
+        assert _contar(session, CierreCaja) == 2
+        # Las órdenes restauradas cuelgan del cierre restaurado, no del vivo
+        restaurado = session.exec(select(CierreCaja).where(CierreCaja.id != cierre_id)).one()
+        assert len(restaurado.ordenes) == 2
+
+    # Restaurar otra vez no duplica las filas que recibieron un ID nuevo
+    bulk_restore(archive, engine)
+    with Session(engine) as session:
+        assert _contar(session, Orden) == 5
+        assert _contar(session, OrdenItem) == 5
+        assert _contar(session, CierreCaja) == 2
+
+
+def test_respaldo_antiguo_remapea_productos_existentes(tmp_path):
+    """Un producto del respaldo con el mismo código de barras que uno existente se fusiona"""
+    with Session(engine) as session:
+        existente = session.exec(select(Producto).where(Producto.codigo_barra == "780")).first()
+        if not existente:
+            existente = Producto(nombre="Leche", codigo_barra="780", precio=900, categoria_id=1)
+            session.add(existente)
+            session.commit()
+        producto_id = existente.id
+        productos_antes = _contar(session, Producto)
+
+    respaldo = tmp_path / "backup_antiguo"
+    respaldo.mkdir()
+    archivos = {
+        "categorias": [{"id": 1, "nombre": "Categoría Test"}],
+        "productos": [{"id": 9000, "nombre": "Leche entera", "codigo_barra": "780", "precio": 990,
+                       "categoria_id": 1}],
+        "transacciones": [{"id": 9000, "fecha": "2024-05-01T10:00:00", "total": 990,
+                           "metodo_pago": "debito", "estado": "aprobada"}],
+        "transaccion_items": [
+            {"id": 9000, "orden_id": 9000, "producto_id": 9000, "cantidad": 1, "precio_unitario": 990},
+            {"id": 9001, "orden_id": 12345, "producto_id": 9000, "cantidad": 1, "precio_unitario": 990},
+        ],
+    }
+    for nombre, filas in archivos.items():
+        (respaldo / f"{nombre}.json").write_text(json.dumps(filas), encoding="utf-8")
+
+    resultado = bulk_restore(str(respaldo), engine)
+
+    # El ítem que apunta a una orden inexistente se descarta
+    assert resultado["transaccion_items"] == 1
+    with Session(engine) as session:
+        assert _contar(session, Producto) == productos_antes
+        assert session.get(Producto, producto_id).precio == 990
+        item = session.get(OrdenItem, 9000)
+        assert item.producto_id == producto_id
+        orden = session.get(Orden, 9000)
+        assert orden.subtotal == 0 and orden.fecha.year == 2024
+
+
+def test_restore_archive_aplica_la_cadena_de_incrementales(limpiar_db):
+    create_full_backup()
+    with Session(engine) as session:
+        orden = Orden(fecha=now_santiago(), total=50, metodo_pago="efectivo")
+        session.add(orden)
+        session.flush()
+        session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=1, precio_unitario=50))
+        session.commit()
+    incremental, _ = create_full_backup(incremental=True)
+
+    with Session(engine) as session:
+        limpiar_db(session)
+        session.commit()
+
+    # El incremental se aplica sobre su respaldo base
+    restore_archive(incremental, engine)
+    with Session(engine) as session:
+        assert _contar(session, Orden) == 5
+        assert _contar(session, OrdenItem) == 5
+        assert _contar(session, CierreCaja) == 1
+
+
+def test_respaldo_y_restauracion_de_ida_y_vuelta(tmp_path, monkeypatch, limpiar_db):
+    """backup_database crea el ZIP y restore_from_backup lo restaura como en los workflows"""
+    import scripts.restore_from_backup as restore_from_backup
+
+    monkeypatch.setattr(restore_from_backup, "BACKUP_DIR", str(tmp_path))
+    monkeypatch.setattr(restore_from_backup, "engine", engine)
+    archive, _ = create_full_backup()
+    with Session(engine) as session:
+        ids = sorted(session.exec(select(Orden.id)).all())
+        limpiar_db(session)
+        session.commit()
+
+    assert restore_from_backup.get_backup_path("latest") == archive
+    # python -m scripts.restore_from_backup "$BACKUP_NAME" (sin .zip ni confirmación)
+    backup_name = os.path.basename(archive)[:-len(".zip")]
+    monkeypatch.setattr(sys, "argv", ["restore_from_backup", backup_name])
+    restore_from_backup.main()
+
+    with Session(engine) as session:
+        assert sorted(session.exec(select(Orden.id)).all()) == ids
+        assert _contar(session, OrdenItem) == 4
+        assert _contar(session, CierreCaja) == 1
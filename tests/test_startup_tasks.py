@@ -0,0 +1,158 @@
+# tests/test_startup_tasks.py
+
+import threading
+
+from fastapi.testclient import TestClient
+
+import core.startup_tasks as startup_tasks
+from core.startup_tasks import StartupRunner
+from db.database import engine
+from db.middleware import StartupWriteLockMiddleware
+from main import app
+
+client = TestClient(app)
+
+
+def test_tareas_en_segundo_plano_con_errores_aislados(tmp_path, monkeypatch):
+    monkeypatch.setattr(startup_tasks, "LOCK_FILE", str(tmp_path / "startup.lock"))
+    ejecutadas = []
+
+    def falla():
+        raise RuntimeError("sin conexión a GitHub")
+
+    runner = StartupRunner(engine)
+    runner.agregar("primera", lambda: ejecutadas.append("primera"))
+    runner.agregar("falla", falla)
+    runner.agregar("ultima", lambda: ejecutadas.append("ultima"))
+    assert not runner.listo
+
+    runner.iniciar()
+    assert runner.esperar(timeout=10)
+
+    estado = runner.estado()
+    assert ejecutadas == ["primera", "ultima"]
+    assert estado["status"] == "completado con errores"
+    assert estado["runner"] is True
+    # Terminó, pero con errores: no está listo
+    assert runner.terminado and not runner.listo
+    assert estado["tasks"]["falla"]["estado"] == "error"
+    assert estado["tasks"]["ultima"]["estado"] == "completada"
+
+
+def test_solo_un_worker_ejecuta_las_tareas(tmp_path, monkeypatch):
+    monkeypatch.setattr(startup_tasks, "LOCK_FILE", str(tmp_path / "startup.lock"))
+    en_curso, liberar = threading.Event(), threading.Event()
+    ejecuciones = []
+
+    def lenta():
+        ejecuciones.append(1)
+        en_curso.set()
+        liberar.wait(timeout=10)
+
+    primero, segundo = StartupRunner(engine), StartupRunner(engine)
+    for runner in (primero, segundo):
+        runner.agregar("post_deploy", lenta)
+
+    primero.iniciar()
+    assert en_curso.wait(timeout=10)
+    segundo.iniciar()
+    assert not segundo.esperar(timeout=0.2)  # espera al dueño del lock
+
+    liberar.set()
+    assert primero.esperar(timeout=10) and segundo.esperar(timeout=10)
+    assert len(ejecuciones) == 1
+    assert segundo.estado()["status"] == "completado por otro worker"
+    assert segundo.estado()["tasks"]["post_deploy"]["estado"] == "omitida"
+
+
+def test_health_separa_liveness_de_readiness():
+    assert client.get("/api/health/live").status_code == 200
+    salud = client.get("/api/health").json()
+    assert salud["live"] is True
+
+    listo = startup_tasks.startup_runner.listo
+    res = client.get("/api/health/ready")
+    assert res.status_code == (200 if listo else 503)
+    assert salud["ready"] == listo
+    assert "tasks" in client.get("/api/health/startup").json()
+
+
+def test_readiness_503_si_las_tareas_fallaron(monkeypatch):
+    runner = StartupRunner(engine)
+    runner.agregar("post_deploy", lambda: False)
+    runner.iniciar()
+    assert runner.esperar(timeout=10)
+    import routers.health as health
+    monkeypatch.setattr(health, "startup_runner", runner)
+
+    res = client.get("/api/health/ready")
+    assert res.status_code == 503
+    assert res.json() == {"status": "error", "startup": "completado con errores"}
+
+
+def test_escrituras_bloqueadas_durante_la_restauracion(tmp_path, monkeypatch):
+    monkeypatch.setattr(startup_tasks, "LOCK_FILE", str(tmp_path / "startup.lock"))
+    en_curso, liberar = threading.Event(), threading.Event()
+
+    def restauracion():
+        en_curso.set()
+        liberar.wait(timeout=10)
+
+    runner = StartupRunner(engine)
+    runner.agregar("seed", lambda: None)
+    runner.agregar("post_deploy", restauracion, bloquea_escrituras=True)
+    middleware = next(m for m in app.user_middleware if m.cls is StartupWriteLockMiddleware)
+    monkeypatch.setitem(middleware.kwargs, "runner", runner)
+    monkeypatch.setattr(app, "middleware_stack", None)  # reconstruir con el runner de prueba
+    assert not runner.escrituras_bloqueadas  # sin iniciar (tests, scripts)
+
+    runner.iniciar()
+    assert en_curso.wait(timeout=10)
+    assert runner.escrituras_bloqueadas
+    res = client.post("/api/productos/", json={})
+    assert res.status_code == 503 and res.headers["Retry-After"] == "30"
+    assert client.get("/api/health/live").status_code == 200
+
+    liberar.set()
+    assert runner.esperar(timeout=10)
+    assert not runner.escrituras_bloqueadas
+    assert client.post("/api/productos/", json={}).status_code != 503
+
+
+def test_sin_fcntl_usa_msvcrt(tmp_path, monkeypatch):
+    """En Windows no existe fcntl: el lock se toma con msvcrt.locking"""
+    monkeypatch.setattr(startup_tasks, "LOCK_FILE", str(tmp_path / "startup.lock"))
+    monkeypatch.setattr(startup_tasks, "fcntl", None)
+    llamadas = []
+
+    class MsvcrtFalso:
+        LK_NBLCK, LK_UNLCK = 2, 0
+
+        @staticmethod
+        def locking(fd, modo, largo):
+            llamadas.append(modo)
+
+    monkeypatch.setattr(startup_tasks, "msvcrt", MsvcrtFalso)
+    ejecutadas = []
+    runner = StartupRunner(engine)
+    runner.agregar("seed", lambda: ejecutadas.append("seed"))
+    runner.iniciar()
+
+    assert runner.esperar(timeout=10)
+    assert ejecutadas == ["seed"]
+    assert runner.estado()["status"] == "completado"
+    assert llamadas == [MsvcrtFalso.LK_NBLCK, MsvcrtFalso.LK_UNLCK]
+
+
+def test_sin_lock_de_archivos_ejecuta_las_tareas(tmp_path, monkeypatch):
+    monkeypatch.setattr(startup_tasks, "LOCK_FILE", str(tmp_path / "startup.lock"))
+    monkeypatch.setattr(startup_tasks, "fcntl", None)
+    monkeypatch.setattr(startup_tasks, "msvcrt", None)
+    ejecutadas = []
+    runner = StartupRunner(engine)
+    runner.agregar("seed", lambda: ejecutadas.append("seed"))
+    runner.iniciar()
+
+    assert runner.esperar(timeout=10)
+    assert ejecutadas == ["seed"]
+    assert runner.estado()["runner"] is True
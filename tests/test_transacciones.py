@@ -0,0 +1,136 @@
+# tests/test_transacciones.py
+
+import csv
+import io
+import json
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from db.database import engine
+from main import app
+from models.models import Categoria, Producto
+from models.order import CierreCaja, Orden, OrdenItem
+from services.transacciones_service import contar_transacciones, obtener_pagina_transacciones
+from utils.timezone import now_santiago
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def ordenes(limpiar_db):
+    """Siete órdenes: tres comparten la misma fecha para probar el desempate por id"""
+    with Session(engine) as session:
+        limpiar_db(session)
+        if not session.get(Categoria, 1):
+            session.add(Categoria(id=1, nombre="Categoría Test"))
+        if not session.get(Producto, 1):
+            session.add(Producto(id=1, nombre="Pan", precio=50, cantidad=10, categoria_id=1))
+        base = now_santiago().replace(tzinfo=None, microsecond=0)
+        fechas = [base, base, base] + [base - timedelta(minutes=i) for i in range(1, 5)]
+        for i, fecha in enumerate(fechas):
+            metodo = "efectivo" if i % 2 == 0 else "debito"
+            session.add(Orden(fecha=fecha, total=100 * (i + 1), subtotal=100 * (i + 1), metodo_pago=metodo))
+        session.commit()
+    yield
+
+
+def test_paginas_por_cursor_sin_repetir_ni_saltar():
+    with Session(engine) as session:
+        vistos = []
+        cursor = None
+        while True:
+            pagina, cursor = obtener_pagina_transacciones(session, None, cursor, limite=2)
+            vistos.extend((orden.fecha, orden.id) for orden in pagina)
+            if cursor is None:
+                break
+
+        assert len(vistos) == 7 == len(set(vistos))
+        assert vistos == sorted(vistos, reverse=True)
+        assert contar_transacciones(session) == 7
+        assert contar_transacciones(session, {"metodo_pago": "efectivo"}) == 4
+
+
+def test_listado_json_con_filtros():
+    primera = client.get("/transacciones/api", params={"metodo_pago": "efectivo", "limite": 3}).json()
+    assert primera["total"] == 4
+    assert len(primera["items"]) == 3
+    assert primera["siguiente_cursor"]
+
+    segunda = client.get("/transacciones/api", params={
+        "metodo_pago": "efectivo", "limite": 3, "cursor": primera["siguiente_cursor"]
+    }).json()
+    assert len(segunda["items"]) == 1
+    assert segunda["siguiente_cursor"] is None
+    ids = {o["id"] for o in primera["items"]} | {o["id"] for o in segunda["items"]}
+    assert len(ids) == 4
+
+
+def test_listado_html_paginado():
+    res = client.get("/transacciones/", params={"limite": 5})
+    assert res.status_code == 200
+    assert "7 transacciones en total" in res.text
+    assert "cursor=" in res.text
+
+
+def test_exportar_csv_y_ndjson():
+    with Session(engine) as session:
+        orden = session.exec(select(Orden).order_by(Orden.id)).first()
+        session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=2, precio_unitario=50))
+        session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=1, precio_unitario=50))
+        session.commit()
+        orden_id = orden.id
+
+    res = client.get("/transacciones/export", params={"format": "csv"})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/csv")
+    filas = list(csv.reader(io.StringIO(res.text)))
+    assert filas[0][0] == "orden_id"
+    # 7 órdenes, una de ellas con dos ítems
+    assert len(filas) == 1 + 8
+
+    res = client.get("/transacciones/export", params={"format": "ndjson", "metodo_pago": "efectivo"})
+    ordenes = [json.loads(linea) for linea in res.text.splitlines()]
+    assert len(ordenes) == 4
+    exportada = next(o for o in ordenes if o["id"] == orden_id)
+    assert [i["cantidad"] for i in exportada["items"]] == [2, 1]
+
+
+def test_detalle_con_sesion_async_carga_items():
+    with Session(engine) as session:
+        orden = session.exec(select(Orden).order_by(Orden.id)).first()
+        session.add(OrdenItem(orden_id=orden.id, producto_id=1, cantidad=3, precio_unitario=50))
+        cierre = CierreCaja(total_ventas=100)
+        session.add(cierre)
+        session.flush()
+        orden.cierre_id = cierre.id
+        session.add(orden)
+        session.commit()
+        orden_id, cierre_id = orden.id, cierre.id
+
+    res = client.get(f"/transacciones/{orden_id}")
+    assert res.status_code == 200
+    assert "Pan" in res.text
+
+    res = client.get(f"/transacciones/cierres/{cierre_id}")
+    assert res.status_code == 200
+    assert client.get("/transacciones/cierres").status_code == 200
+
+
+def test_url_async_por_motor():
+    from db.async_database import async_database_url
+
+    url, connect_args = async_database_url("postgres://u:p@host:5432/db?sslmode=require")
+    assert url.drivername == "postgresql+asyncpg"
+    assert "sslmode" not in url.query and connect_args == {"ssl": "require"}
+
+    url, _ = async_database_url("sqlite:////tmp/t.db")
+    assert url.drivername == "sqlite+aiosqlite" and url.database == "/tmp/t.db"
+
+
+def test_pools_sincrono_y_asincrono_comparten_el_presupuesto():
+    from db.database import CONEXIONES_POR_WORKER, POOL_ASINCRONO, POOL_SINCRONO
+
+    assert sum(POOL_SINCRONO.values()) + sum(POOL_ASINCRONO.values()) <= CONEXIONES_POR_WORKER
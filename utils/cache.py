@@ -1,99 +1,412 @@
 # utils/cache.py
 
+from collections import OrderedDict
 from functools import wraps
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Callable, Iterable, Set, Union
+import sys
+import threading
 import time
 import json
 import hashlib
 import logging
 
+from sqlalchemy.orm import Session as OrmSession
+
+from core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# Elementos medidos de una lista o tupla larga al estimar su tamaño
+SIZE_SAMPLE = 32
+
+
+def _estimate_size(obj: Any, _seen: Optional[set] = None, _depth: int = 0) -> int:
+    """
+    Estima el tamaño en bytes de un objeto recorriendo sus contenedores.
+    Es una aproximación (no cuenta memoria compartida ni internals de CPython)
+    suficiente para aplicar un presupuesto de memoria al cache. De las
+    listas y tuplas largas solo se miden los primeros SIZE_SAMPLE elementos
+    y se extrapola al resto.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen or _depth > 6:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj, 64)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += _estimate_size(k, _seen, _depth + 1) + _estimate_size(v, _seen, _depth + 1)
+    elif isinstance(obj, (list, tuple)) and len(obj) > SIZE_SAMPLE:
+        muestra = sum(_estimate_size(item, _seen, _depth + 1) for item in obj[:SIZE_SAMPLE])
+        size += muestra * len(obj) // SIZE_SAMPLE
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _estimate_size(item, _seen, _depth + 1)
+    elif hasattr(obj, "__dict__"):
+        size += _estimate_size(
+            {k: v for k, v in vars(obj).items() if not k.startswith("_sa_")},
+            _seen,
+            _depth + 1,
+        )
+    elif hasattr(obj, "__slots__"):
+        for slot in obj.__slots__:
+            if hasattr(obj, slot):
+                size += _estimate_size(getattr(obj, slot), _seen, _depth + 1)
+    return size
+
+
 class SimpleCache:
-    def __init__(self, default_ttl: int = 300):  # 5 minutos por defecto
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    """
+    Cache en memoria acotado, con expiración por TTL.
+
+    - max_entries / max_bytes: presupuesto de entradas y de memoria aproximada
+    - policy: "lru" (menos usado recientemente) o "lfu" (menos usado en total;
+      las claves se agrupan en buckets por cantidad de hits, así que elegir
+      la víctima no recorre el cache)
+    - sweep_interval: cada cuántos segundos un hilo en segundo plano elimina
+      las entradas expiradas (0 para desactivarlo)
+
+    Invalidación:
+    - por namespace: cada namespace tiene un contador de generación que forma
+      parte de la clave; invalidarlo es O(1) y las entradas viejas quedan
+      inalcanzables hasta que el TTL, la evicción o el sweep las eliminan
+    - por tags: una entrada puede registrar tags (p. ej. "producto:12") y
+      invalidate_tags elimina solo las entradas que los tienen
+    """
+
+    def __init__(
+        self,
+        default_ttl: int = 300,  # 5 minutos por defecto
+        max_entries: Optional[int] = 2000,
+        max_bytes: Optional[int] = None,
+        policy: str = "lru",
+        sweep_interval: int = 60,
+    ):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Política de evicción no soportada: {policy}")
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.default_ttl = default_ttl
-    
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._generations: Dict[str, int] = {}
+        self._tags: Dict[str, Set[str]] = {}
+        # LFU: hits -> claves con esa cantidad de hits (la primera, la menos reciente)
+        self._freq: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_freq = 0
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
+
     def _generate_key(self, func_name: str, args: tuple, kwargs: dict) -> str:
         """Genera una clave única para la función y sus parámetros"""
         key_data = {
             'func': func_name,
-            'args': args,
+            # La sesión puede venir como argumento posicional; su repr cambia en
+            # cada request y haría que la clave nunca coincida
+            'args': [a for a in args if not isinstance(a, OrmSession)],
             'kwargs': {k: v for k, v in kwargs.items() if k not in ['session', 'db']}  # Excluir session de DB
         }
         key_string = json.dumps(key_data, sort_keys=True, default=str)
         return hashlib.md5(key_string.encode()).hexdigest()
-    
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def namespaced_key(self, namespace: str, key: str) -> str:
+        """Antepone a la clave el namespace y su generación vigente"""
+        return f"{namespace}:{self.generation(namespace)}:{key}"
+
+    def invalidate_namespace(self, namespace: str) -> None:
+        """Invalida en O(1) todas las claves generadas con namespaced_key"""
+        with self._lock:
+            self._generations[namespace] = self.generation(namespace) + 1
+        logger.debug(f"Cache namespace invalidated: {namespace} (gen {self._generations[namespace]})")
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Elimina las entradas que registraron alguno de los tags. Retorna cuántas"""
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+        if removed:
+            logger.debug(f"Cache invalidated {removed} keys by tag")
+        return removed
+
+    def _freq_add(self, key: str, hits: int) -> None:
+        self._freq.setdefault(hits, OrderedDict())[key] = None
+        if hits < self._min_freq or len(self._freq) == 1:
+            self._min_freq = hits
+
+    def _freq_discard(self, key: str, hits: int) -> None:
+        bucket = self._freq.get(hits)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._freq[hits]
+                if self._min_freq == hits and self._freq:
+                    self._min_freq = min(self._freq)
+
+    def _remove(self, key: str) -> None:
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry['size']
+            if self.policy == "lfu":
+                self._freq_discard(key, entry['hits'])
+            for tag in entry['tags']:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    def _evict_one(self, protect: Optional[str] = None) -> None:
+        """Elimina una entrada según la política configurada (nunca `protect` si hay otras)"""
+        if self.policy == "lru":
+            # OrderedDict mantiene el orden de acceso: la primera es la más antigua
+            key = next((k for k in self.cache if k != protect), protect)
+        else:
+            key = self._lfu_victim(protect)
+        self._remove(key)
+        self._evictions += 1
+        logger.debug(f"Cache EVICT ({self.policy}): {key}")
+
+    def _lfu_victim(self, protect: Optional[str]) -> str:
+        """La menos usada (y entre ellas la menos reciente), sin recorrer todo el cache"""
+        key = next((k for k in self._freq[self._min_freq] if k != protect), None)
+        if key is None:
+            # En el bucket mínimo solo está `protect` (la clave recién guardada)
+            siguientes = [f for f in self._freq if f != self._min_freq]
+            if not siguientes:
+                return protect
+            key = next(iter(self._freq[min(siguientes)]))
+        return key
+
+    def _enforce_limits(self, protect: Optional[str] = None) -> None:
+        while self.cache and (
+            (self.max_entries is not None and len(self.cache) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            self._evict_one(protect)
+
     def get(self, key: str) -> Optional[Any]:
-        if key in self.cache:
-            entry = self.cache[key]
-            if time.time() < entry['expires']:
-                logger.debug(f"Cache HIT: {key}")
-                return entry['data']
-            else:
-                del self.cache[key]
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                now = time.time()
+                if now < entry['expires']:
+                    if self.policy == "lfu":
+                        self._freq_discard(key, entry['hits'])
+                        self._freq_add(key, entry['hits'] + 1)
+                    entry['hits'] += 1
+                    entry['last_access'] = now
+                    self.cache.move_to_end(key)
+                    self._hits += 1
+                    logger.debug(f"Cache HIT: {key}")
+                    return entry['data']
+                self._remove(key)
+                self._expirations += 1
                 logger.debug(f"Cache EXPIRED: {key}")
+            self._misses += 1
         logger.debug(f"Cache MISS: {key}")
         return None
-    
-    def set(self, key: str, data: Any, ttl: Optional[int] = None) -> None:
+
+    def set(
+        self,
+        key: str,
+        data: Any,
+        ttl: Optional[int] = None,
+        tags: Iterable[str] = (),
+        size: Optional[int] = None,
+    ) -> None:
+        """
+        Guarda `data`. El tamaño se calcula una sola vez al guardar y queda en
+        la entrada; quien ya lo conoce (p. ej. el largo de una respuesta
+        serializada) puede entregarlo en `size` para no estimarlo.
+        """
         ttl = ttl or self.default_ttl
-        self.cache[key] = {
-            'data': data,
-            'expires': time.time() + ttl
-        }
-        logger.debug(f"Cache SET: {key} (TTL: {ttl}s)")
-    
+        tags = tuple(set(tags))
+        size = _estimate_size(key) + (_estimate_size(data) if size is None else size)
+        now = time.time()
+        with self._lock:
+            self._remove(key)
+            self.cache[key] = {
+                'data': data,
+                'expires': now + ttl,
+                'size': size,
+                'hits': 0,
+                'last_access': now,
+                'tags': tags,
+            }
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            if self.policy == "lfu":
+                self._freq_add(key, 0)
+            self._bytes += size
+            self._enforce_limits(protect=key)
+        self._ensure_sweeper()
+        logger.debug(f"Cache SET: {key} (TTL: {ttl}s, ~{size} bytes)")
+
     def invalidate_pattern(self, pattern: str) -> None:
         """Invalida todas las claves que contienen el patrón"""
-        keys_to_delete = [k for k in self.cache.keys() if pattern in k]
-        for key in keys_to_delete:
-            del self.cache[key]
+        with self._lock:
+            keys_to_delete = [k for k in self.cache.keys() if pattern in k]
+            for key in keys_to_delete:
+                self._remove(key)
         logger.info(f"Cache invalidated {len(keys_to_delete)} keys matching: {pattern}")
-    
+
     def clear(self) -> None:
-        count = len(self.cache)
-        self.cache.clear()
+        with self._lock:
+            count = len(self.cache)
+            self.cache.clear()
+            self._tags.clear()
+            self._freq.clear()
+            self._min_freq = 0
+            self._bytes = 0
         logger.info(f"Cache cleared: {count} entries removed")
-    
+
+    def sweep(self) -> int:
+        """Elimina todas las entradas expiradas. Retorna cuántas se eliminaron"""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, entry in self.cache.items() if entry['expires'] <= now]
+            for key in expired:
+                self._remove(key)
+            self._expirations += len(expired)
+        if expired:
+            logger.debug(f"Cache sweep: {len(expired)} entradas expiradas eliminadas")
+        return len(expired)
+
+    def _ensure_sweeper(self) -> None:
+        """Inicia el hilo de limpieza la primera vez que se guarda algo"""
+        if self.sweep_interval <= 0 or self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="cache-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop_sweeper.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"Error en limpieza de cache: {e}")
+
+    def stop_sweeper(self) -> None:
+        self._stop_sweeper.set()
+
     def stats(self) -> Dict[str, Any]:
         """Retorna estadísticas del cache"""
         now = time.time()
-        active_entries = sum(1 for entry in self.cache.values() if entry['expires'] > now)
-        expired_entries = len(self.cache) - active_entries
-        
-        return {
-            'total_entries': len(self.cache),
-            'active_entries': active_entries,
-            'expired_entries': expired_entries
-        }
+        with self._lock:
+            active_entries = sum(1 for entry in self.cache.values() if entry['expires'] > now)
+            total = len(self.cache)
+            lookups = self._hits + self._misses
+            return {
+                'total_entries': total,
+                'active_entries': active_entries,
+                'expired_entries': total - active_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'approx_bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'policy': self.policy,
+                'namespaces': dict(self._generations),
+                'tags': len(self._tags),
+            }
 
 # Cache global
-app_cache = SimpleCache(default_ttl=300)  # 5 minutos
+app_cache = SimpleCache(
+    default_ttl=300,  # 5 minutos
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    policy=settings.CACHE_EVICTION_POLICY,
+    sweep_interval=settings.CACHE_SWEEP_INTERVAL,
+)
 
-def cached(ttl: Optional[int] = None, cache_key_prefix: str = ""):
-    """Decorador para cachear resultados de funciones"""
+# Namespace de todo lo que depende del catálogo de productos
+CATALOG_NAMESPACE = "catalogo"
+
+# Namespaces en uso: solo estos se invalidan por generación desde el admin
+CACHE_NAMESPACES = frozenset({CATALOG_NAMESPACE})
+
+
+def producto_tag(producto_id: int) -> str:
+    """Tag para invalidar solo las entradas que contienen un producto"""
+    return f"producto:{producto_id}"
+
+
+def producto_tags(productos: Iterable[Any]) -> list:
+    """Tags de invalidación de una lista de productos (uno por producto)"""
+    return [producto_tag(p.id) for p in productos]
+
+
+def cached(
+    ttl: Optional[int] = None,
+    cache_key_prefix: str = "",
+    snapshot: Optional[Callable[[Any], Any]] = None,
+    namespace: Optional[str] = None,
+    tags: Optional[Callable[[Any], Iterable[str]]] = None,
+):
+    """
+    Decorador para cachear resultados de funciones.
+
+    snapshot: función opcional que convierte el resultado en una copia
+    desacoplada de la sesión (p. ej. tuplas de ProductoSnapshot) antes de
+    guardarlo, para no retener instancias vivas del ORM en el cache.
+    namespace: namespace cuya generación forma parte de la clave
+    (por defecto el propio cache_key_prefix).
+    tags: función que recibe el resultado y retorna sus tags de invalidación.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             # Generar clave de cache
-            cache_key = f"{cache_key_prefix}_{app_cache._generate_key(func.__name__, args, kwargs)}"
-            
+            cache_key = app_cache.namespaced_key(
+                namespace or cache_key_prefix,
+                f"{cache_key_prefix}_{app_cache._generate_key(func.__name__, args, kwargs)}",
+            )
+
             # Intentar obtener del cache
             cached_result = app_cache.get(cache_key)
             if cached_result is not None:
                 return cached_result
-            
+
             # Ejecutar función y cachear resultado
             result = func(*args, **kwargs)
-            app_cache.set(cache_key, result, ttl)
+            if snapshot is not None:
+                result = snapshot(result)
+            app_cache.set(cache_key, result, ttl, tags=tags(result) if tags else ())
             return result
         return wrapper
     return decorator
 
-def invalidate_cache(pattern: str):
-    """Función helper para invalidar cache"""
-    app_cache.invalidate_pattern(pattern)
+def invalidate_cache(namespace: str):
+    """Función helper para invalidar un namespace del cache (O(1))"""
+    app_cache.invalidate_namespace(namespace)
+
+def invalidate_cache_tags(*tags: str) -> int:
+    """Función helper para invalidar solo las entradas con alguno de los tags"""
+    return app_cache.invalidate_tags(tags)
 
 def clear_cache():
     """Función helper para limpiar todo el cache"""
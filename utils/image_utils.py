@@ -2,10 +2,16 @@ import os
 import uuid
 from pathlib import Path
 from typing import Optional
-from PIL import Image
 from fastapi import UploadFile, HTTPException
 import io
 
+
+def pil_image():
+    """Módulo PIL.Image, importado recién cuando se procesa una imagen"""
+    from PIL import Image
+    return Image
+
+
 async def save_upload_as_webp(
     upload_file: UploadFile, 
     output_dir: str = "static/images", 
@@ -32,6 +38,7 @@ async def save_upload_as_webp(
     try:
         # Leer la imagen
         contents = await upload_file.read()
+        Image = pil_image()
         image = Image.open(io.BytesIO(contents))
         
         # Redimensionar si es necesario
@@ -0,0 +1,95 @@
+# utils/response_cache.py
+
+"""
+Cache de respuestas JSON ya serializadas.
+
+Guarda en app_cache el cuerpo final (bytes) de una respuesta junto con su
+ETag, de modo que un acierto no vuelve a validar contra el response_model
+ni a codificar JSON. Si el cliente envía If-None-Match con el mismo ETag se
+responde 304 sin cuerpo.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Optional
+import hashlib
+import json
+import logging
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from utils.cache import app_cache
+
+logger = logging.getLogger(__name__)
+
+
+def response_cache_key(
+    prefix: str,
+    params: Dict[str, Any],
+    version: Any = None,
+    namespace: Optional[str] = None,
+) -> str:
+    """
+    Genera la clave de una respuesta a partir de sus parámetros normalizados
+    y de la versión de los datos de los que depende. Con `namespace`, la clave
+    incluye además su generación (ver SimpleCache.invalidate_namespace).
+    """
+    normalized = {
+        k: v.strip() if isinstance(v, str) else v
+        for k, v in params.items()
+    }
+    key_string = json.dumps({"v": version, "p": normalized}, sort_keys=True, default=str)
+    key = f"{prefix}_{hashlib.md5(key_string.encode()).hexdigest()}"
+    return app_cache.namespaced_key(namespace, key) if namespace else key
+
+
+def make_etag(body: bytes) -> str:
+    """ETag fuerte derivado del contenido exacto de la respuesta"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara un header If-None-Match con un ETag (comparación débil, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cached_json_response(
+    request: Request,
+    key: str,
+    producer: Callable[[], Any],
+    adapter: TypeAdapter,
+    ttl: Optional[int] = None,
+    tags: Optional[Callable[[Any], Iterable[str]]] = None,
+) -> Response:
+    """
+    Retorna la respuesta cacheada para `key` o la construye con `producer`.
+
+    El resultado de `producer` se valida una sola vez con `adapter` (igual que
+    haría FastAPI con el response_model) y se guarda ya codificado.
+    `tags` recibe los datos validados y retorna sus tags de invalidación.
+    """
+    entry = app_cache.get(key)
+    if entry is None:
+        data = adapter.validate_python(producer(), from_attributes=True)
+        body = adapter.dump_json(data)
+        entry = (body, make_etag(body))
+        # El tamaño ya se conoce: no hace falta recorrer la entrada
+        app_cache.set(key, entry, ttl, tags=tags(data) if tags else (), size=len(body) + len(entry[1]))
+
+    body, etag = entry
+    # no-cache: el navegador puede guardar la respuesta pero debe revalidarla
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        logger.debug(f"Response cache 304: {key}")
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,30 @@
+# utils/storage.py
+
+"""
+Cliente S3 de Filebase.
+
+boto3 tarda en importarse y en construir el cliente, así que ambos se
+postergan hasta la primera subida: la aplicación arranca sin cargarlo.
+"""
+
+from functools import lru_cache
+
+from core.config import settings
+
+FILEBASE_ENDPOINT = "https://s3.filebase.com"
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
+    """Cliente S3 compartido por el proceso, creado en el primer uso"""
+    import boto3
+    from botocore.client import Config
+
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.FILEBASE_KEY,
+        aws_secret_access_key=settings.FILEBASE_SECRET,
+        endpoint_url=FILEBASE_ENDPOINT,
+        region_name="us-east-1",
+        config=Config(signature_version="s3v4"),
+    )